@@ -1,11 +1,9 @@
 # Módulos estándar
 from datetime import date
-import json
 import logging
-import re
 import sys
-import uuid
-import base64
+import hashlib
+from io import BytesIO
 
 # Tipado
 from typing import Union
@@ -24,6 +22,11 @@ import streamlit as st
 
 # Módulo personalizado
 import validar_preprocesar_predecir_organizarrtados
+import registro_modelos
+import cache_resultados
+import lector_archivos
+import exportacion
+import motor_validacion
 
 # Aliases comunes
 import pickle as pkl
@@ -263,153 +266,160 @@ def validate_assertion(assertion):
 # -----------------------------------------------------
 
 
-def download_excel(df_v, nombre='LogErrores', col=st):
-    # Convierte el DataFrame 'df_v' en un archivo Excel y lo guarda con el nombre proporcionado.
-    df_v.to_excel(nombre+'.xlsx', index=False)
-    filename = nombre+'.xlsx'  # Almacena el nombre del archivo.
+def cargar_registro_modelos():
+    # Todas las sesiones comparten el registro del proceso; recargar() solo vuelve
+    # a leer los .pkl cuyo archivo cambió en disco (mtime/tamaño y hash)
+    recargados = registro_modelos.registro.recargar()
+    if recargados:
+        logging.info('Modelos cargados: %s', recargados)
+    return registro_modelos.registro
 
-    # Abre el archivo Excel en modo de lectura binaria.
-    with open(nombre+'.xlsx', 'rb') as file:
-        contents = file.read()  # Lee el contenido del archivo.
 
-    if col == st:
-        # Si 'col' es igual a 'st', se asume que se está trabajando en la columna principal de Streamlit.
-        # Genera el botón de descarga para la columna principal.
-        download_button_str = download_button(contents, filename, nombre)
-        # Añade el botón de descarga a la interfaz de usuario de Streamlit.
-        st.markdown(download_button_str, unsafe_allow_html=True)
+def huella_modelos():
+    # Cambia si se recarga algún .pkl; forma parte de la llave de los caches
+    return tuple(sorted(cargar_registro_modelos().hashes().items()))
 
-    else:
-        # Si 'col' no es igual a 'st', se asume que se está trabajando en una columna específica de Streamlit.
-        # Genera el botón de descarga para la columna especificada.
-        download_button_str = download_button(contents, filename, nombre)
-        # Añade el botón de descarga a la columna especificada en Streamlit.
-        col.markdown(download_button_str, unsafe_allow_html=True)
 
-# La función realiza las siguientes acciones:
-
-# Convierte un DataFrame (df_v) en un archivo Excel y lo guarda con el nombre especificado (nombre), que por defecto es 'LogErrores'.
-# Lee el contenido del archivo Excel creado.
-# Dependiendo del parámetro col, que determina dónde se mostrará el botón de descarga (en la columna principal de Streamlit o en una columna específica), genera y muestra un botón de descarga para el archivo Excel.
-# Usa st.markdown con unsafe_allow_html=True para insertar HTML (en este caso, el botón de descarga) en la aplicación Streamlit.
-# El uso de unsafe_allow_html=True permite insertar etiquetas HTML directamente en la aplicación Streamlit, lo cual es necesario para implementar la funcionalidad del botón de descarga en este caso.
+@st.cache_data(show_spinner=False, max_entries=8)
+def validar_archivo(hash_archivo, modelos, _contenido, formato='xlsx'):
+    """
+    Lee el archivo subido (xlsx, csv o parquet) y ejecuta Validar_todo y, si hay problemas, Logs.
+    Se guarda por hash del contenido: las recargas con el mismo archivo no
+    vuelven a leer ni a validar. df_modelo es el df_in que queda tras la
+    validación (Logs deja solo los registros aptos) y es la entrada del modelo.
+    Además se consulta el cache en disco, compartido entre sesiones y reinicios.
+    """
+    clave = cache_resultados.cache.clave(hash_archivo, modelos)
+    resultado = cache_resultados.cache.leer(clave, 'validacion')
+    if resultado is not None:
+        return resultado
+
+    # Leer el archivo en streaming (ver lector_archivos.py), con índices 1..n y
+    # FECHACONSTITUCION como fecha; dataframe queda como copia sin filtrar
+    ob = validar_preprocesar_predecir_organizarrtados.Modelos_2.desde_archivo(
+        BytesIO(_contenido), formato=formato, registro=cargar_registro_modelos())
+    logging.info('Lectura %s: %s', formato, lector_archivos.ultimo_reporte)
+    dataframe = ob.df_in.copy()
+    df_v, text, final_flag = ob.Validar_todo()
+    logging.info('Validación: %s', motor_validacion.motor.ultimo_reporte)
+
+    logs, logs_riesgo, indices_posibles = None, None, None
+    if final_flag == False:
+        logs, logs_riesgo, indices_posibles = ob.Logs()
+
+    resultado = {'dataframe': dataframe, 'df_v': df_v, 'text': text, 'final_flag': final_flag,
+                 'logs': logs, 'logs_riesgo': logs_riesgo, 'indices_posibles': indices_posibles,
+                 'df_modelo': ob.df_in}
+    cache_resultados.cache.guardar(clave, 'validacion', resultado)
+    return resultado
+
+
+@st.cache_data(show_spinner=False, max_entries=8)
+def puntuar_archivo(hash_archivo, modelos, _df_modelo):
+    # predict_proba del archivo ya validado, guardado por hash del contenido.
+    # También retorna el df_in que deja predict_proba, base del reporte descriptivo.
+    clave = cache_resultados.cache.clave(hash_archivo, modelos)
+    resultado = cache_resultados.cache.leer(clave, 'prediccion')
+    if resultado is not None:
+        return resultado['Xi'], resultado['Xf'], resultado['df_descriptivo']
+
+    ob = validar_preprocesar_predecir_organizarrtados.Modelos_2(
+        _df_modelo.copy(), registro=cargar_registro_modelos())
+    Xi, Xf = ob.predict_proba()
+    cache_resultados.cache.guardar(
+        clave, 'prediccion', {'Xi': Xi, 'Xf': Xf, 'df_descriptivo': ob.df_in})
+    return Xi, Xf, ob.df_in
 
 # -----------------------------------------------------
 
 
-def download_button(object_to_download, download_filename, button_text, pickle_it=False):
+@st.cache_data(show_spinner=False, max_entries=16)
+def datos_descarga(clave, formato, _df):
+    # Bytes del archivo en memoria. La llave es clave (archivo, modelos y nombre) y
+    # no el DataFrame, que st.cache_data solo muestrea cuando es grande
+    return exportacion.a_bytes(_df, formato)
 
-    # Si pickle_it es True, intenta serializar el objeto con pickle.
-    if pickle_it:
-        try:
-            object_to_download = pickle.dumps(object_to_download)
-        except pickle.PicklingError as e:
-            # Escribe el error en la aplicación Streamlit si hay un problema al hacer pickle.
-            st.write(e)
-            return None
-
-    else:
-        # Si el objeto es un objeto bytes, no hace nada.
-        if isinstance(object_to_download, bytes):
-            pass
-
-        # Si el objeto es un DataFrame, lo convierte a CSV.
-        elif isinstance(object_to_download, pd.DataFrame):
-            object_to_download = object_to_download.to_csv(index=False)
-
-        # Para cualquier otro tipo de objeto, intenta convertirlo a JSON.
-        else:
-            object_to_download = json.dumps(object_to_download)
 
-    # Intenta codificar el objeto en base64.
-    try:
-        b64 = base64.b64encode(object_to_download.encode()).decode()
+def download_excel(df_v, clave, nombre='LogErrores', col=st):
+    # Genera el archivo en memoria (ver exportacion.py) y lo entrega con st.download_button,
+    # sin escribirlo en el directorio de trabajo. En resultados grandes se puede elegir CSV o Parquet.
+    # clave identifica el contenido de df_v (p. ej. la llave del archivo y los modelos).
+    formatos = exportacion.formatos_disponibles(len(df_v))
+    formato = formatos[0]
+    if len(formatos) > 1:
+        formato = col.selectbox('Formato de ' + nombre, formatos,
+                                key='formato_' + nombre)
 
-    except AttributeError as e:
-        b64 = base64.b64encode(object_to_download).decode()
-
-    # Genera un ID único para el botón.
-    button_uuid = str(uuid.uuid4()).replace('-', '')
-    button_id = re.sub('\d+', '', button_uuid)
-
-    # Define el estilo CSS para el botón de descarga.
-    custom_css = f""" 
-        <style>
-            ... (Estilos CSS para el botón) ...
-        </style> """
-
-    # Crea el enlace de descarga usando el objeto codificado en base64 y el estilo CSS.
-    dl_link = custom_css + \
-        f'<a download="{download_filename}" id="{button_id}" href="data:file/txt;base64,{b64}">{button_text}</a><br></br>'
-
-    return dl_link
+    col.download_button(label=nombre,
+                        data=datos_descarga(clave + '/' + nombre, formato, df_v),
+                        file_name=exportacion.nombre_archivo(nombre, formato),
+                        mime=exportacion.mime(formato),
+                        key='descarga_' + nombre)
 
 # La función realiza las siguientes acciones:
 
-# Si pickle_it es True, intenta serializar el objeto proporcionado utilizando pickle.
-# Si el objeto es un DataFrame de Pandas, lo convierte a formato CSV. Si es un objeto bytes, lo deja tal como está. Para cualquier otro tipo de objeto, intenta convertirlo a JSON.
-# Codifica el objeto (ahora en formato de cadena o bytes) en formato base64, que es necesario para la descarga.
-# Genera un ID único para el botón y define un estilo CSS personalizado para él.
-# Crea un enlace de descarga (etiqueta <a>) que utiliza el objeto codificado en base64. Este enlace se presentará como un botón en la interfaz de usuario de Streamlit, gracias a los estilos CSS aplicados.
-# Devuelve el código HTML del botón de descarga como una cadena de texto, que se puede usar con st.markdown en Streamlit para renderizar el botón en la aplicación.
-# -----------------------------------------------------
-
+# Elige el formato: xlsx, o xlsx/CSV/Parquet si el DataFrame supera exportacion.FILAS_FORMATOS_ALTERNOS filas.
+# Convierte el DataFrame (df_v) a bytes en memoria con el formato elegido; la conversión queda en cache por clave, nombre y formato.
+# Muestra un st.download_button en la columna indicada (col), o en la principal si col es st.
 
-def download_excel_torta(df_v, nombre='LogErrores', col=st):
-    # Guarda el DataFrame 'df_v' como un archivo Excel.
-    df_v.to_excel(nombre+'.xlsx', index=False)
-
-    filename = nombre+'.xlsx'  # Define el nombre del archivo.
-    # Abre el archivo en modo de lectura binaria.
-    with open(filename, 'rb') as file:
-        contents = file.read()  # Lee el contenido del archivo.
-
-    # Crea un botón de descarga para el archivo y lo añade a la interfaz Streamlit.
-    if col == st:
-        download_button_str = download_button(contents, filename, nombre)
-        st.markdown(download_button_str, unsafe_allow_html=True)
-    else:
-        download_button_str = download_button(contents, filename, nombre)
-        col.markdown(download_button_str, unsafe_allow_html=True)
-
-# Esta función convierte un DataFrame de Pandas a un archivo Excel y proporciona un botón de descarga en la aplicación Streamlit, ya sea en la página principal o en una columna específica.
 # -----------------------------------------------------
 
-# zzzzzzzzzzzzz,cols = [col11, col12, col13, col14,col15]}
 
+# zzzzzzzzzzzzz,cols = [col11, col12, col13, col14,col15]}
 
-def botones_descarga(Xf=None, variable='RangoConsumo', col=None):
-    # Itera sobre cada categoría única en la columna especificada del DataFrame.
-    for categoria in Xf[variable].unique():
-        # Llama a 'download_excel_torta' para cada categoría.
-        download_excel_torta(
-            Xf[Xf[variable] == categoria], nombre=categoria, col=col)
 
-# Esta función crea botones de descarga para segmentos específicos de un DataFrame, basándose en los valores únicos de una columna dada. Para cada valor único, genera un archivo Excel con los datos filtrados y proporciona un botón de descarga.
+@st.cache_data(show_spinner=False, max_entries=16)
+def datos_segmentos(clave, variable, categoria, _Xf):
+    # Bytes de un segmento (o de todos en un zip si categoria es None), generados
+    # desde un solo índice de grupos. La llave es clave (archivo y modelos), no Xf
+    indices = exportacion.indices_segmentos(_Xf, variable)
+    if categoria is None:
+        return exportacion.zip_segmentos(_Xf, indices)
+    return exportacion.segmento_a_bytes(_Xf, indices[categoria])
+
+
+def botones_descarga(Xf, clave, variable='RangoConsumo', col=None):
+    if col is None:
+        col = st
+    pedidos = st.session_state.setdefault('segmentos_pedidos', set())
+
+    # Un botón por categoría: el archivo se genera solo cuando se pide
+    for categoria in exportacion.indices_segmentos(Xf, variable):
+        pedido = (variable, categoria)
+        if pedido not in pedidos and col.button('Preparar ' + str(categoria),
+                                               key='preparar_' + variable + '_' + str(categoria)):
+            pedidos.add(pedido)
+        if pedido in pedidos:
+            col.download_button(label=str(categoria),
+                                data=datos_segmentos(clave, variable, categoria, Xf),
+                                file_name=exportacion.nombre_archivo(categoria, 'xlsx'),
+                                mime=exportacion.mime('xlsx'),
+                                key='descarga_torta_' + variable + '_' + str(categoria))
+
+    # Todos los segmentos en un zip
+    pedido = (variable, None)
+    if pedido not in pedidos and col.button('Preparar todos (zip)', key='preparar_' + variable + '_zip'):
+        pedidos.add(pedido)
+    if pedido in pedidos:
+        col.download_button(label='Todos (zip)',
+                            data=datos_segmentos(clave, variable, None, Xf),
+                            file_name=variable + '.zip',
+                            mime='application/zip',
+                            key='descarga_torta_' + variable + '_zip')
+
+# Esta función crea botones de descarga para segmentos específicos de un DataFrame, basándose en los valores únicos de una columna dada. Los grupos se calculan una vez (groupby) y el Excel de cada segmento, o el zip con todos, se genera solo cuando el usuario lo pide y queda en cache por clave (archivo y modelos).
 # -----------------------------------------------------
 
 
 def download_txt(nombre, logs):
-    # Define el nombre y la ruta del archivo de texto.
-    archivo_txt = "archivo.txt"
-
-    # Abre el archivo en modo escritura.
-    with open(archivo_txt, "w") as archivo:
-        # Escribe cada valor de la lista en el archivo.
-        for valor in logs:
-            archivo.write(valor + "\n \n")
-
-    # Leer el contenido del archivo.
-    with open(archivo_txt, 'rb') as file:
-        contents = file.read()
+    # Arma el texto de los logs en memoria y lo entrega con st.download_button.
+    st.download_button(label=nombre,
+                       data=exportacion.texto_a_bytes(logs),
+                       file_name="archivo.txt",
+                       mime='text/plain',
+                       key='descarga_' + nombre)
 
-    # Crea y muestra un botón de descarga para el archivo de texto.
-    download_button_str = download_button(contents, archivo_txt, nombre)
-    st.markdown(download_button_str, unsafe_allow_html=True)
-
-    # st.download_button(nombre + '.txt', data=contents, file_name="archivo.txt")
-
-# Esta función crea un archivo de texto con una lista de registros (logs), y luego proporciona un botón de descarga para este archivo en la aplicación Streamlit.
+# Esta función arma un archivo de texto en memoria con una lista de registros (logs), y luego proporciona un botón de descarga para este archivo en la aplicación Streamlit.
 
 # En resumen, estas funciones facilitan la creación de archivos y su descarga desde una interfaz de Streamlit, permitiendo a los usuarios obtener datos en formatos útiles de manera eficiente y organizada.
 # # -----------------------------------------------------
@@ -813,26 +823,26 @@ def main():
         """
 
         try:
-            # Cargar archivos en formato xlsx
-            datos = st.file_uploader("Subir archivos: ", type=["xlsx"])
+            # Cargar archivos en formato xlsx, csv o parquet
+            datos = st.file_uploader(
+                "Subir archivos: ", type=["xlsx", "csv", "parquet"])
 
             if datos is not None:
-                # Leer el archivo Excel y asignar índices
-                dataframe = pd.read_excel(datos)
-                dataframe.index = range(1, len(dataframe)+1)
-
-                try:
-                    # Convertir la columna 'FECHACONSTITUCION' a formato datetime si es posible
-                    dataframe['FECHACONSTITUCION'] = dataframe['FECHACONSTITUCION'].astype(
-                        'datetime64[ns]')
-                except:
-                    pass
-
-                # Validar el archivo
-                original_len = len(dataframe.copy())
-                ob = validar_preprocesar_predecir_organizarrtados.Modelos_2(
-                    dataframe)
-                df_v, text, final_flag = ob.Validar_todo()
+                # El hash del contenido identifica el archivo entre recargas
+                contenido = datos.getvalue()
+                hash_archivo = hashlib.sha256(contenido).hexdigest()
+                if st.session_state.get('hash_archivo') != hash_archivo:
+                    st.session_state['hash_archivo'] = hash_archivo
+                    st.session_state['modelo_ejecutado'] = False
+                    st.session_state['segmentos_pedidos'] = set()
+
+                # Validar el archivo (se reutiliza si el archivo no cambió)
+                validacion = validar_archivo(
+                    hash_archivo, huella_modelos(), contenido,
+                    lector_archivos.formato_archivo(datos.name))
+                dataframe = validacion['dataframe']
+                original_len = len(dataframe)
+                df_v, text, final_flag = validacion['df_v'], validacion['text'], validacion['final_flag']
 
                 # En este bloque, se presenta la sección dedicada al modelo de múltiples clientes. El código utiliza la función st.sidebar.expander para crear #un expander (expandible) en la barra lateral que contiene la funcionalidad del modelo de múltiples clientes. Permite al usuario cargar #archivos en formato xlsx mediante st.file_uploader, leer el archivo Excel, y realizar algunas operaciones como la conversión de la columna #'FECHACONSTITUCION' a formato datetime. Luego, se realiza la validación del archivo utilizando un objeto de la clase Modelos_2 del módulo #validar_preprocesar_predecir_organizarrtados.
 
@@ -846,7 +856,8 @@ def main():
                     # Si la validación del modelo de múltiples clientes indica problemas, se muestra la información de los registros aptos
                     # y se permite al usuario ejecutar el modelo si lo desea.
 
-                    logs, logs_riesgo, indices_posibles = ob.Logs()
+                    logs, logs_riesgo, indices_posibles = validacion['logs'], validacion[
+                        'logs_riesgo'], validacion['indices_posibles']
 
                     if '1' not in logs_riesgo:
                         tx_registros_aptos = str('Registros aptos para recomendar: ') + str(len(
@@ -893,10 +904,23 @@ def main():
 
 # Bloque 4: Ejecución del modelo y visualización de resultados
 
+    # Una vez ejecutado, los resultados se siguen mostrando en las recargas
+    # mientras no cambie el archivo
+    if b == True:
+        st.session_state['modelo_ejecutado'] = True
+    elif st.session_state.get('modelo_ejecutado', False) and datos is not None:
+        b = True
+
     if b == True:
         with vista1:    # Modelo Múltiples Clientes
             try:
-                Xi, Xf = ob.predict_proba()
+                Xi, Xf, df_descriptivo = puntuar_archivo(
+                    hash_archivo, huella_modelos(), validacion['df_modelo'])
+                # Identifica el resultado (archivo + modelos) en los caches de descarga
+                clave_resultado = cache_resultados.cache.clave(
+                    hash_archivo, huella_modelos())
+                ob = validar_preprocesar_predecir_organizarrtados.Modelos_2(
+                    df_descriptivo, registro=cargar_registro_modelos())
 
                 # Modifico nombres de categorías
                 keys = ['SINCATALOGAR', 'MENORA5000',
@@ -1068,7 +1092,7 @@ def main():
                 dic2 = ['TC One Rewards Gold', 'TC Visa Avianca LifeMiles', 'Seguro Tarjeta Protegida',
                         'Seguro de Desempleo', 'Asistencia Mascotas', 'Seguro de Vida', 'Asistencia Integral', 'Seguro Auto']
                 Xf = Xf.replace(dict(zip(dic1, dic2)))
-                download_excel(Xf, 'Resultado', col=col2_container1)
+                download_excel(Xf, clave_resultado, 'Resultado', col=col2_container1)
 
                 # Visualización de gráficos de dona
                 dona_plotly(df_prob_prod=df_prob_prod, producto='INSTALACIONES',
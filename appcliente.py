@@ -2,6 +2,7 @@
 from datetime import date
 import logging
 import os
+import hashlib
 import sys
 from typing import Union
 from io import StringIO
@@ -25,6 +26,11 @@ from google.cloud import storage
 
 # Librerías específicas del proyecto
 import validar_preprocesar_predecir_organizarrtados
+import registro_modelos
+import modelo_unitario
+import lector_archivos
+import exportacion
+import motor_validacion
 from sklearn.preprocessing import OneHotEncoder
 
 # Librerías propias
@@ -219,17 +225,51 @@ def validate_assertion(assertion):
 # ----------------------------------------------------
 
 
-def download_excel(df_v, nombre='LogErrores'):
-    # Guardar el DataFrame como un archivo Excel con el nombre proporcionado
-    df_v.to_excel(nombre+'.xlsx', index=False)
+def cargar_registro_modelos():
+    # Todas las sesiones comparten el registro del proceso; recargar() solo vuelve
+    # a leer los .pkl cuyo archivo cambió en disco (mtime/tamaño y hash)
+    recargados = registro_modelos.registro.recargar()
+    if recargados:
+        logging.info('Modelos cargados: %s', recargados)
+    return registro_modelos.registro
 
-    # Leer el contenido del archivo Excel recién creado
-    with open(nombre+'.xlsx', 'rb') as file:
-        contents = file.read()
 
-    # Crear un botón de descarga en Streamlit para el archivo Excel
+def huella_modelos():
+    # Cambia si se recarga algún .pkl; forma parte de la llave de las descargas
+    return tuple(sorted(cargar_registro_modelos().hashes().items()))
+
+
+@st.cache_resource(max_entries=1)
+def cargar_puntuador_unitario(huella):
+    # Vectores e índices del modelo unitario resueltos una vez por versión de
+    # los modelos (huella_modelos)
+    return modelo_unitario.PuntuadorUnitario(registro=cargar_registro_modelos())
+
+# ----------------------------------------------------
+
+
+@st.cache_data(show_spinner=False, max_entries=16)
+def datos_descarga(clave, formato, _df):
+    # Bytes del archivo en memoria. La llave es clave (archivo, modelos y nombre) y
+    # no el DataFrame, que st.cache_data solo muestrea cuando es grande
+    return exportacion.a_bytes(_df, formato)
+
+
+def download_excel(df_v, clave, nombre='LogErrores'):
+    # Generar el archivo en memoria (ver exportacion.py), sin escribirlo en disco;
+    # en resultados grandes se puede elegir CSV o Parquet. clave identifica el
+    # contenido de df_v (archivo subido o campos del modelo unitario, y modelos)
+    formatos = exportacion.formatos_disponibles(len(df_v))
+    formato = formatos[0]
+    if len(formatos) > 1:
+        formato = st.selectbox('Formato de ' + nombre, formatos,
+                               key='formato_' + nombre)
+
+    # Crear un botón de descarga en Streamlit para el archivo
     st.download_button(label='Descargar '+nombre,
-                       data=contents, file_name=nombre+'.xlsx')
+                       data=datos_descarga(clave + '/' + nombre, formato, df_v),
+                       file_name=exportacion.nombre_archivo(nombre, formato),
+                       mime=exportacion.mime(formato))
 
 # ----------------------------------------------------
 
@@ -407,10 +447,16 @@ def main():
 
     with st.sidebar.expander("MODELO MÚLTIPLES CLIENTES ", expanded=False):
 
-        datos = st.file_uploader("Subir archivos: ", type=["xlsx"])
+        datos = st.file_uploader(
+            "Subir archivos: ", type=["xlsx", "csv", "parquet"])
         # b=False
         if datos is not None:
-            dataframe = pd.read_excel(datos, index_col=0)
+            # Lectura en streaming (ver lector_archivos.py)
+            dataframe = lector_archivos.leer_archivo(datos, index_col=0)
+            # Archivo y modelos identifican los resultados en el cache de descargas
+            clave_archivo = hashlib.sha256(datos.getvalue()).hexdigest() + \
+                '/' + repr(huella_modelos())
+            logging.info('Lectura %s: %s', datos.name, lector_archivos.ultimo_reporte)
             # st.write(dataframe)
             # subir archivo al bucket en gcloud
             # urlarchivo = upload(bytes_data,CLOUD_STORAGE_BUCKET,'datos')
@@ -423,12 +469,12 @@ def main():
                 pass
             # Validación archivo
             ob = validar_preprocesar_predecir_organizarrtados.Modelos_2(
-                dataframe)
+                dataframe, registro=cargar_registro_modelos())
             df_v, text, final_flag = ob.Validar_todo()
 
             if final_flag == False:
                 st.write(df_v)
-                download_excel(df_v)
+                download_excel(df_v, clave_archivo)
             else:
                 st.write(text)
                 b = st.button("Ejecutar Modelo", type="primary")
@@ -441,8 +487,8 @@ def main():
                                 value='Administración Empresarial')
         tamEmp = st.selectbox("Tamaño de la empresa", [
                               'Gran Empresa', 'Mediana Empresa', 'Pequeña Empresa'])
-        flegal = st.selectbox("Forma Legal", [
-                              'SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA', 'UNDEFINED', 'SCS', 'PERSONANATURAL'])
+        flegal = st.selectbox(
+            "Forma Legal", motor_validacion.ESQUEMA['categorias']['FORMALEGAL'])
         numEmpl = st.number_input("Número de empleados", min_value=1, step=1)
         activos = st.number_input("Activos Totales")
         ingresosOp = st.number_input("Total Ingresos Operativos")
@@ -454,24 +500,17 @@ def main():
 
         # button
         c = st.button("Ejecutar Modelo 1", type="primary")
-        dataframe_u = pd.DataFrame({'NIT9': nit,
-                                    'ACTIVIDADPRINCIPAL(EMIS)': actEcon,
-                                    'TAMANOEMPRESA': tamEmp,
-                                    'FORMALEGAL': flegal,
-                                    'NUMERODEEMPLEADOS': numEmpl,
-                                    'ACTIVOSTOTALES': activos,
-                                    'TOTALINGRESOOPERATIVO': ingresosOp,
-                                    'TOTALDEPATRIMONIO': TotPatr,
-                                    'GANANCIASDESPUESDEIMPUESTOS': ganDespImpto,
-                                    'FECHACONSTITUCION': fecha_constitucion,
-                                    'CONSPROM': consprom}, index=[1])
-        try:
-            dataframe_u['FECHACONSTITUCION'] = dataframe_u['FECHACONSTITUCION'].astype(
-                'datetime64[ns]')
-            dataframe_u['NUMERODEEMPLEADOS'] = dataframe_u['NUMERODEEMPLEADOS'].astype(
-                'int64')
-        except:
-            pass
+        campos_u = {'NIT9': nit,
+                    'ACTIVIDADPRINCIPAL(EMIS)': actEcon,
+                    'TAMANOEMPRESA': tamEmp,
+                    'FORMALEGAL': flegal,
+                    'NUMERODEEMPLEADOS': numEmpl,
+                    'ACTIVOSTOTALES': activos,
+                    'TOTALINGRESOOPERATIVO': ingresosOp,
+                    'TOTALDEPATRIMONIO': TotPatr,
+                    'GANANCIASDESPUESDEIMPUESTOS': ganDespImpto,
+                    'FECHACONSTITUCION': fecha_constitucion,
+                    'CONSPROM': consprom}
         if c == True:
             # Si b es True, ocultar la primera vista
             # Crear un espacio vacío
@@ -481,8 +520,8 @@ def main():
             # placeholder = st.empty()
             # Actualiza el espacio vacío para eliminar la imagen
             # placeholder.empty()
-            ob_u = validar_preprocesar_predecir_organizarrtados.Modelos_2(
-                dataframe_u)
+            # Un solo registro: se puntúa directo, sin pasar por Modelos_2
+            puntuador_u = cargar_puntuador_unitario(huella_modelos())
             # df_v_u, text_u, final_flag_u = ob_u.Validar_todo()
 
             # if final_flag_u == False:
@@ -689,7 +728,7 @@ def main():
 # ----------------------------------------------------
 
                 # st.write(Xf)
-                download_excel(Xf, 'Resultado')
+                download_excel(Xf, clave_archivo, 'Resultado')
 
             except UnboundLocalError:
                 st.warning(
@@ -921,9 +960,10 @@ def main():
             try:
                 st.write("")
                 # st.write(dataframe.head())
-                Xi, Xf = ob_u.predict_proba()
+                Xf = puntuador_u.resultado(campos_u)
                 st.write(Xf)
-                download_excel(Xf, 'Resultado')
+                download_excel(Xf, repr((sorted(campos_u.items()), huella_modelos())),
+                               'Resultado')
     #             )
             except UnboundLocalError:
                 st.warning(
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Benchmark
+
+Mediciones reproducibles de los pasos optimizados sobre el archivo de prueba
+replicado hasta el número de filas pedido. Se corre desde la raíz del
+repositorio:
+
+    python benchmark.py puntuacion --filas 183200 --procesos 1 2 4
+    python benchmark.py actividades --filas 200000
+    python benchmark.py validacion --filas 10000 100000 --anterior fe0bca5
+
+Cada medición se repite --repeticiones veces y se reporta la mejor. Las tablas
+persistentes (sectores, cache) van a un directorio temporal nuevo, así una
+corrida no aprovecha lo que dejó la anterior.
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import types
+
+os.environ.setdefault('APPBASE_CACHE_DIR', tempfile.mkdtemp(prefix='appbase_benchmark_'))
+
+import numpy as np
+import pandas as pd
+
+import lector_archivos
+import puntuacion
+import registro_modelos
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+RUTA_DATOS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                          'Datos_de_prueba-Con_vacios.xlsx')
+
+
+def datos_replicados(filas, ruta=RUTA_DATOS):
+    # Filas del archivo de prueba repetidas en orden hasta completar 'filas'
+    df = lector_archivos.leer_archivo(ruta)
+    df = df.iloc[np.arange(filas) % len(df)]
+    df.index = range(1, filas + 1)
+    return df
+
+
+def medir(funcion, repeticiones):
+    """ (mejor tiempo en segundos, resultado de la última llamada) """
+    mejor = None
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        resultado = funcion()
+        tiempo = time.perf_counter() - inicio
+        mejor = tiempo if mejor is None else min(mejor, tiempo)
+    return mejor, resultado
+
+
+def bench_puntuacion(args):
+    """ puntuacion.puntuar en serie contra el pool de procesos, por modelo.
+        El pool se calienta antes de medir (carga de modelos en los procesos).
+    """
+    ob = vp.Modelos_2(datos_replicados(args.filas))
+    ob.Logs()
+    codificados = ob.Encoder()
+    print('filas codificadas: %d, núcleos: %s, MIN_FILAS_POR_PROCESO: %d'
+          % (len(codificados), os.cpu_count(), puntuacion.MIN_FILAS_POR_PROCESO))
+
+    for nombre in args.modelos:
+        X = codificados[puntuacion.kernel(registro_modelos.registro.obtener(nombre)).columnas]
+        serie = None
+        for n in args.procesos:
+            puntuacion.puntuar(nombre, X, n_procesos=n)
+            tiempo, probas = medir(lambda: puntuacion.puntuar(nombre, X, n_procesos=n),
+                                   args.repeticiones)
+            if serie is None:
+                serie = probas
+            igual = np.array_equal(probas, serie)
+            print('%-7s %d procesos: %7.3f s  %s' % (nombre, n, tiempo,
+                                                      'igual' if igual else 'DISTINTO'))
+    puntuacion.cerrar_pool()
+
+
+def sectores_encadenados(serie):
+    # Referencia: un Series.apply de Modelos_2.sectores por sector, en orden,
+    # y gana el último sector que coincide (Agrupar_actividades original)
+    resultado = pd.Series(None, index=serie.index, dtype=object)
+    for sector, palabras in vp.SECTORES_ACTIVIDAD:
+        etiquetas = serie.apply(lambda x: vp.Modelos_2.sectores(None, x, palabras, sector))
+        resultado = etiquetas.where(etiquetas.notna(), resultado)
+    return resultado
+
+
+def bench_actividades(args):
+    """ ClasificadorSectores contra la cadena de Series.apply por sector, sobre
+        los textos de actividad ya normalizados por transform_load.
+    """
+    df_a, _ = vp.Modelos_2(datos_replicados(args.filas)).transform_load()
+    serie = df_a['ACTIVIDADPRINCIPAL(EMIS)'].fillna('SIN ACTIVIDAD')
+    print('textos: %d (%d distintos)' % (len(serie), serie.nunique()))
+
+    t_cadena, cadena = medir(lambda: sectores_encadenados(serie), args.repeticiones)
+    t_clasificador, sectores = medir(lambda: vp.clasificador_sectores.clasificar(serie),
+                                     args.repeticiones)
+    igual = cadena.equals(sectores)
+    print('Series.apply por sector: %7.3f s' % t_cadena)
+    print('ClasificadorSectores:    %7.3f s  %s' % (t_clasificador, 'igual' if igual else 'DISTINTO'))
+
+
+def modulo_anterior(revision):
+    # validar_preprocesar_predecir_organizarrtados.py de una revisión de git,
+    # importado con otro nombre para medirlo junto al actual. Los archivos que
+    # lee (rangos, esquema) y los demás módulos son los del árbol actual
+    archivo = vp.__name__ + '.py'
+    contenido = subprocess.run(['git', 'show', revision + ':' + archivo],
+                               capture_output=True, check=True).stdout
+    modulo = types.ModuleType('validar_anterior')
+    modulo.__file__ = vp.__file__
+    sys.modules[modulo.__name__] = modulo
+    exec(compile(contenido, revision + ':' + archivo, 'exec'), modulo.__dict__)
+    return modulo
+
+
+def validar_y_logs(modulo, df):
+    # Los logs se comparan solo en cantidad: llevan la hora y el formato de las
+    # filas vacías cambió (rangos en lugar de una lista de filas)
+    ob = modulo.Modelos_2(df.copy())
+    df_v, text, final_flag = ob.Validar_todo()
+    lista_logs, logs_riesgo, indices_correctos = ob.Logs()
+    return text, final_flag, len(lista_logs), list(logs_riesgo), list(indices_correctos)
+
+
+def bench_validacion(args):
+    """ Validar_todo + Logs sobre la muestra replicada, para cada tamaño; con
+        --anterior también la versión de esa revisión, comparando texto,
+        bandera, cantidad de logs, riesgo e índices correctos.
+    """
+    anterior = modulo_anterior(args.anterior) if args.anterior else None
+    for filas in args.filas:
+        df = datos_replicados(filas)
+        t_actual, actual = medir(lambda: validar_y_logs(vp, df), args.repeticiones)
+        linea = '%8d filas: actual %7.3f s' % (filas, t_actual)
+        if anterior is not None:
+            t_anterior, previo = medir(lambda: validar_y_logs(anterior, df), args.repeticiones)
+            linea += ', %s %7.3f s  %s' % (args.anterior, t_anterior,
+                                           'igual' if previo == actual else 'DISTINTO')
+        print(linea)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark de los pasos optimizados')
+    parser.add_argument('--repeticiones', type=int, default=3)
+    sub = parser.add_subparsers(dest='paso', required=True)
+
+    p = sub.add_parser('puntuacion', help='puntuar en serie contra el pool de procesos')
+    p.add_argument('--filas', type=int, default=183200)
+    p.add_argument('--procesos', type=int, nargs='+', default=[1, 2, 4])
+    p.add_argument('--modelos', nargs='+', default=list(registro_modelos.ARCHIVOS_MODELOS))
+    p.set_defaults(funcion=bench_puntuacion)
+
+    p = sub.add_parser('actividades', help='clasificación de sectores económicos')
+    p.add_argument('--filas', type=int, default=200000)
+    p.set_defaults(funcion=bench_actividades)
+
+    p = sub.add_parser('validacion', help='Validar_todo + Logs')
+    p.add_argument('--filas', type=int, nargs='+', default=[10000, 100000])
+    p.add_argument('--anterior', help='revisión de git con la que comparar (p. ej. fe0bca5)')
+    p.set_defaults(funcion=bench_validacion)
+
+    args = parser.parse_args(argv)
+    args.funcion(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+"""Cache de resultados
+
+Cache en disco de los resultados de una cartera, direccionado por contenido:
+la llave es el SHA-256 del archivo subido junto con los hashes de los modelos.
+Cada entrada es una carpeta con una parte por etapa ('validacion',
+'prediccion'); los DataFrames se guardan en Parquet y el resto (textos, logs,
+banderas, índices) en un JSON. Las entradas vencen por TTL y, si el total
+supera el tamaño máximo, se eliminan las de acceso más antiguo (LRU).
+"""
+
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import pandas as pd
+
+from validar_preprocesar_predecir_organizarrtados import DIR_CACHE
+
+
+DIR_RESULTADOS = os.path.join(DIR_CACHE, 'resultados')
+
+# Límites configurables por entorno
+MAX_BYTES = int(os.environ.get('APPBASE_CACHE_MAX_MB', '512')) * (1 << 20)
+TTL_SEGUNDOS = int(os.environ.get('APPBASE_CACHE_TTL_HORAS', '24')) * 3600
+
+
+def _a_json(valor):
+    # Escalares de numpy (bool_, int64, ...) a tipos de Python
+    if hasattr(valor, 'item'):
+        return valor.item()
+    if isinstance(valor, (set, tuple)):
+        return list(valor)
+    raise TypeError(type(valor).__name__)
+
+
+class CacheResultados():
+
+    """ Cache en disco de resultados por (archivo, modelos).
+
+        guardar(clave, parte, datos) recibe un dict; leer(clave, parte)
+        devuelve el mismo dict o None si no existe o venció.
+    """
+
+    def __init__(self, directorio=DIR_RESULTADOS, max_bytes=MAX_BYTES, ttl=TTL_SEGUNDOS):
+        self.directorio = directorio
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(hash_archivo, hashes_modelos):
+        """ Llave de la entrada: archivo + huella de cada modelo. """
+        h = hashlib.sha256(hash_archivo.encode())
+        for nombre, huella in sorted(dict(hashes_modelos).items()):
+            h.update(('|' + nombre + ':' + huella).encode())
+        return h.hexdigest()
+
+    def _ruta(self, clave, parte=None):
+        ruta = os.path.join(self.directorio, clave)
+        return ruta if parte is None else os.path.join(ruta, parte)
+
+    def leer(self, clave, parte):
+        ruta = self._ruta(clave, parte)
+        meta_path = os.path.join(ruta, 'meta.json')
+        try:
+            creado = os.path.getmtime(meta_path)
+        except OSError:
+            return None
+        if self.ttl is not None and time.time() - creado > self.ttl:
+            self.eliminar(clave)
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as file:
+                meta = json.load(file)
+            datos = dict(meta['valores'])
+            for nombre in meta['frames']:
+                datos[nombre] = pd.read_parquet(os.path.join(ruta, nombre + '.parquet'))
+        except Exception:   # Entrada incompleta o ilegible: se trata como ausente
+            self.eliminar(clave)
+            return None
+        # El acceso se marca en la carpeta de la entrada (orden LRU)
+        try:
+            os.utime(self._ruta(clave))
+        except OSError:
+            pass
+        return datos
+
+    def guardar(self, clave, parte, datos):
+        """ Escribe la parte en una carpeta temporal y la publica con os.replace;
+            meta.json es lo último que se escribe. Si algo no se puede guardar
+            (p. ej. columnas con tipos mezclados que Parquet no acepta) la parte
+            no se guarda y se retorna False.
+        """
+        destino = self._ruta(clave, parte)
+        tmp = destino + '.' + str(os.getpid()) + '.' + str(threading.get_ident()) + '.tmp'
+        try:
+            os.makedirs(tmp, exist_ok=True)
+            frames, valores = [], {}
+            for nombre, valor in datos.items():
+                if isinstance(valor, pd.DataFrame):
+                    valor.to_parquet(os.path.join(tmp, nombre + '.parquet'))
+                    frames.append(nombre)
+                else:
+                    valores[nombre] = valor
+            with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as file:
+                json.dump({'frames': frames, 'valores': valores}, file, default=_a_json)
+            with self._lock:
+                if os.path.isdir(destino):
+                    shutil.rmtree(destino, ignore_errors=True)
+                os.replace(tmp, destino)
+        except Exception:
+            shutil.rmtree(tmp, ignore_errors=True)
+            return False
+        self.limpiar()
+        return True
+
+    def eliminar(self, clave):
+        shutil.rmtree(self._ruta(clave), ignore_errors=True)
+
+    def _entradas(self):
+        # (último acceso, creación, tamaño, clave) de cada entrada
+        entradas = []
+        try:
+            claves = os.listdir(self.directorio)
+        except OSError:
+            return entradas
+        for clave in claves:
+            ruta = self._ruta(clave)
+            if not os.path.isdir(ruta):
+                continue
+            tamano = 0
+            creado = None
+            for base, _, archivos in os.walk(ruta):
+                for a in archivos:
+                    try:
+                        tamano += os.path.getsize(os.path.join(base, a))
+                        if a == 'meta.json':
+                            m = os.path.getmtime(os.path.join(base, a))
+                            creado = m if creado is None else min(creado, m)
+                    except OSError:
+                        pass
+            try:
+                acceso = os.path.getmtime(ruta)
+            except OSError:
+                continue
+            entradas.append((acceso, acceso if creado is None else creado, tamano, clave))
+        return entradas
+
+    def tamano(self):
+        return sum(t for _, _, t, _ in self._entradas())
+
+    def limpiar(self):
+        """ Elimina entradas vencidas (TTL desde que se guardaron) y, si el
+            total supera max_bytes, las de acceso más antiguo. Retorna las
+            claves eliminadas.
+        """
+        eliminadas = []
+        with self._lock:
+            ahora = time.time()
+            vigentes = []
+            for acceso, creado, tamano, clave in self._entradas():
+                if self.ttl is not None and ahora - creado > self.ttl:
+                    self.eliminar(clave)
+                    eliminadas.append(clave)
+                else:
+                    vigentes.append((acceso, tamano, clave))
+            total = sum(t for _, t, _ in vigentes)
+            for acceso, tamano, clave in sorted(vigentes):
+                if total <= self.max_bytes:
+                    break
+                self.eliminar(clave)
+                eliminadas.append(clave)
+                total -= tamano
+        return eliminadas
+
+
+# Instancia única por proceso
+cache = CacheResultados()
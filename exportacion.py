@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""Exportación
+
+Convierte resultados y logs a bytes en memoria para st.download_button, sin
+escribir archivos en el directorio de trabajo (dos sesiones que descargan a la
+vez ya no pisan el mismo 'Resultado.xlsx'). El xlsx se arma con el escritor
+write_only de openpyxl (EscritorBloques) volcando el DataFrame por bloques de
+filas, así que la conversión no duplica el DataFrame completo en objetos.
+Para resultados grandes se ofrecen CSV y Parquet, más rápidos y livianos.
+Las descargas por segmento salen de un único índice de grupos (groupby) y se
+pueden empaquetar todas en un zip en una sola pasada.
+"""
+
+import zipfile
+from io import BytesIO
+
+from procesamiento_por_bloques import EscritorBloques
+
+
+# Formato -> (extensión, tipo MIME)
+FORMATOS = {'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'),
+            'csv': ('.csv', 'text/csv'),
+            'parquet': ('.parquet', 'application/vnd.apache.parquet')}
+
+# Filas que se convierten a la vez al escribir
+FILAS_BLOQUE = 10000
+
+# Desde este tamaño se ofrece elegir CSV o Parquet además de xlsx
+FILAS_FORMATOS_ALTERNOS = 50000
+
+
+def a_bytes(df, formato='xlsx', filas_bloque=FILAS_BLOQUE):
+    """ Contenido del archivo (bytes) con df en el formato pedido, sin índice. """
+    if formato not in FORMATOS:
+        raise ValueError('Formato no soportado: ' + str(formato))
+    if formato == 'parquet':
+        # Un solo bloque: el esquema se infiere con todas las filas
+        filas_bloque = max(len(df), 1)
+    buffer = BytesIO()
+    with EscritorBloques(buffer, formato=formato) as escritor:
+        if len(df) == 0:
+            escritor.escribir(df)
+        for inicio in range(0, len(df), filas_bloque):
+            escritor.escribir(df.iloc[inicio:inicio + filas_bloque])
+    return buffer.getvalue()
+
+
+def texto_a_bytes(lineas, separador='\n \n'):
+    """ Contenido de un .txt con una línea (más separador) por elemento. """
+    return ''.join(str(linea) + separador for linea in lineas).encode('utf-8')
+
+
+def nombre_archivo(nombre, formato='xlsx'):
+    return str(nombre) + FORMATOS[formato][0]
+
+
+def mime(formato='xlsx'):
+    return FORMATOS[formato][1]
+
+
+def formatos_disponibles(n_filas):
+    # xlsx siempre; CSV y Parquet para resultados grandes
+    if n_filas >= FILAS_FORMATOS_ALTERNOS:
+        return ['xlsx', 'csv', 'parquet']
+    return ['xlsx']
+
+
+def indices_segmentos(df, variable):
+    """ Valor de variable -> posiciones (iloc) de sus filas, en orden de
+        aparición. Se calcula una vez con groupby en lugar de un filtro
+        booleano por valor; las filas sin valor no forman segmento.
+    """
+    return df.groupby(variable, sort=False).indices
+
+
+def segmento_a_bytes(df, posiciones, formato='xlsx'):
+    return a_bytes(df.iloc[posiciones], formato)
+
+
+def zip_segmentos(df, indices, formato='xlsx'):
+    """ Zip con un archivo por segmento. Cada segmento se convierte y se
+        agrega al zip antes de pasar al siguiente, así en memoria solo hay un
+        segmento convertido a la vez además del zip.
+    """
+    # xlsx y parquet ya van comprimidos
+    compresion = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+    buffer = BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=compresion) as zf:
+        for valor, posiciones in indices.items():
+            zf.writestr(nombre_archivo(valor, formato),
+                        segmento_a_bytes(df, posiciones, formato))
+    return buffer.getvalue()
@@ -0,0 +1,277 @@
+# -*- coding: utf-8 -*-
+"""Lector de archivos
+
+Lectura de las carteras subidas (xlsx, csv o parquet). El Excel se recorre
+fila a fila con un motor de streaming (python-calamine si está instalado, si
+no openpyxl en modo read_only con values_only) y las filas pasan por el mismo
+TextParser que usa pd.read_excel, así que el DataFrame resultante es el mismo.
+El CSV se parsea por bloques y el Parquet lee solo las columnas pedidas. En
+los tres formatos las columnas de texto conocidas se leen como object y las
+numéricas conocidas como float64, así un mismo contenido da el mismo
+DataFrame. Se puede limitar a las columnas requeridas y cada lectura deja un
+reporte de tiempos.
+"""
+
+import os
+import time
+import unicodedata
+from datetime import date, datetime, time as hora
+import numpy as np
+import pandas as pd
+from pandas.io.parsers import TextParser
+
+
+# Columnas de texto conocidas: se leen como object sin intentar inferir números
+COLUMNAS_TEXTO = ['RAZONSOCIAL', 'CATEGORIADOCUMENTO', 'RANGOCONSUMO', 'RANGODECOMPRA($)',
+                  'RANGORECURRENCIACOMPRA', 'CLUSTERCOMPRADOS', 'TIPOCLIENTE#OPORTUNIDADES',
+                  'TIPOCLIENTE$OPORTUNIDADES', 'ACTIVIDADPRINCIPAL(EMIS)', 'CATEGORIZACIONSECTORES',
+                  'CATEGORIZACIONSECTORESCRECIMIENTOPIB', 'SECTORECONOMICOCIIU', 'TAMANOEMPRESA',
+                  'CIUDAD', 'DEPARTAMENTO', 'CATEGORIADEPARTAMENTO', 'DIRECCION', 'TELEFONO', 'EMAIL',
+                  'ESTATUSOPERACIONAL', 'SEGMENTACIONEMPRESAESC1', 'FORMALEGAL']
+
+# Columnas numéricas conocidas: se entregan como float64 aunque un archivo o un
+# bloque no tenga vacíos ni decimales (read_csv y TextParser inferirían int64)
+COLUMNAS_NUMERICAS = ['NIT9', 'CONSPROM', 'TOTALINGRESOOPERATIVO', 'GANANCIASDESPUESDEIMPUESTOS',
+                      'ACTIVOSTOTALES', 'TOTALDEPATRIMONIO', 'OPORTUNIDADESCOTIZADAS($)']
+
+# Columnas de fecha: en CSV llegan como texto y se parsean (en Excel ya son fechas)
+COLUMNAS_FECHA = ['FECHACONSTITUCION']
+
+# Columnas que usan la validación y los modelos (para lecturas parciales)
+COLUMNAS_MODELO = ['NIT9', 'CONSPROM', 'ACTIVIDADPRINCIPAL(EMIS)', 'TAMANOEMPRESA', 'FORMALEGAL',
+                   'NUMERODEEMPLEADOS', 'ACTIVOSTOTALES', 'TOTALINGRESOOPERATIVO',
+                   'TOTALDEPATRIMONIO', 'GANANCIASDESPUESDEIMPUESTOS', 'FECHACONSTITUCION']
+
+# Columnas que leen las validaciones (cartera y modelo) y la limpieza de transform_load
+COLUMNAS_VALIDACION = COLUMNAS_MODELO + ['RANGOCONSUMO', 'RANGODECOMPRA($)', 'RANGORECURRENCIACOMPRA',
+                                         'CLUSTERCOMPRADOS', 'TIPOCLIENTE#OPORTUNIDADES',
+                                         'TIPOCLIENTE$OPORTUNIDADES', 'CATEGORIZACIONSECTORES',
+                                         'ESTATUSOPERACIONAL', 'CATEGORIADEPARTAMENTO', 'DEPARTAMENTO',
+                                         'CIUDAD', 'OPORTUNIDADESVENDIDAS', 'OPORTUNIDADESCOTIZADAS($)']
+
+# Filas por bloque al parsear CSV
+TAMANO_BLOQUE_CSV = 50000
+
+# Reporte de la última lectura (motor, filas, segundos, filas_por_segundo)
+ultimo_reporte = {}
+
+
+def normalizar_columna(nombre):
+    # Igual que transform_load con los nombres de columna
+    texto = unicodedata.normalize('NFKD', str(nombre)).encode(
+        'ascii', errors='ignore').decode('utf-8')
+    return texto.upper().replace(' ', '').replace('.', '')
+
+
+def formato_archivo(nombre):
+    # 'xlsx', 'csv' o 'parquet' según la extensión
+    ext = os.path.splitext(str(nombre))[1].lower().lstrip('.')
+    if ext in ['xlsx', 'xlsm']:
+        return 'xlsx'
+    if ext in ['csv', 'txt']:
+        return 'csv'
+    if ext in ['parquet', 'pq']:
+        return 'parquet'
+    raise ValueError('Formato no soportado: ' + str(nombre))
+
+
+def normalizar_nulos(df):
+    # openpyxl y pyarrow entregan None en columnas de texto; read_excel/read_csv
+    # entregan NaN, que es lo que transform_load filtra como 'NAN'
+    for c in df.columns[df.dtypes == object]:
+        df[c] = df[c].where(df[c].notna(), np.nan)
+    return df
+
+
+def _seleccion(nombres, columnas):
+    # Nombres del archivo cuyo equivalente normalizado está en columnas (None: todos)
+    if columnas is None:
+        return list(nombres)
+    requeridas = set(normalizar_columna(c) for c in columnas)
+    return [c for c in nombres if normalizar_columna(c) in requeridas]
+
+
+def tipos_texto(nombres):
+    # dtype object para las columnas de texto conocidas (en todos los bloques)
+    return {c: object for c in nombres if normalizar_columna(c) in COLUMNAS_TEXTO}
+
+
+def fijar_numericos(df):
+    # Columnas numéricas conocidas leídas como enteros -> float64. Si traen texto
+    # quedan como object, así la validación reporta el tipo en vez de fallar al leer
+    for c in df.columns:
+        if normalizar_columna(c) in COLUMNAS_NUMERICAS and df[c].dtype.kind in 'iub':
+            df[c] = df[c].astype(np.float64)
+    return df
+
+
+def _celda(valor):
+    # Misma conversión de celdas que el lector openpyxl de pandas
+    if valor is None:
+        return ''
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    return valor
+
+
+def _filas_openpyxl(fuente):
+    import openpyxl
+    wb = openpyxl.load_workbook(fuente, read_only=True, data_only=True)
+    try:
+        for fila in wb.worksheets[0].iter_rows(values_only=True):
+            yield [_celda(v) for v in fila]
+    finally:
+        wb.close()
+
+
+class _CeldaNoSoportada(Exception):
+    pass
+
+
+def _celda_calamine(valor):
+    # calamine entrega '' en celdas vacías, enteros como float y fechas sin hora
+    if isinstance(valor, float) and valor.is_integer():
+        return int(valor)
+    if isinstance(valor, date) and not isinstance(valor, datetime):
+        return datetime(valor.year, valor.month, valor.day)
+    if isinstance(valor, hora):
+        # Las fechas anteriores a 1900 llegan como 00:00:00: se relee con openpyxl
+        raise _CeldaNoSoportada()
+    return valor
+
+
+def _filas_calamine(fuente):
+    from python_calamine import CalamineWorkbook
+    if isinstance(fuente, str):
+        wb = CalamineWorkbook.from_path(fuente)
+    else:
+        if hasattr(fuente, 'seek'):
+            fuente.seek(0)
+        wb = CalamineWorkbook.from_filelike(fuente)
+    for fila in wb.get_sheet_by_index(0).iter_rows():
+        yield [_celda_calamine(v) for v in fila]
+
+
+def _calamine_disponible():
+    try:
+        import python_calamine  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# Motores de lectura: nombre -> generador de filas
+MOTORES = {'calamine': _filas_calamine,
+           'openpyxl': _filas_openpyxl}
+
+
+def motor_por_defecto():
+    return 'calamine' if _calamine_disponible() else 'openpyxl'
+
+
+def leer_excel(fuente, columnas=None, motor=None, index_col=None):
+    """ Lee la primera hoja de un Excel (ruta o archivo subido).
+        columnas: nombres requeridos (se comparan normalizados); None lee todas.
+        index_col: como en pd.read_excel (posición dentro de las columnas leídas).
+        Retorna el DataFrame; el reporte queda en ultimo_reporte.
+    """
+    if motor is None:
+        motor = motor_por_defecto()
+
+    inicio = time.perf_counter()
+    try:
+        df = _leer(fuente, columnas, motor, index_col)
+    except _CeldaNoSoportada:
+        motor = 'openpyxl'
+        df = _leer(fuente, columnas, motor, index_col)
+    _reportar(motor, df, inicio)
+    return df
+
+
+def leer_csv(fuente, columnas=None, index_col=None, tamano_bloque=TAMANO_BLOQUE_CSV):
+    """ Lee un CSV por bloques de tamano_bloque filas (read_csv con chunksize)
+        con los mismos tipos de texto que leer_excel.
+    """
+    inicio = time.perf_counter()
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    nombres = list(pd.read_csv(fuente, nrows=0).columns)
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    usecols = _seleccion(nombres, columnas)
+    fechas = [c for c in usecols if normalizar_columna(c) in COLUMNAS_FECHA]
+    bloques = pd.read_csv(fuente, usecols=usecols, dtype=tipos_texto(usecols),
+                          parse_dates=fechas, chunksize=tamano_bloque)
+    # usecols conserva el orden del archivo, no el de la lista
+    df = pd.concat([fijar_numericos(b) for b in bloques], ignore_index=True)[
+        [c for c in nombres if c in usecols]]
+    if index_col is not None:
+        df = df.set_index(df.columns[index_col])
+    _reportar('csv', df, inicio)
+    return df
+
+
+def leer_parquet(fuente, columnas=None, index_col=None):
+    """ Lee un Parquet; con columnas solo se leen esas columnas del archivo. """
+    import pyarrow.parquet as pq
+    inicio = time.perf_counter()
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    archivo = pq.ParquetFile(fuente)
+    df = archivo.read(columns=_seleccion(archivo.schema_arrow.names, columnas)).to_pandas()
+    df = fijar_numericos(normalizar_nulos(df))
+    if index_col is not None:
+        df = df.set_index(df.columns[index_col])
+    _reportar('parquet', df, inicio)
+    return df
+
+
+def leer_archivo(fuente, formato=None, columnas=None, index_col=None):
+    """ Lee una cartera en xlsx, csv o parquet. El formato sale de la extensión
+        (fuente puede ser una ruta o el objeto de st.file_uploader, que trae .name).
+    """
+    if formato is None:
+        formato = formato_archivo(getattr(fuente, 'name', fuente))
+    if formato == 'xlsx':
+        return leer_excel(fuente, columnas=columnas, index_col=index_col)
+    if formato == 'csv':
+        return leer_csv(fuente, columnas=columnas, index_col=index_col)
+    if formato == 'parquet':
+        return leer_parquet(fuente, columnas=columnas, index_col=index_col)
+    raise ValueError('Formato no soportado: ' + str(formato))
+
+
+def _reportar(motor, df, inicio):
+    global ultimo_reporte
+    segundos = time.perf_counter() - inicio
+    ultimo_reporte = {'motor': motor, 'filas': len(df), 'columnas': df.shape[1],
+                      'segundos': segundos,
+                      'filas_por_segundo': len(df) / segundos if segundos > 0 else np.inf}
+
+
+def _leer(fuente, columnas, motor, index_col):
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    filas = MOTORES[motor](fuente)
+    encabezado = next(filas, [])
+    # Se eliminan columnas vacías a la derecha, igual que read_excel
+    while len(encabezado) > 0 and encabezado[-1] == '':
+        encabezado = encabezado[:-1]
+    seleccion = set(_seleccion(encabezado, columnas))
+    posiciones = [k for k, c in enumerate(encabezado) if c in seleccion]
+    ancho = len(encabezado)
+
+    datos = [[encabezado[k] for k in posiciones]]
+    for fila in filas:
+        if len(fila) < ancho:
+            fila = fila + [''] * (ancho - len(fila))
+        datos.append([fila[k] for k in posiciones])
+    # Filas vacías al final de la hoja (read_excel no las trae)
+    while len(datos) > 1 and all(v == '' for v in datos[-1]):
+        datos.pop()
+
+    dtype = tipos_texto(datos[0])
+    df = fijar_numericos(TextParser(datos, header=0, dtype=dtype).read())
+    if index_col is not None:
+        df = df.set_index(df.columns[index_col])
+    return df
@@ -0,0 +1,293 @@
+# -*- coding: utf-8 -*-
+"""Modelo unitario
+
+Puntuación de un solo cliente (formulario MODELO UNITARIO de appcliente.py)
+sin pasar por Modelos_2: los vectores de Cla1 / Cla1-2 / Cla2 se arman
+directamente desde los once campos del formulario con índices ya resueltos.
+Para una sola fila el costo de llamar a xgboost domina, así que los árboles de
+cada modelo se recorren en NumPy (ArbolesOvO) todos a la vez. Al cargarlos se
+comparan con inplace_predict en una muestra; si no coinciden, o el modelo no
+tiene kernel, ese modelo se puntúa con puntuacion.probabilidades.
+"""
+
+import json
+import unicodedata
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+import registro_modelos
+import puntuacion
+from validar_preprocesar_predecir_organizarrtados import (
+    BLOQUES_ONE_HOT, RANGOS_PROBA, clasificador_sectores)
+
+
+# Campos del formulario
+CAMPOS_FORMULARIO = ['NIT9', 'ACTIVIDADPRINCIPAL(EMIS)', 'TAMANOEMPRESA', 'FORMALEGAL',
+                     'NUMERODEEMPLEADOS', 'ACTIVOSTOTALES', 'TOTALINGRESOOPERATIVO',
+                     'TOTALDEPATRIMONIO', 'GANANCIASDESPUESDEIMPUESTOS',
+                     'FECHACONSTITUCION', 'CONSPROM']
+
+# Campos que transform_load exige no vacíos (CONSPROM vacío se toma como 0)
+CAMPOS_REQUERIDOS = [c for c in CAMPOS_FORMULARIO
+                     if c not in ['ACTIVIDADPRINCIPAL(EMIS)', 'CONSPROM']]
+
+CAMPOS_NUMERICOS = ['NUMERODEEMPLEADOS', 'ACTIVOSTOTALES', 'TOTALINGRESOOPERATIVO',
+                    'TOTALDEPATRIMONIO', 'GANANCIASDESPUESDEIMPUESTOS', 'CONSPROM', 'EDAD']
+
+# Orden de los productos en predict_proba (desempate del ranking)
+PRODUCTOS = ['AUMENTOS_CARGA', 'ESTUDIOS', 'INSTALACIONES', 'REDESELECTRICAS',
+             'CUENTASNUEVAS', 'FIBRA_OPTICA', 'ILUMINACION', 'MANTENIMIENTO']
+PRODUCTOS_CLA1 = ['AUMENTOS_CARGA', 'ESTUDIOS', 'INSTALACIONES', 'REDESELECTRICAS']
+PRODUCTOS_CLA2 = ['CUENTASNUEVAS', 'FIBRA_OPTICA', 'ILUMINACION', 'MANTENIMIENTO']
+
+
+def normalizar_texto(valor):
+    # Igual que transform_load: sin tildes, mayúsculas, sin espacios ni puntos
+    texto = unicodedata.normalize('NFKD', str(valor)).encode(
+        'ascii', errors='ignore').decode('utf-8')
+    return texto.upper().replace(' ', '').replace('.', '')
+
+
+class ArbolesOvO():
+
+    """ Árboles de todos los boosters de un KernelOvO en arreglos planos
+        (hijos, variable, umbral, dirección por defecto para faltantes y valor
+        de hoja). Recorre todos los árboles en paralelo, un nivel por
+        iteración, y reproduce inplace_predict en float32.
+    """
+
+    def __init__(self, kernel):
+        hijos, var, umbral, defecto, profundidad = [], [], [], [], []
+        raices, tramos, base = [], [], []
+        inicio = 0
+        for booster, rango, missing in kernel.boosters:
+            if not (isinstance(missing, float) and np.isnan(missing)):
+                raise ValueError('ArbolesOvO solo soporta missing=nan')
+            modelo = json.loads(booster.save_raw('json'))['learner']
+            if modelo['objective']['name'] != 'binary:logistic':
+                raise ValueError('Objetivo no soportado')
+            gbtree = modelo['gradient_booster']['model']
+            if int(gbtree['gbtree_model_param']['num_parallel_tree']) != 1:
+                raise ValueError('num_parallel_tree no soportado')
+            p0 = float(modelo['learner_model_param']['base_score'])
+            base.append(np.log(p0 / (1 - p0)))
+            primero = len(raices)
+            for arbol in gbtree['trees'][rango[0]:rango[1]]:
+                if any(t != 0 for t in arbol['split_type']):
+                    raise ValueError('Splits categóricos no soportados')
+                n = len(arbol['left_children'])
+                nodos = np.arange(n) + inicio
+                izq = np.asarray(arbol['left_children'])
+                es_hoja = izq == -1
+                # Las hojas apuntan a sí mismas: recorrer de más no las mueve
+                hijos.append(np.column_stack([np.where(es_hoja, nodos, izq + inicio),
+                                              np.where(es_hoja, nodos, np.asarray(arbol['right_children']) + inicio)]))
+                var.append(np.where(es_hoja, 0, np.asarray(arbol['split_indices'])))
+                umbral.append(np.asarray(arbol['split_conditions'], dtype=np.float32))
+                defecto.append(np.asarray(arbol['default_left'], dtype=bool))
+                # Profundidad máxima del árbol (los padres van antes que los hijos)
+                nivel = np.zeros(n, dtype=np.intp)
+                for k in range(n):
+                    if not es_hoja[k]:
+                        nivel[izq[k]] = nivel[arbol['right_children'][k]] = nivel[k] + 1
+                profundidad.append(nivel.max())
+                raices.append(inicio)
+                inicio += n
+            tramos.append((primero, len(raices)))
+        self.hijos = np.concatenate(hijos)
+        self.var = np.concatenate(var)
+        self.umbral = np.concatenate(umbral)
+        self.defecto = np.concatenate(defecto)
+        self.profundidad = int(max(profundidad))
+        self.raices = np.asarray(raices, dtype=np.intp)
+        self.tramos = tramos        # árboles [primero, último) de cada booster
+        self.base = np.asarray(base, dtype=np.float32)
+        # Con igual número de árboles por booster las hojas se suman como matriz
+        largos = set(f - i for i, f in tramos)
+        self.arboles_por_booster = largos.pop() if len(largos) == 1 else None
+
+    def probabilidades_pares(self, x_u):
+        """ Probabilidad de la clase j de cada par (i, j) para una fila x_u (float32). """
+        nodo = self.raices
+        hay_nan = np.isnan(x_u).any()
+        for _ in range(self.profundidad):
+            v = x_u[self.var[nodo]]
+            a_izq = v < self.umbral[nodo]
+            if hay_nan:
+                a_izq = np.where(np.isnan(v), self.defecto[nodo], a_izq)
+            nodo = self.hijos[nodo, (~a_izq).view(np.int8)]
+        # Margen = base + hojas sumadas árbol por árbol en float32, como xgboost
+        valores = self.umbral[nodo]
+        if self.arboles_por_booster is not None:
+            hojas = np.column_stack([self.base, valores.reshape(len(self.tramos), -1)])
+            margen = np.cumsum(hojas, axis=1, dtype=np.float32)[:, -1]
+        else:
+            margen = np.array([np.cumsum(np.concatenate(([self.base[b]], valores[i:f])),
+                                         dtype=np.float32)[-1]
+                               for b, (i, f) in enumerate(self.tramos)], dtype=np.float32)
+        return np.float32(1) / (np.float32(1) + np.exp(-margen))
+
+
+def validar_arboles(arboles, k, X_test, tol=1e-6):
+    """ Máxima diferencia absoluta entre ArbolesOvO e inplace_predict de cada
+        booster, fila por fila de X_test; lanza ValueError si supera tol.
+    """
+    X_u = k.estandarizar(X_test)
+    # Algunos faltantes para recorrer también la dirección por defecto
+    X_u[np.arange(0, len(X_u), 4), np.arange(0, len(X_u), 4) % X_u.shape[1]] = np.nan
+    P = np.column_stack([booster.inplace_predict(X_u, iteration_range=rango, missing=missing,
+                                                 predict_type='value')
+                         for booster, rango, missing in k.boosters])
+    dif = max(float(np.max(np.abs(arboles.probabilidades_pares(x_u) - p)))
+              for x_u, p in zip(X_u, P))
+    if dif > tol:
+        raise ValueError(f'ArbolesOvO difiere de inplace_predict: {dif:.3g}')
+    return dif
+
+
+def arboles_validados(k):
+    # ArbolesOvO de k si reproduce a xgboost en la muestra del kernel; si no, None
+    try:
+        arboles = ArbolesOvO(k)
+        validar_arboles(arboles, k, puntuacion.muestra_kernel(k))
+    except (KeyError, ValueError):
+        return None
+    return arboles
+
+
+def decision_fila(pares, n_clases, p):
+    # KernelOvO.decision_desde_pares para una sola fila, en floats de Python
+    # (mismo orden de sumas en float64, sin el costo de NumPy por operación)
+    votos = [0.0] * n_clases
+    confianza = [0.0] * n_clases
+    for (i, j), pk in zip(pares, p.tolist()):
+        if pk > 0.5:
+            votos[j] += 1
+        else:
+            votos[i] += 1
+        confianza[i] -= pk
+        confianza[j] += pk
+    return np.array([[v + c / (3 * (abs(c) + 1)) for v, c in zip(votos, confianza)]])
+
+
+class PuntuadorUnitario():
+
+    """ Puntúa un registro (dict con los campos del formulario).
+        Las posiciones de cada variable en el vector de cada modelo se
+        resuelven una vez al crear el objeto.
+    """
+
+    def __init__(self, registro=None):
+        self.registro = registro if registro is not None else registro_modelos.registro
+
+        # Vector completo: numéricas + indicadores T*, F*, A*, M*
+        self.variables = list(CAMPOS_NUMERICOS)
+        self.posicion_categoria = {}
+        for campo, columnas, categorias in BLOQUES_ONE_HOT:
+            inicio = len(self.variables)
+            self.posicion_categoria[campo] = {c: inicio + k for k, c in enumerate(categorias)}
+            self.variables += columnas
+        posicion = {v: k for k, v in enumerate(self.variables)}
+
+        # Por modelo: pipeline, columnas de entrada con sus posiciones en el
+        # vector completo, kernel y árboles (None si no hay kernel o los árboles
+        # no coinciden con xgboost; entonces se usa puntuacion.probabilidades)
+        self.modelos = {}
+        for nombre in ['Cla1', 'Cla1-2', 'Cla2']:
+            modelo = self.registro.obtener(nombre)
+            columnas = list(modelo.named_steps['columntransformer'].feature_names_in_)
+            posiciones = np.array([posicion[c] for c in columnas], dtype=np.intp)
+            k = puntuacion.kernel(modelo)
+            arboles = arboles_validados(k) if k is not None else None
+            self.modelos[nombre] = (modelo, columnas, posiciones, k, arboles)
+
+        self.cortes = [RANGOS_PROBA[p] for p in PRODUCTOS]
+
+    def vector(self, campos):
+        """ Vector completo de variables; None si Modelos_2 descartaría el registro
+            (campos requeridos vacíos o actividad que no se puede agrupar).
+        """
+        for campo in CAMPOS_REQUERIDOS:
+            v = campos.get(campo)
+            if v is None or (not isinstance(v, str) and pd.isna(v)) or normalizar_texto(v) == 'NAN':
+                return None, None
+
+        actividad = normalizar_texto(campos.get('ACTIVIDADPRINCIPAL(EMIS)'))
+        sector = clasificador_sectores.sector(actividad)
+        if sector is None:
+            return None, None
+
+        formalegal = normalizar_texto(campos.get('FORMALEGAL'))
+        if formalegal not in self.posicion_categoria['FORMALEGAL']:
+            formalegal = 'UNDEFINED'
+        mes = datetime.now().month
+        categorias = {'TAMANOEMPRESA': normalizar_texto(campos.get('TAMANOEMPRESA')),
+                      'FORMALEGAL': formalegal,
+                      'ACTIVIDADES': sector,
+                      'MES_OFERTA': 1.0 if mes == 12 else float(mes + 1)}
+
+        fecha = campos.get('FECHACONSTITUCION')
+        if not hasattr(fecha, 'year'):
+            fecha = pd.to_datetime(fecha, errors='coerce')
+        valores = dict(campos)
+        valores['EDAD'] = np.nan if pd.isna(fecha) else datetime.now().year - fecha.year
+
+        x = np.zeros(len(self.variables))
+        for k, campo in enumerate(CAMPOS_NUMERICOS):
+            v = valores.get(campo)
+            x[k] = 0 if v is None or pd.isna(v) else float(v)
+        for campo, valor in categorias.items():
+            try:
+                x[self.posicion_categoria[campo][valor]] = 1
+            except KeyError:
+                # Igual que ord.index(valor) en el encoder
+                raise ValueError(f'{valor!r} is not in list')
+        return x, sector
+
+    def puntuar(self, campos):
+        """ Retorna {'ACTIVIDADES', 'probabilidades', 'ranking'} donde ranking es
+            la lista de (producto, rango, probabilidad) de mayor a menor; None
+            si la actividad no se puede agrupar (Modelos_2 descarta esa fila).
+        """
+        x, sector = self.vector(campos)
+        if x is None:
+            return None
+        consprom = campos.get('CONSPROM')
+        cla1 = 'Cla1-2' if consprom is None or pd.isna(consprom) or consprom == 0 else 'Cla1'
+
+        valores = np.empty(len(PRODUCTOS))
+        for nombre, productos in [(cla1, PRODUCTOS_CLA1), ('Cla2', PRODUCTOS_CLA2)]:
+            modelo, columnas, posiciones, k, arboles = self.modelos[nombre]
+            if arboles is not None:
+                x_u = ((x[posiciones[k.indices]] - k.media) / k.escala).astype(np.float32)
+                P = arboles.probabilidades_pares(x_u)
+                p = puntuacion.softmax(decision_fila(k.pares, k.n_clases, P))[0]
+            else:
+                X = pd.DataFrame(x[posiciones][None, :], columns=columnas)
+                p = puntuacion.probabilidades(modelo, X)[0]
+            for producto, v in zip(productos, p):
+                valores[PRODUCTOS.index(producto)] = v
+
+        orden = np.argsort(-valores, kind='stable')
+        ranking = []
+        for j in orden:
+            cortes, etiquetas = self.cortes[j]
+            rango = etiquetas[int(np.searchsorted(cortes, valores[j], side='right'))]
+            ranking.append((PRODUCTOS[j], rango, valores[j]))
+        return {'ACTIVIDADES': sector,
+                'probabilidades': dict(zip(PRODUCTOS, valores)),
+                'ranking': ranking}
+
+    def resultado(self, campos):
+        """ Una fila con las mismas columnas que el resultado de predict_proba. """
+        r = self.puntuar(campos)
+        fila = {c.upper(): v for c, v in campos.items()}
+        if r is None:
+            return pd.DataFrame(columns=list(fila) + ['ACTIVIDADES'])
+        fila['ACTIVIDADES'] = r['ACTIVIDADES']
+        for j, (producto, rango, valor) in enumerate(r['ranking']):
+            fila['Producto_'+str(j+1)] = producto
+            fila['Probabilidad_'+str(j+1)] = rango
+            fila['Valor_probabilidad'+str(j+1)] = valor
+        return pd.DataFrame([fila])
@@ -0,0 +1,354 @@
+# -*- coding: utf-8 -*-
+"""Motor de validación
+
+Validación de la cartera a partir de un esquema declarativo
+(esquema_validacion.json): campos requeridos con su tipo (cartera y modelo),
+campos que no admiten negativos, categorías permitidas por campo y categoría
+por defecto. El esquema se lee una vez al importar y MotorValidacion lo
+compila en conjuntos y tipos de numpy que usan todos los chequeos (y el
+Encoder para FORMALEGAL), así que cambiar una categoría no requiere tocar el
+código. MotorValidacion deriva una sola vez los frames normalizados
+(transform_load) y con ellos arma el informe de campos, el texto y la bandera
+de Validar_todo, y luego los logs y los índices correctos de Logs, sin volver
+a normalizar la base para cada chequeo. Los chequeos por columna (tipo y
+categorías) son independientes y se pueden repartir en un pool de hilos; los
+resultados se juntan en el orden del esquema y el tiempo de cada chequeo
+queda en ultimo_reporte.
+"""
+
+import os
+import json
+import time
+import threading
+import numpy as np
+import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
+
+
+# Máximo de rangos de filas que se listan por columna en el log de vacíos.
+# Se configura con APPBASE_MAX_RANGOS_LOG.
+MAX_RANGOS_VACIOS = int(os.environ.get('APPBASE_MAX_RANGOS_LOG', '50'))
+
+# Hilos para los chequeos por columna (1 = sin paralelismo). Se configura con
+# APPBASE_HILOS_VALIDACION.
+HILOS_VALIDACION = int(os.environ.get('APPBASE_HILOS_VALIDACION', '1'))
+
+
+# Esquema de validación (esquema_validacion.json), se puede cambiar con
+# APPBASE_ESQUEMA_VALIDACION:
+#   campos_cartera / campos_modelo: campo -> tipo esperado ('O', 'int', 'float', ...)
+#   tipo_libre: campos cuyo tipo no se exige (p. ej. empleados leídos como float)
+#   enteros: campos que deben tener valores enteros aunque lleguen como float
+#   no_negativos: campos que no admiten valores negativos
+#   campo_actividad: campo con la actividad económica que se agrupa en sectores
+#   categorias: categorías permitidas por campo
+#   campos_requeridos_categorias: campos sin vacíos que debe tener un registro
+#       para revisar sus categorías
+#   categoria_defecto: valor que toman las categorías fuera de la lista (en
+#       lugar de reportarse)
+#   nombres_logs_vacios: nombres con que se reportan las columnas con vacíos
+RUTA_ESQUEMA = os.environ.get('APPBASE_ESQUEMA_VALIDACION', os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), 'esquema_validacion.json'))
+
+CLAVES_ESQUEMA = ['campos_cartera', 'campos_modelo', 'tipo_libre', 'enteros', 'no_negativos',
+                  'campo_actividad', 'categorias', 'campos_requeridos_categorias',
+                  'categoria_defecto', 'nombres_logs_vacios']
+
+
+def cargar_esquema(path=RUTA_ESQUEMA):
+    # Lee el esquema y revisa que esté completo antes de compilarlo
+    with open(path, 'r', encoding='utf-8') as file:
+        esquema = json.load(file)
+    faltantes = [c for c in CLAVES_ESQUEMA if c not in esquema]
+    if len(faltantes) > 0:
+        raise ValueError('esquema_validacion: faltan las claves ' + ', '.join(faltantes))
+    for campo, valor in esquema['categoria_defecto'].items():
+        if valor not in esquema['categorias'].get(campo, []):
+            raise ValueError('esquema_validacion: la categoría por defecto de ' + campo +
+                             ' no está entre sus categorías')
+    return esquema
+
+
+ESQUEMA = cargar_esquema()
+
+
+def rangos_indices(indices, max_rangos=MAX_RANGOS_VACIOS):
+    """ Índices como texto de rangos consecutivos: [1,2,3,7,9,10] -> '1-3,7,9-10'.
+        Si hay más de max_rangos rangos se listan los primeros y se indica
+        cuántos faltan. Índices no enteros se listan uno a uno.
+    """
+    valores = np.asarray(indices)
+    if len(valores) == 0:
+        return ''
+    if valores.dtype.kind in 'iu':
+        cortes = np.flatnonzero(np.diff(valores) != 1) + 1
+        inicios = valores[np.r_[0, cortes]]
+        fines = valores[np.r_[cortes - 1, len(valores) - 1]]
+        partes = [str(a) if a == b else str(a) + '-' + str(b)
+                  for a, b in zip(inicios[:max_rangos], fines[:max_rangos])]
+        total = len(inicios)
+    else:
+        partes = [str(v) for v in valores[:max_rangos]]
+        total = len(valores)
+    texto = ','.join(partes)
+    if total > max_rangos:
+        texto += ',... (' + str(total - max_rangos) + ' rangos más)'
+    return texto
+
+
+class MotorValidacion():
+
+    """ Valida un Modelos_2 según el esquema.
+
+        validar(ob)    -> {'df_v', 'text', 'final_flag'}           (Validar_todo)
+        logs(ob, val)  -> (lista_logs, logs_riesgo, indices_correctos) (Logs)
+
+        Cada etapa pide transform_load una sola vez y todos los chequeos leen
+        esos frames sin modificarlos. Con hilos > 1 los chequeos por columna
+        corren en un ThreadPoolExecutor compartido.
+    """
+
+    def __init__(self, esquema=ESQUEMA, hilos=None):
+        self.esquema = esquema
+        # Hilos para los chequeos por columna; None usa HILOS_VALIDACION
+        self.hilos = HILOS_VALIDACION if hilos is None else hilos
+        self._pool = None
+        self._pool_n = 0
+        self._lock = threading.Lock()
+        # Tiempos de la última validación (segundos por chequeo)
+        self.ultimo_reporte = {}
+        self.campos_cartera = esquema['campos_cartera']
+        self.campos_modelo = esquema['campos_modelo']
+        # Tipos esperados ya convertidos a dtype de numpy
+        self.dtypes = {campo: np.dtype(tipo) for campo, tipo in
+                       list(self.campos_cartera.items()) + list(self.campos_modelo.items())}
+        self.tipo_libre = frozenset(esquema['tipo_libre'])
+        self.enteros = frozenset(esquema['enteros'])
+        self.no_negativos = frozenset(esquema['no_negativos'])
+        self.campo_actividad = esquema['campo_actividad']
+        # Conjuntos inmutables: se arman una vez y se usan con isin
+        self.categorias = {campo: frozenset(valores)
+                           for campo, valores in esquema['categorias'].items()}
+        self.campos_requeridos_categorias = frozenset(
+            esquema['campos_requeridos_categorias'])
+        self.categoria_defecto = esquema['categoria_defecto']
+        self.nombres_logs_vacios = esquema['nombres_logs_vacios']
+
+    # ---------------------------------------------- Ejecución ---------------------------------------------
+    def obtener_pool(self, hilos):
+        """ Pool compartido por las sesiones; se recrea solo si cambia hilos. """
+        with self._lock:
+            if self._pool is None or self._pool_n != hilos:
+                if self._pool is not None:
+                    self._pool.shutdown(wait=True)
+                self._pool = ThreadPoolExecutor(max_workers=hilos,
+                                                thread_name_prefix='validacion')
+                self._pool_n = hilos
+            return self._pool
+
+    @staticmethod
+    def _cronometrar(funcion, args):
+        inicio = time.perf_counter()
+        resultado = funcion(*args)
+        return resultado, time.perf_counter() - inicio
+
+    def ejecutar(self, tareas, tiempos=None):
+        """ Ejecuta tareas [(nombre, funcion, args)] y retorna los resultados
+            en el mismo orden de la lista, sin importar cuál termina primero.
+            Con tiempos (dict) se anota el tiempo de pared de cada tarea.
+        """
+        if self.hilos > 1 and len(tareas) > 1:
+            pool = self.obtener_pool(self.hilos)
+            futuros = [pool.submit(self._cronometrar, funcion, args)
+                       for _, funcion, args in tareas]
+            salidas = [f.result() for f in futuros]
+        else:
+            salidas = [self._cronometrar(funcion, args) for _, funcion, args in tareas]
+        if tiempos is not None:
+            for (nombre, _, _), (_, segundos) in zip(tareas, salidas):
+                # Un campo puede estar en cartera y en modelo: se suman
+                tiempos[nombre] = tiempos.get(nombre, 0.0) + segundos
+        return [resultado for resultado, _ in salidas]
+
+    # ------------------------------------------ Informe de campos ------------------------------------------
+    def estado_tipo(self, df, campo, tipo):
+        # 'OK', 'Validar' o 'Validar negativos no permitidos' para un campo existente
+        return self._estado_serie(df[campo], campo, tipo)
+
+    def _estado_serie(self, serie, campo, tipo):
+        if serie.dtype == tipo:
+            if campo in self.no_negativos and (serie < 0).any():
+                return 'Validar negativos no permitidos'
+            return 'OK'
+        return 'OK' if campo in self.tipo_libre else 'Validar'
+
+    def informe_campos(self, df, campos, tiempos=None):
+        """ Existencia y tipo de cada campo (ValidarCamposCartera/ValidarCamposModelo). """
+        columnas = set(df.columns)
+        presentes = [campo for campo in campos if campo in columnas]
+        # Las columnas se toman en este hilo; las tareas solo leen las series
+        tareas = [('tipo:' + campo, self._estado_serie, (df[campo], campo, self.dtypes[campo]))
+                  for campo in presentes]
+        estados = dict(zip(presentes, self.ejecutar(tareas, tiempos)))
+        existe = ['SI' if campo in columnas else 'NO' for campo in campos]
+        tipo = [estados.get(campo, 'Validar') for campo in campos]
+        return pd.DataFrame({'CAMPO': list(campos.keys()),
+                             'EXISTE': existe,
+                             'TIPO': tipo,
+                             'TIPO_CORRECTO': list(campos.values())})
+
+    # --------------------------------------------- Categorías ----------------------------------------------
+    def categorias_no_esperadas(self, df, campo):
+        # Valores distintos fuera de la lista, en orden de aparición
+        if campo in self.categoria_defecto:
+            # Se reemplazan por la categoría por defecto, que sí es válida
+            return []
+        return self._no_esperadas_serie(df[campo], campo)
+
+    def _no_esperadas_serie(self, serie, campo):
+        return list(serie[~serie.isin(self.categorias[campo])].unique())
+
+    def informe_categorias(self, df, tiempos=None):
+        """ Categorías no esperadas por campo (Validar_categorias_por_campo). """
+        columnas = set(df.columns)
+        revisar = [campo for campo in self.categorias
+                   if campo in columnas and campo not in self.categoria_defecto]
+        tareas = [('categorias:' + campo, self._no_esperadas_serie, (df[campo], campo))
+                  for campo in revisar]
+        no_esperadas = dict(zip(revisar, self.ejecutar(tareas, tiempos)))
+        valido, detalle, recomendacion = [], [], []
+        for campo in self.categorias:
+            if campo not in columnas:
+                valido.append('NO')
+                detalle.append("Validar")
+                recomendacion.append('Validar')
+                continue
+            # Los campos con categoría por defecto no tienen categorías no esperadas
+            nofound = no_esperadas.get(campo, [])
+            if len(nofound) == 0:               # Si todas se encuentran
+                valido.append('SI')
+                detalle.append('OK')
+                recomendacion.append('OK')
+            else:                               # Si no se encuentra al menos una
+                valido.append('NO')
+                detalle.append(str(nofound))
+                recomendacion.append('Validar')
+        return pd.DataFrame({'CAMPO': list(self.categorias.keys()),
+                             'CATEGORIAS_VALIDAS': valido,
+                             'DETALLE_CATEGORIAS': detalle,
+                             'RECOMENDACION_CATEGORIAS': recomendacion})
+
+    # ------------------------------------------------ Validar ----------------------------------------------
+    def validar(self, ob):
+        """ Informe de campos y categorías, texto y bandera final (Validar_todo). """
+        inicio = time.perf_counter()
+        tiempos = {}
+        df, df_con_nulls = ob.transform_load()
+
+        df_report_campos = pd.concat([self.informe_campos(df_con_nulls, self.campos_cartera, tiempos),
+                                      self.informe_campos(df_con_nulls, self.campos_modelo, tiempos)]).reset_index(drop=True)
+
+        actividad = df_report_campos[df_report_campos['CAMPO']
+                                     == self.campo_actividad]
+        if not ((actividad['EXISTE'] == 'SI').all() and (actividad['TIPO'] == 'OK').all()):
+            # Sin actividad no hay registros para agrupar; app.py reporta este
+            # error como un problema con las características del archivo
+            raise UnboundLocalError(
+                'Campo ' + self.campo_actividad + ' ausente o con tipo incorrecto')
+
+        # df es una copia propia: Agrupar_actividades puede agregarle columnas
+        tmp_A = ob.Agrupar_actividades(self.campo_actividad, df_a=df)
+        num_no_agrupados = (tmp_A['ACTIVIDADES']
+                            == 'Actividad_Desconocida').sum()
+
+        df_validar_cat = self.informe_categorias(df_con_nulls, tiempos)
+        df_validar_cat.index = df_validar_cat['CAMPO']
+        df_validar_cat.drop('CAMPO', axis=1, inplace=True)
+
+        if num_no_agrupados > 0:
+            df_validar_cat.loc[self.campo_actividad, 'CATEGORIAS_VALIDAS'] = str(
+                num_no_agrupados)+' Actividades no fueron agrupadas y no se les dará recomendación '
+
+        text = 'Registros aptos para recomendar: ' + \
+            str(tmp_A.shape[0]-num_no_agrupados)
+        flag_A = True
+
+        df_v = pd.merge(df_report_campos, df_validar_cat,
+                        how='outer', on='CAMPO').fillna('No aplica')
+        # TAMANOEMPRESA está en cartera y en modelo: se deja una sola fila
+        df_v.drop(8, axis=0, inplace=True)
+        df_v.reset_index(drop=True, inplace=True)
+
+        bool_tipo = 'Validar' not in df_v['TIPO'].unique()
+        bool_existe = 'NO' not in df_v['EXISTE'].unique()
+        bool_cat = 'NO' not in df_v['CATEGORIAS_VALIDAS'].unique()
+
+        final_flag = flag_A and bool_tipo and bool_existe and bool_cat
+
+        self.ultimo_reporte = {'filas': len(df_con_nulls), 'hilos': self.hilos,
+                               'segundos': time.perf_counter() - inicio, 'chequeos': tiempos}
+
+        return {'df_v': df_v, 'text': text, 'final_flag': final_flag}
+
+    # -------------------------------------------------- Logs -----------------------------------------------
+    def logs(self, ob, validacion):
+        """ Logs de la validación e índices de los registros correctos (Logs). """
+        df_v = validacion['df_v']
+        hora = ob.obtener_hora_fecha()
+        lista_logs = []
+        logs_riesgo = []
+
+        dft, df_con_nulls = ob.transform_load()
+
+        # Campos faltantes
+        campos_faltantes = list(df_v[df_v['EXISTE'] == 'NO']['CAMPO'])
+        if len(campos_faltantes) > 0:
+            lista_logs.append(hora + ' - ' + 'En la tabla cargada no se encuentran algunas columnas necesarias: ' +
+                              ', '.join(map(str, campos_faltantes)))
+            logs_riesgo.append('1')
+
+        # Registros con tipo de dato incorrecto en los campos a validar
+        tipo_incorrecto = df_v[(df_v['TIPO'] == 'Validar') & (df_v['EXISTE'] != 'NO')]
+        tipos = {campo: (str if tipo == 'O' else tipo)
+                 for campo, tipo in zip(tipo_incorrecto['CAMPO'], tipo_incorrecto['TIPO_CORRECTO'])}
+        conteos = ob.contar_registros_por_tipos(dft, tipos)
+        for campo, tipo in tipos.items():
+            ind_tipo_incorrecto, _ = conteos[campo]
+            if len(ind_tipo_incorrecto) > 0:
+                lista_logs.append(hora+' - '+'En la columna '+str(campo) + ' se encontraron '+str(
+                    len(ind_tipo_incorrecto))+' valores que no son del tipo esperado ('+str(tipo)+').')
+                logs_riesgo.append(0)
+
+        # Registros con campos vacíos
+        campos_existentes = ['NIT9'] + \
+            list(df_v[df_v['EXISTE'] == 'SI']['CAMPO'])
+        df_conteo_reg_vacios = ob.obtener_registros_vacios(
+            df_con_nulls[campos_existentes])
+        if len(df_conteo_reg_vacios) > 0:
+            for cc, (conteo, indices) in enumerate(zip(df_conteo_reg_vacios['Registros vacíos'],
+                                                       df_conteo_reg_vacios['Índices de los registros vacíos'])):
+                lista_logs.append(hora+' - '+'En la columna '+str(self.nombres_logs_vacios[cc]) + ' se encontraron '+str(
+                    conteo)+' registros con campos vacios en las filas: '+str(indices)+'.')
+                logs_riesgo.append(0)
+
+        # Registros con categorías no esperadas
+        campos_categorias_no_esperadas = list(df_v[(df_v['CATEGORIAS_VALIDAS'] == 'NO') & (
+            df_v['EXISTE'] != 'NO')]['CAMPO'])
+        revision = ob.validar_categorias_campos(
+            dft, {campo: self.categorias[campo] for campo in campos_categorias_no_esperadas})
+        indices_correctos = set()
+        for campo in campos_categorias_no_esperadas:
+            indices_distintos, indices_posibles, categorias_incorrectas = revision[campo]
+            indices_correctos.update(indices_posibles)
+            if len(indices_distintos) > 0:
+                lista_logs.append(hora+' - '+'En la columna FRECUENCIA_DE_CONTACTO se encontraron '+str(len(indices_distintos)) +
+                                  ' registros con categorias no esperadas: ' +
+                                  ', '.join(map(str, dict.fromkeys(categorias_incorrectas))) +
+                                  ' en las filas '+', '.join(map(str, indices_distintos)))
+                logs_riesgo.append(0)
+
+        return lista_logs, logs_riesgo, list(indices_correctos)
+
+
+# Instancia única por proceso
+motor = MotorValidacion()
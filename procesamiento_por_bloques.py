@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Procesamiento por bloques
+
+Modo streaming para carteras muy grandes: se leen bloques de filas (Excel, CSV
+o Parquet), cada bloque pasa por normalizar -> agrupar actividades ->
+encoder -> Cla1/Cla1-2/Cla2 -> ranking, y los resultados se entregan bloque a
+bloque a un escritor. La memoria máxima depende del tamaño del bloque, no del
+tamaño de la cartera. Todos los bloques se leen con los mismos tipos de texto
+y numéricos que lector_archivos y el Parquet de salida usa el esquema del primer bloque
+ensanchado (vacías -> texto, enteros -> float64), así una columna vacía o
+entera al comienzo no cambia de tipo entre bloques.
+"""
+
+import os
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados
+import registro_modelos
+from lector_archivos import (COLUMNAS_FECHA, fijar_numericos, formato_archivo,
+                             normalizar_columna, normalizar_nulos, tipos_texto)
+
+
+TAMANO_BLOQUE = 50000
+
+
+def _bloques_excel(fuente, tamano_bloque):
+    import openpyxl
+    # Modo read_only: las filas se leen en streaming, sin cargar el DOM completo
+    wb = openpyxl.load_workbook(fuente, read_only=True, data_only=True)
+    try:
+        filas = wb.worksheets[0].iter_rows(values_only=True)
+        columnas = [c for c in next(filas)]
+        tipos = tipos_texto(columnas)
+        bloque = []
+        for fila in filas:
+            bloque.append(fila)
+            if len(bloque) == tamano_bloque:
+                yield fijar_numericos(normalizar_nulos(pd.DataFrame(bloque, columns=columnas).astype(tipos)))
+                bloque = []
+        if len(bloque) > 0:
+            yield fijar_numericos(normalizar_nulos(pd.DataFrame(bloque, columns=columnas).astype(tipos)))
+    finally:
+        wb.close()
+
+
+def _bloques_csv(fuente, tamano_bloque):
+    # Tipos fijos para todos los bloques: una columna de texto vacía en el
+    # primer bloque no se infiere como float
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    nombres = list(pd.read_csv(fuente, nrows=0).columns)
+    if hasattr(fuente, 'seek'):
+        fuente.seek(0)
+    fechas = [c for c in nombres if normalizar_columna(c) in COLUMNAS_FECHA]
+    return (fijar_numericos(b) for b in pd.read_csv(fuente, dtype=tipos_texto(nombres),
+                                                     parse_dates=fechas, chunksize=tamano_bloque))
+
+
+def _bloques_parquet(fuente, tamano_bloque, columnas=None):
+    import pyarrow.parquet as pq
+    archivo = pq.ParquetFile(fuente)
+    for lote in archivo.iter_batches(batch_size=tamano_bloque, columns=columnas):
+        yield fijar_numericos(normalizar_nulos(lote.to_pandas()))
+
+
+def leer_bloques(fuente, formato=None, tamano_bloque=TAMANO_BLOQUE):
+    """ Iterador de DataFrames de a lo sumo tamano_bloque filas.
+        fuente puede ser una ruta o un objeto tipo archivo (p. ej. el de
+        st.file_uploader, que trae .name).
+    """
+    if formato is None:
+        formato = formato_archivo(getattr(fuente, 'name', fuente))
+
+    if formato == 'csv':
+        return _bloques_csv(fuente, tamano_bloque)
+    if formato == 'parquet':
+        return _bloques_parquet(fuente, tamano_bloque)
+    if formato == 'xlsx':
+        return _bloques_excel(fuente, tamano_bloque)
+    raise ValueError('Formato no soportado: ' + str(formato))
+
+
+def puntuar_bloques(bloques, registro=None):
+    """ Ejecuta predict_proba sobre cada bloque y entrega (probas_rangos, resultado).
+        El índice de los resultados continúa entre bloques (1..n como en app.py).
+    """
+    if registro is None:
+        registro = registro_modelos.registro
+    inicio = 0
+    for bloque in bloques:
+        n = len(bloque)
+        if n == 0:
+            continue
+        bloque.index = range(inicio + 1, inicio + n + 1)
+        inicio += n
+        try:
+            bloque['FECHACONSTITUCION'] = bloque['FECHACONSTITUCION'].astype(
+                'datetime64[ns]')
+        except:
+            pass
+
+        ob = validar_preprocesar_predecir_organizarrtados.Modelos_2(
+            bloque, registro=registro)
+        probas_rangos, resultado = ob.predict_proba()
+        # Bloques donde ninguna actividad se pudo agrupar no producen filas
+        if len(resultado) == 0:
+            continue
+        yield probas_rangos, resultado
+
+
+def esquema_parquet(schema):
+    """ Esquema de salida a partir del primer bloque. Los tipos que otro bloque
+        puede cambiar se ensanchan: columnas sin valores -> texto y enteros ->
+        float64 (read_csv infiere cada bloque por separado, y un bloque con
+        vacíos o decimales trae float64). Texto sigue siendo texto: los números
+        de bloques posteriores se convierten a string.
+    """
+    import pyarrow as pa
+    campos = []
+    for campo in schema:
+        if pa.types.is_null(campo.type):
+            campo = campo.with_type(pa.string())
+        elif pa.types.is_integer(campo.type):
+            campo = campo.with_type(pa.float64())
+        campos.append(campo)
+    return pa.schema(campos, metadata=schema.metadata)
+
+
+class EscritorBloques():
+
+    """ Escribe bloques de resultados en csv, parquet o xlsx sin mantenerlos
+        todos en memoria. destino puede ser una ruta o un buffer binario.
+    """
+
+    def __init__(self, destino, formato=None):
+        self.destino = destino
+        self.formato = formato if formato is not None else formato_archivo(destino)
+        self.filas = 0
+        self._columnas = None
+        self._writer = None
+        self._schema = None
+        self._wb = None
+        self._ws = None
+
+    def escribir(self, df):
+        if self._columnas is None:
+            self._columnas = list(df.columns)
+        df = df.reindex(columns=self._columnas)
+
+        if self.formato == 'csv':
+            modo_texto = isinstance(self.destino, (str, os.PathLike))
+            datos = df.to_csv(index=False, header=self.filas == 0)
+            if modo_texto:
+                with open(self.destino, 'w' if self.filas == 0 else 'a', encoding='utf-8', newline='') as file:
+                    file.write(datos)
+            else:
+                self.destino.write(datos.encode('utf-8'))
+
+        elif self.formato == 'parquet':
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabla = pa.Table.from_pandas(df, preserve_index=False)
+            if self._writer is None:
+                self._schema = esquema_parquet(tabla.schema)
+                self._writer = pq.ParquetWriter(self.destino, self._schema)
+            # Cada bloque se convierte al esquema del primero
+            try:
+                tabla = tabla.cast(self._schema)
+            except pa.ArrowInvalid as e:
+                raise ValueError('El bloque desde la fila %d no se puede escribir con el '
+                                 'esquema del primer bloque: %s' % (self.filas + 1, e))
+            self._writer.write_table(tabla)
+
+        elif self.formato == 'xlsx':
+            import openpyxl
+            if self._wb is None:
+                # write_only: las filas se vuelcan al archivo a medida que se agregan
+                self._wb = openpyxl.Workbook(write_only=True)
+                self._ws = self._wb.create_sheet()
+                self._ws.append(self._columnas)
+            for fila in df.astype(object).where(df.notna(), None).itertuples(index=False, name=None):
+                self._ws.append(fila)
+        else:
+            raise ValueError('Formato no soportado: ' + str(self.formato))
+
+        self.filas += len(df)
+
+    def cerrar(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if self._wb is not None:
+            self._wb.save(self.destino)
+            self._wb = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+def puntuar_archivo(fuente, destino, formato=None, formato_destino=None,
+                    tamano_bloque=TAMANO_BLOQUE, registro=None):
+    """ Lee fuente por bloques, puntúa cada uno y lo escribe en destino.
+        Retorna la cantidad de filas escritas.
+    """
+    bloques = leer_bloques(fuente, formato=formato, tamano_bloque=tamano_bloque)
+    with EscritorBloques(destino, formato=formato_destino) as escritor:
+        for _, resultado in puntuar_bloques(bloques, registro=registro):
+            escritor.escribir(resultado)
+    return escritor.filas
@@ -0,0 +1,280 @@
+# -*- coding: utf-8 -*-
+"""Puntuación
+
+Convierte la matriz codificada en probabilidades con los modelos del registro.
+Los pipelines (StandardScaler + OneVsOne de XGBClassifier) se reducen a un
+KernelOvO con los parámetros ya extraídos, que calcula lo mismo que
+decision_function en NumPy con un softmax estable. Opcionalmente reparte las
+filas en bloques entre varios procesos (ProcessPoolExecutor); cada proceso
+carga los modelos una sola vez en su inicializador, así que por tarea solo
+viaja el bloque de datos. El pool se recrea cuando cambian los hashes de los
+modelos del registro (recargar()). Por defecto no hay paralelismo (ver
+N_PROCESOS).
+"""
+
+import os
+import threading
+import weakref
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+
+import registro_modelos
+
+
+# Procesos para puntuar (1 = sin paralelismo). Se configura con APPBASE_N_PROCESOS.
+# Queda en 1 porque repartir no compensó donde se midió (183.200 filas, Cla2:
+# 1 proceso 2,84 s, 2 procesos 3,54 s, 4 procesos 3,30 s; máquina de un núcleo).
+# Subirlo solo si `python benchmark.py puntuacion` muestra ganancia en el equipo
+# de despliegue.
+N_PROCESOS = int(os.environ.get('APPBASE_N_PROCESOS', '1'))
+
+# Por debajo de estas filas por proceso no compensa repartir
+MIN_FILAS_POR_PROCESO = int(os.environ.get('APPBASE_MIN_FILAS_PROCESO', '5000'))
+
+
+def softmax(scores):
+    # Softmax por fila restando el máximo: exp no se desborda con scores grandes
+    z = np.exp(scores - scores.max(axis=1, keepdims=True))
+    return z/z.sum(axis=1, keepdims=True)
+
+
+def rango_iteraciones(est):
+    """ Árboles que usa XGBClassifier.predict (iteration_range): hasta
+        best_iteration si se entrenó con early stopping, si no todos (0, 0).
+        Es lo que hace XGBModel._get_iteration_range(None) en xgboost 1.7.4,
+        con la API pública.
+    """
+    if est.get_params().get('booster') == 'gblinear':
+        return (0, 0)
+    try:
+        return (0, int(est.best_iteration) + 1)
+    except AttributeError:
+        return (0, 0)
+
+
+class KernelOvO():
+
+    """ Parámetros de un pipeline columntransformer -> onevsoneclassifier
+        extraídos una vez:
+          - posiciones de las columnas escaladas y pasadas tal cual
+          - media y escala del StandardScaler (float64 contiguos)
+          - booster de cada par (i, j) del OneVsOne
+        probabilidades(X) reproduce softmax(decision_function) sin pasar por
+        los wrappers de sklearn; cada booster se evalúa una sola vez por par
+        (sklearn lo evalúa dos veces: predict y predict_proba).
+    """
+
+    def __init__(self, modelo):
+        ct = modelo.named_steps['columntransformer']
+        ovo = modelo.named_steps['onevsoneclassifier']
+        if ovo.pairwise_indices_ is not None:
+            raise ValueError('OneVsOne con kernel precomputado no soportado')
+
+        self.columnas = list(ct.feature_names_in_)
+        posicion = {c: k for k, c in enumerate(self.columnas)}
+
+        # Columnas de salida del ColumnTransformer, en su orden
+        indices, media, escala = [], [], []
+        for nombre, trans, cols in ct.transformers_:
+            if trans == 'drop':
+                continue
+            cols = [posicion[c] if isinstance(c, str) else int(c) for c in cols]
+            if trans == 'passthrough':
+                m, e = np.zeros(len(cols)), np.ones(len(cols))
+            elif type(trans).__name__ == 'StandardScaler':
+                m = trans.mean_ if trans.with_mean else np.zeros(len(cols))
+                e = trans.scale_ if trans.with_std else np.ones(len(cols))
+            else:
+                raise ValueError('Transformador no soportado: ' + nombre)
+            indices += cols
+            media.append(m)
+            escala.append(e)
+        self.indices = np.asarray(indices, dtype=np.intp)
+        self.media = np.ascontiguousarray(np.concatenate(media), dtype=np.float64)
+        self.escala = np.ascontiguousarray(np.concatenate(escala), dtype=np.float64)
+
+        self.n_clases = len(ovo.classes_)
+        self.pares = [(i, j) for i in range(self.n_clases)
+                      for j in range(i + 1, self.n_clases)]
+        self.boosters = []
+        for est in ovo.estimators_:
+            if getattr(est, 'objective', None) != 'binary:logistic':
+                raise ValueError('Estimador no soportado: ' + type(est).__name__)
+            self.boosters.append((est.get_booster(), rango_iteraciones(est),
+                                  est.missing))
+
+    def estandarizar(self, X_test):
+        X = X_test[self.columnas].to_numpy(dtype=np.float64) if hasattr(
+            X_test, 'columns') else np.asarray(X_test, dtype=np.float64)
+        X_u = (X[:, self.indices] - self.media) / self.escala
+        # xgboost trabaja en float32: se convierte una vez para todos los pares
+        return np.ascontiguousarray(X_u, dtype=np.float32)
+
+    def decision_function(self, X_test):
+        X_u = self.estandarizar(X_test)
+        P = np.empty((X_u.shape[0], len(self.pares)), dtype=np.float32)
+        for k, (booster, rango, missing) in enumerate(self.boosters):
+            P[:, k] = booster.inplace_predict(X_u, iteration_range=rango, missing=missing,
+                                              predict_type='value')
+        return self.decision_desde_pares(P)
+
+    def decision_desde_pares(self, P):
+        """ Votos + confianzas del OneVsOne a partir de la probabilidad de la
+            clase j de cada par (i, j) (columnas de P en el orden de self.pares).
+        """
+        n = P.shape[0]
+        votos = np.zeros((n, self.n_clases))
+        confianza = np.zeros((n, self.n_clases))
+        for k, (i, j) in enumerate(self.pares):
+            p = P[:, k]
+            gana_j = p > 0.5            # misma regla que XGBClassifier.predict
+            votos[:, i] += ~gana_j
+            votos[:, j] += gana_j
+            confianza[:, i] -= p
+            confianza[:, j] += p
+        # Igual que sklearn.multiclass._ovr_decision_function
+        return votos + confianza / (3 * (np.abs(confianza) + 1))
+
+    def probabilidades(self, X_test):
+        return softmax(self.decision_function(X_test))
+
+
+_kernels = weakref.WeakKeyDictionary()
+
+
+# Filas de la muestra con que se compara cada kernel contra su pipeline
+FILAS_MUESTRA_KERNEL = 64
+
+
+def muestra_kernel(k, filas=FILAS_MUESTRA_KERNEL):
+    """ Filas sintéticas (semilla fija) alrededor de la media del escalador,
+        con las columnas del modelo; sirven para comparar kernel y pipeline.
+    """
+    rng = np.random.default_rng(0)
+    X = np.zeros((filas, len(k.columnas)))
+    X[:, k.indices] = k.media + k.escala * rng.standard_normal((filas, len(k.indices)))
+    return pd.DataFrame(X, columns=k.columnas)
+
+
+def kernel(modelo):
+    """ KernelOvO del pipeline (se extrae una vez por objeto modelo).
+        Antes de usarlo se compara con el pipeline de sklearn en una muestra
+        (validar_kernel); None si el pipeline no tiene la forma esperada o el
+        kernel no coincide, y entonces se usa el pipeline.
+    """
+    try:
+        return _kernels[modelo]
+    except KeyError:
+        pass
+    try:
+        k = KernelOvO(modelo)
+        validar_kernel(modelo, muestra_kernel(k), k=k)
+    except (KeyError, AttributeError, ValueError):
+        k = None
+    _kernels[modelo] = k
+    return k
+
+
+def probabilidades_pipeline(modelo, X_test):
+    """ Camino original con sklearn (referencia para validar el kernel). """
+    X_u = modelo.named_steps['columntransformer'].transform(
+        X_test)  # estandarizo X_test
+    scores = modelo.named_steps['onevsoneclassifier'].decision_function(
+        X_u)  # scores de predicción
+    return softmax(scores)
+
+
+def probabilidades(modelo, X_test):
+    """ Scores del OneVsOne convertidos a probabilidades (softmax por fila). """
+    k = kernel(modelo)
+    if k is None:
+        return probabilidades_pipeline(modelo, X_test)
+    return k.probabilidades(X_test)
+
+
+def validar_kernel(modelo, X_test, tol=1e-6, k=None):
+    """ Máxima diferencia absoluta entre kernel y pipeline sklearn; lanza
+        ValueError si supera tol.
+    """
+    if k is None:
+        k = kernel(modelo)
+        if k is None:
+            raise ValueError('El pipeline no tiene kernel')
+    dif = float(np.max(np.abs(k.probabilidades(X_test) -
+                              probabilidades_pipeline(modelo, X_test)), initial=0))
+    if dif > tol:
+        raise ValueError(f'Kernel difiere del pipeline: {dif:.3g}')
+    return dif
+
+
+# ---------------------------------------- Pool de procesos ----------------------------------------
+_registro_worker = None
+_pool = None
+_pool_firma = None      # (n_procesos, hashes de los modelos) con que se creó el pool
+_pool_lock = threading.Lock()
+
+
+def _inicializar_worker(archivos, directorio):
+    # Corre una vez por proceso: carga los modelos y limita los hilos de xgboost
+    # a uno, el paralelismo lo dan los procesos
+    global _registro_worker
+    _registro_worker = registro_modelos.RegistroModelos(
+        archivos=archivos, directorio=directorio).cargar_todos()
+    for nombre in _registro_worker.archivos:
+        for est in _registro_worker.obtener(nombre).named_steps['onevsoneclassifier'].estimators_:
+            est.set_params(n_jobs=1)
+
+
+def _puntuar_bloque(nombre, X_test):
+    return probabilidades(_registro_worker.obtener(nombre), X_test)
+
+
+def obtener_pool(n_procesos, registro=None):
+    """ Pool compartido del proceso; se recrea si cambia n_procesos o si los
+        modelos del registro cambiaron (los procesos cargaron los anteriores).
+    """
+    global _pool, _pool_firma
+    if registro is None:
+        registro = registro_modelos.registro
+    firma = (n_procesos, tuple(sorted(registro.hashes().items())))
+    with _pool_lock:
+        if _pool is None or _pool_firma != firma:
+            if _pool is not None:
+                _pool.shutdown(wait=True)
+            _pool = ProcessPoolExecutor(max_workers=n_procesos,
+                                        initializer=_inicializar_worker,
+                                        initargs=(registro.archivos, registro.directorio))
+            _pool_firma = firma
+        return _pool
+
+
+def cerrar_pool():
+    global _pool, _pool_firma
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+        _pool = None
+        _pool_firma = None
+
+
+def puntuar(nombre, X_test, registro=None, n_procesos=None):
+    """ Probabilidades del modelo 'nombre' para X_test (DataFrame ya con las
+        columnas del modelo). Con n_procesos > 1 y suficientes filas, X_test se
+        parte en bloques contiguos que se puntúan en paralelo y se unen en el
+        orden original.
+    """
+    if registro is None:
+        registro = registro_modelos.registro
+    if n_procesos is None:
+        n_procesos = N_PROCESOS
+
+    n_bloques = min(n_procesos, len(X_test) // max(MIN_FILAS_POR_PROCESO, 1))
+    if n_bloques <= 1:
+        return probabilidades(registro.obtener(nombre), X_test)
+
+    limites = np.linspace(0, len(X_test), n_bloques + 1).astype(int)
+    bloques = [X_test.iloc[limites[i]:limites[i+1]] for i in range(n_bloques)]
+    pool = obtener_pool(n_procesos, registro)
+    # map conserva el orden de los bloques
+    return np.concatenate(list(pool.map(_puntuar_bloque, [nombre] * n_bloques, bloques)), axis=0)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Registro de modelos
+
+Carga una sola vez por proceso los pipelines serializados en models/ y los
+expone por nombre lógico ('Cla1', 'Cla1-2', 'Cla2').
+"""
+
+import os
+import hashlib
+import threading
+import joblib	    # Para carga de modelo
+
+
+DIR_MODELOS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'models')
+
+# Nombre lógico -> archivo .pkl dentro de models/
+ARCHIVOS_MODELOS = {'Cla1': 'Cla1_Aum_Carg_Red_elec_balanced_v1.pkl',       # Con CONSPROM
+                    'Cla1-2': 'Cla1-2_Aum_Carg_Red_elec_balanced_v2.pkl',   # Sin CONSPROM
+                    'Cla2': 'Cla2_Mant_Cuentas_Ilum_FibraO.pkl'}
+
+
+def hash_archivo(path, bloque=1 << 20):
+    # SHA-256 del archivo leído por bloques
+    h = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(bloque), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class RegistroModelos():
+
+    """ Registro de modelos compartido por todas las sesiones del proceso.
+        Cada .pkl se deserializa una sola vez; recargar() vuelve a leer solo
+        los archivos cuyo mtime/tamaño y hash cambiaron.
+    """
+
+    def __init__(self, archivos=ARCHIVOS_MODELOS, directorio=DIR_MODELOS):
+        self.archivos = dict(archivos)
+        self.directorio = directorio
+        self._modelos = {}
+        self._stat = {}     # nombre -> (mtime_ns, tamaño)
+        self._hash = {}     # nombre -> sha256
+        self._lock = threading.Lock()
+
+    def ruta(self, nombre):
+        return os.path.join(self.directorio, self.archivos[nombre])
+
+    def _firma(self, nombre):
+        st = os.stat(self.ruta(nombre))
+        return (st.st_mtime_ns, st.st_size)
+
+    def _cargar(self, nombre):
+        path = self.ruta(nombre)
+        self._stat[nombre] = self._firma(nombre)
+        self._hash[nombre] = hash_archivo(path)
+        self._modelos[nombre] = joblib.load(path)           # Carga del modelo
+
+    def obtener(self, nombre):
+        modelo = self._modelos.get(nombre)
+        if modelo is None:
+            with self._lock:
+                if nombre not in self._modelos:
+                    self._cargar(nombre)
+                modelo = self._modelos[nombre]
+        return modelo
+
+    def __getitem__(self, nombre):
+        return self.obtener(nombre)
+
+    def cargar_todos(self):
+        for nombre in self.archivos:
+            self.obtener(nombre)
+        return self
+
+    def hashes(self):
+        # Huella de los archivos cargados (para invalidar caches de resultados)
+        self.cargar_todos()
+        return dict(self._hash)
+
+    def recargar(self, nombre=None, forzar=False):
+        """ Vuelve a cargar los modelos cuyo archivo cambió en disco.
+            Retorna la lista de nombres recargados.
+        """
+        nombres = list(self.archivos) if nombre is None else [nombre]
+        recargados = []
+        with self._lock:
+            for n in nombres:
+                if n not in self._modelos:
+                    self._cargar(n)
+                    recargados.append(n)
+                    continue
+                if not forzar and self._firma(n) == self._stat[n]:
+                    continue
+                if not forzar and hash_archivo(self.ruta(n)) == self._hash[n]:
+                    self._stat[n] = self._firma(n)     # Solo cambió el mtime
+                    continue
+                self._cargar(n)
+                recargados.append(n)
+        return recargados
+
+
+# Instancia única por proceso
+registro = RegistroModelos()
@@ -0,0 +1,22 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import tempfile
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+# Las tablas de sectores y el cache de resultados no se escriben en el repositorio
+os.environ.setdefault('APPBASE_CACHE_DIR', tempfile.mkdtemp(prefix='appbase_cache_'))
+
+RUTA_DATOS = os.path.join(RAIZ, 'Datos_de_prueba-Con_vacios.xlsx')
+
+
+@pytest.fixture(scope='session')
+def datos_prueba():
+    import pandas as pd
+    df = pd.read_excel(RUTA_DATOS)
+    df.index = range(1, len(df) + 1)
+    return df
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""Bloque indicador del Encoder: debe coincidir columna por columna con la
+codificación pd.get_dummies + reindex al orden de categorías de los modelos."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def one_hot_referencia(df_tmp):
+    partes = []
+    for campo, columnas, categorias in vp.BLOQUES_ONE_HOT:
+        dummies = pd.get_dummies(df_tmp[campo]).reindex(columns=categorias, fill_value=0)
+        dummies.columns = columnas
+        partes.append(dummies)
+    return pd.concat(partes, axis=1)
+
+
+def _comparar(bloque, referencia):
+    assert list(bloque.columns) == list(referencia.columns)
+    assert bloque.index.equals(referencia.index)
+    for columna in referencia.columns:
+        np.testing.assert_array_equal(bloque[columna].to_numpy(), referencia[columna].to_numpy(),
+                                      err_msg=columna)
+
+
+def test_datos_de_prueba(datos_prueba, monkeypatch):
+    # Se captura el df_tmp con que Encoder llama a bloque_one_hot
+    capturas = []
+    original = vp.Modelos_2.bloque_one_hot
+
+    def capturar(self, df_tmp):
+        capturas.append(df_tmp.copy())
+        return original(self, df_tmp)
+
+    monkeypatch.setattr(vp.Modelos_2, 'bloque_one_hot', capturar)
+    ob = vp.Modelos_2(datos_prueba.copy())
+    ob.Logs()
+    encodificado = ob.Encoder()
+
+    df_tmp = capturas[-1]
+    referencia = one_hot_referencia(df_tmp)
+    _comparar(encodificado[referencia.columns], referencia)
+    # Hay categorías que no aparecen en los datos (p. ej. los demás meses)
+    assert (referencia.sum() == 0).any()
+
+
+def test_categoria_ausente_y_orden():
+    df_tmp = pd.DataFrame({'TAMANOEMPRESA': ['PEQUENAEMPRESA', 'GRANEMPRESA', 'PEQUENAEMPRESA'],
+                           'FORMALEGAL': ['SAS', 'PERSONANATURAL', 'SAS'],
+                           'ACTIVIDADES': ['TRANSPORTE', 'AGROPECUARIO', 'COMERCIO'],
+                           'MES_OFERTA': [12.0, 1.0, 12.0]},
+                          index=[10, 3, 7])
+    bloque = vp.Modelos_2(df_tmp.iloc[:0]).bloque_one_hot(df_tmp)
+    referencia = one_hot_referencia(df_tmp)
+    _comparar(bloque, referencia)
+    # MEDIANAEMPRESA no aparece: su columna queda en ceros
+    assert bloque['T1'].sum() == 0
+
+
+def test_categoria_desconocida():
+    df_tmp = pd.DataFrame({'TAMANOEMPRESA': ['SINCATALOGAR'], 'FORMALEGAL': ['SAS'],
+                           'ACTIVIDADES': ['COMERCIO'], 'MES_OFERTA': [1.0]})
+    with pytest.raises(ValueError, match='SINCATALOGAR'):
+        vp.Modelos_2(df_tmp.iloc[:0]).bloque_one_hot(df_tmp)
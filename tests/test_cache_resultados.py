@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+import cache_resultados
+
+
+def _datos(n=50):
+    return {'df_v': pd.DataFrame({'CAMPO': ['A'] * n, 'VALOR': np.arange(n, dtype=float)}),
+            'text': 'Registros aptos para recomendar: 3', 'final_flag': np.bool_(True),
+            'indices': [1, 2, 3]}
+
+
+def _acceso(cache, clave, segundos):
+    # Fija el último acceso (mtime de la carpeta de la entrada)
+    os.utime(cache._ruta(clave), (segundos, segundos))
+
+
+def test_directorio_por_defecto_en_cache_dir():
+    assert cache_resultados.DIR_RESULTADOS.startswith(os.environ['APPBASE_CACHE_DIR'])
+
+
+def test_guardar_y_leer(tmp_path):
+    cache = cache_resultados.CacheResultados(directorio=str(tmp_path))
+    assert cache.leer('k', 'validacion') is None
+    assert cache.guardar('k', 'validacion', _datos())
+    leido = cache.leer('k', 'validacion')
+    pd.testing.assert_frame_equal(leido['df_v'], _datos()['df_v'])
+    assert (leido['text'], leido['final_flag'], leido['indices']) == \
+        ('Registros aptos para recomendar: 3', True, [1, 2, 3])
+    assert cache.leer('k', 'prediccion') is None
+
+
+def test_clave_cambia_con_los_modelos():
+    clave = cache_resultados.CacheResultados.clave
+    base = clave('abc', {'Cla1': 'h1', 'Cla2': 'h2'})
+    assert clave('abc', [('Cla2', 'h2'), ('Cla1', 'h1')]) == base
+    assert clave('abc', {'Cla1': 'h1', 'Cla2': 'otro'}) != base
+    assert clave('abc', {'Cla1': 'h1'}) != base
+    assert clave('abd', {'Cla1': 'h1', 'Cla2': 'h2'}) != base
+
+
+def test_vencimiento(tmp_path):
+    cache = cache_resultados.CacheResultados(directorio=str(tmp_path), ttl=60)
+    cache.guardar('vieja', 'validacion', _datos())
+    cache.guardar('nueva', 'validacion', _datos())
+    hace = time.time() - 120
+    os.utime(os.path.join(cache._ruta('vieja', 'validacion'), 'meta.json'), (hace, hace))
+    assert cache.leer('vieja', 'validacion') is None
+    assert not os.path.exists(cache._ruta('vieja'))
+    assert cache.leer('nueva', 'validacion') is not None
+
+    # limpiar también elimina las vencidas sin leerlas
+    cache.guardar('otra', 'validacion', _datos())
+    os.utime(os.path.join(cache._ruta('otra', 'validacion'), 'meta.json'), (hace, hace))
+    assert cache.limpiar() == ['otra']
+
+
+def test_lru_por_tamano(tmp_path):
+    cache = cache_resultados.CacheResultados(directorio=str(tmp_path), max_bytes=float('inf'), ttl=None)
+    for clave in ['a', 'b', 'c']:
+        cache.guardar(clave, 'validacion', _datos())
+    tamano = cache.tamano() / 3
+    _acceso(cache, 'a', 1000)
+    _acceso(cache, 'b', 3000)
+    _acceso(cache, 'c', 2000)
+
+    # Caben dos entradas: sale la de acceso más antiguo
+    cache.max_bytes = 2.5 * tamano
+    assert cache.limpiar() == ['a']
+
+    # Leer 'c' la marca como recién usada: al agregar 'd' sale 'b'
+    assert cache.leer('c', 'validacion') is not None
+    cache.guardar('d', 'validacion', _datos())
+    assert sorted(os.listdir(str(tmp_path))) == ['c', 'd']
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""contar_registros_por_tipo: posiciones (iloc) de registros incorrectos y
+correctos, con un frame armado a mano y contra el recorrido valor por valor
+que reemplazó."""
+import numpy as np
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def contar_recorrido(df, columna, tipo_dato):
+    # Implementación anterior (solo para columnas sin texto en NUMERODEEMPLEADOS)
+    incorrectos, correctos = [], []
+    for indice, valor in enumerate(df[columna]):
+        val_float = columna == 'NUMERODEEMPLEADOS' and valor % 1 != 0
+        if not val_float and isinstance(valor, np.dtype(tipo_dato).type):
+            correctos.append(indice)
+        elif val_float:
+            incorrectos.append(indice)
+    return incorrectos, correctos
+
+
+def _df():
+    return pd.DataFrame({'NUMERODEEMPLEADOS': [10.0, 2.5, np.nan, 7.0, -1.0],
+                         'FORMALEGAL': ['SAS', 3, 'LTDA', None, 'SA'],
+                         'OPORTUNIDADESVENDIDAS': pd.Series([1, 2, 3, 4, 5], dtype=object)},
+                        index=[11, 12, 13, 14, 15])
+
+
+def test_enteros_cuentan_decimales_y_vacios_como_incorrectos():
+    ob = vp.Modelos_2(_df())
+    # 2.5 y NaN no son enteros; los float no son instancia de int
+    assert ob.contar_registros_por_tipo(_df(), 'NUMERODEEMPLEADOS', 'int') == ([1, 2], [])
+    # En una columna object el texto no numérico también es incorrecto
+    df = pd.DataFrame({'NUMERODEEMPLEADOS': pd.Series([3, 'x', 4.5, 8], dtype=object)})
+    assert ob.contar_registros_por_tipo(df, 'NUMERODEEMPLEADOS', 'int') == ([1, 2], [])
+
+
+def test_tipo_por_instancia():
+    ob = vp.Modelos_2(_df())
+    # str se compara con np.str_: los str de Python no son instancia (igual que antes)
+    assert ob.contar_registros_por_tipo(_df(), 'FORMALEGAL', str) == ([], [])
+    assert ob.contar_registros_por_tipo(_df(), 'FORMALEGAL', np.str_) == ([], [])
+    # Enteros de Python en una columna object no son np.int64 (como isinstance)
+    assert ob.contar_registros_por_tipo(_df(), 'OPORTUNIDADESVENDIDAS', 'int') == ([], [])
+    df = pd.DataFrame({'OPORTUNIDADESVENDIDAS': pd.Series([np.int64(1), 2, np.int64(3)], dtype=object)})
+    assert ob.contar_registros_por_tipo(df, 'OPORTUNIDADESVENDIDAS', 'int') == ([], [0, 2])
+
+
+def test_varios_campos_de_una_vez():
+    ob = vp.Modelos_2(_df())
+    tipos = {'NUMERODEEMPLEADOS': 'int', 'FORMALEGAL': str}
+    assert ob.contar_registros_por_tipos(_df(), tipos) == {
+        'NUMERODEEMPLEADOS': ([1, 2], []),
+        'FORMALEGAL': ([], [])}
+
+
+def test_igual_al_recorrido():
+    ob = vp.Modelos_2(_df())
+    casos = [(_df(), 'NUMERODEEMPLEADOS', 'int'), (_df(), 'NUMERODEEMPLEADOS', 'float'),
+             (_df(), 'FORMALEGAL', str), (_df(), 'OPORTUNIDADESVENDIDAS', 'int'),
+             (pd.DataFrame({'NUMERODEEMPLEADOS': [1, 2, 3]}), 'NUMERODEEMPLEADOS', 'int'),
+             (pd.DataFrame({'ACTIVOSTOTALES': pd.Series([1.5, np.float64(2), None], dtype=object)}),
+              'ACTIVOSTOTALES', 'float')]
+    for df, columna, tipo in casos:
+        assert ob.contar_registros_por_tipo(df, columna, tipo) == contar_recorrido(df, columna, tipo), columna
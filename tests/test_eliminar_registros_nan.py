@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Filtro de registros con 'NAN' (transform_load y validar_categorias):
+la máscara vectorizada debe dejar los mismos registros que el recorrido con
+iterrows que reemplazó."""
+import numpy as np
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def eliminar_iterrows(self, df, lista_campos):
+    # Implementación anterior: un drop por cada fila con 'NAN'
+    for index, row in df[lista_campos].iterrows():
+        if 'NAN' in row.values:
+            df = df.drop(index)
+    return df
+
+
+def _sin_hora(logs):
+    # Las líneas empiezan con la hora de ejecución
+    return [str(linea).split(' - ', 1)[-1] for linea in logs]
+
+
+def _ejecutar(datos):
+    ob = vp.Modelos_2(datos.copy())
+    df, df_con_nulls = ob.transform_load()
+    df_v, text, final_flag = ob.Validar_todo()
+    lista_logs, logs_riesgo, indices = ob.Logs()
+    return df, df_v, text, final_flag, _sin_hora(lista_logs), logs_riesgo, sorted(indices), ob.df_in
+
+
+def test_datos_de_prueba_igual_que_iterrows(datos_prueba, monkeypatch):
+    nuevo = _ejecutar(datos_prueba)
+    with monkeypatch.context() as m:
+        m.setattr(vp.Modelos_2, 'eliminar_registros_nan', eliminar_iterrows)
+        anterior = _ejecutar(datos_prueba)
+
+    # Registros que quedan tras el filtro, informe, logs y registros aptos
+    pd.testing.assert_frame_equal(nuevo[0], anterior[0])
+    pd.testing.assert_frame_equal(nuevo[1], anterior[1])
+    assert nuevo[2:7] == anterior[2:7]
+    pd.testing.assert_frame_equal(nuevo[7], anterior[7])
+
+
+def _cartera_sintetica(n, semilla=0):
+    rng = np.random.default_rng(semilla)
+    texto = np.array(['SAS', 'LTDA', 'NAN', 'GRANEMPRESA', 'BOGOTADC'], dtype=object)
+    return pd.DataFrame({'NIT9': np.arange(n),
+                         'FORMALEGAL': texto[rng.choice(5, n, p=[.4, .3, .01, .19, .1])],
+                         'DEPARTAMENTO': texto[rng.choice(5, n, p=[.1, .1, .02, .1, .68])],
+                         'ACTIVOSTOTALES': rng.normal(size=n),
+                         'FECHACONSTITUCION': pd.Timestamp('2000-01-01')},
+                        index=np.arange(1, n + 1))
+
+
+CAMPOS = ['NIT9', 'FORMALEGAL', 'DEPARTAMENTO', 'ACTIVOSTOTALES', 'FECHACONSTITUCION']
+
+
+def test_sintetico_igual_que_iterrows():
+    df = _cartera_sintetica(20000)
+    ob = vp.Modelos_2(df.iloc[:0].copy())
+    pd.testing.assert_frame_equal(ob.eliminar_registros_nan(df, CAMPOS),
+                                  eliminar_iterrows(ob, df, CAMPOS))
+
+
+def test_sintetico_un_millon():
+    # Con 1M de filas el recorrido anterior no termina en un tiempo razonable;
+    # se compara con DataFrame.isin, que no comparte código con la máscara
+    df = _cartera_sintetica(1000000, semilla=1)
+    ob = vp.Modelos_2(df.iloc[:0].copy())
+    esperado = df.index[~df[CAMPOS].isin(['NAN']).any(axis=1)]
+    resultado = ob.eliminar_registros_nan(df, CAMPOS)
+    assert len(resultado) < len(df)
+    # NIT9 identifica cada registro: se comparan los que quedan
+    np.testing.assert_array_equal(resultado.index, esperado)
+    np.testing.assert_array_equal(resultado['NIT9'].to_numpy(), df.loc[esperado, 'NIT9'].to_numpy())
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+import zipfile
+from io import BytesIO
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import exportacion
+import lector_archivos
+
+
+def leer_bytes(contenido, formato):
+    # Con el mismo lector que las cargas (NIT9 vuelve como float64 también en xlsx)
+    return lector_archivos.leer_archivo(BytesIO(contenido), formato=formato)
+
+
+@pytest.fixture
+def resultado():
+    n = 25
+    return pd.DataFrame({'NIT9': np.arange(n, dtype=float) + 1000,
+                         'Sector': ['Industria', 'Comercio', 'Servicios', 'Industria', 'Otro'] * 5,
+                         'Probabilidad 1': np.linspace(0, 1, n)},
+                        index=np.arange(1, n + 1))
+
+
+def test_formatos_disponibles():
+    assert exportacion.formatos_disponibles(0) == ['xlsx']
+    assert exportacion.formatos_disponibles(exportacion.FILAS_FORMATOS_ALTERNOS - 1) == ['xlsx']
+    assert exportacion.formatos_disponibles(exportacion.FILAS_FORMATOS_ALTERNOS) == ['xlsx', 'csv', 'parquet']
+
+
+@pytest.mark.parametrize('formato', list(exportacion.FORMATOS))
+def test_a_bytes_ida_y_vuelta(resultado, formato):
+    # Bloques más chicos que el DataFrame: el archivo tiene todas las filas, sin índice
+    contenido = exportacion.a_bytes(resultado, formato, filas_bloque=10)
+    pd.testing.assert_frame_equal(leer_bytes(contenido, formato), resultado.reset_index(drop=True))
+
+
+@pytest.mark.parametrize('formato', list(exportacion.FORMATOS))
+def test_a_bytes_vacio(resultado, formato):
+    leido = leer_bytes(exportacion.a_bytes(resultado.iloc[:0], formato), formato)
+    assert len(leido) == 0
+    assert list(leido.columns) == list(resultado.columns)
+
+
+def test_a_bytes_formato_no_soportado(resultado):
+    with pytest.raises(ValueError, match='Formato no soportado'):
+        exportacion.a_bytes(resultado, 'json')
+
+
+def test_nombre_mime_y_texto():
+    assert exportacion.nombre_archivo('Resultado', 'parquet') == 'Resultado.parquet'
+    assert exportacion.mime('csv') == 'text/csv'
+    assert exportacion.texto_a_bytes(['a', 1]) == 'a\n \n1\n \n'.encode('utf-8')
+
+
+def test_indices_segmentos(resultado):
+    resultado.loc[5, 'Sector'] = None
+    indices = exportacion.indices_segmentos(resultado, 'Sector')
+    # Orden de aparición; las filas sin valor no forman segmento
+    assert list(indices) == ['Industria', 'Comercio', 'Servicios', 'Otro']
+    # Posiciones iloc, no etiquetas del índice
+    assert list(indices['Comercio']) == [1, 6, 11, 16, 21]
+    assert list(indices['Otro']) == [9, 14, 19, 24]
+    assert sum(len(p) for p in indices.values()) == len(resultado) - 1
+    for valor, posiciones in indices.items():
+        assert (resultado['Sector'].iloc[posiciones] == valor).all()
+
+
+@pytest.mark.parametrize('formato', list(exportacion.FORMATOS))
+def test_segmento_a_bytes(resultado, formato):
+    indices = exportacion.indices_segmentos(resultado, 'Sector')
+    leido = leer_bytes(exportacion.segmento_a_bytes(resultado, indices['Servicios'], formato), formato)
+    esperado = resultado[resultado['Sector'] == 'Servicios'].reset_index(drop=True)
+    pd.testing.assert_frame_equal(leido, esperado)
+
+
+@pytest.mark.parametrize('formato', list(exportacion.FORMATOS))
+def test_zip_segmentos(resultado, formato):
+    indices = exportacion.indices_segmentos(resultado, 'Sector')
+    with zipfile.ZipFile(BytesIO(exportacion.zip_segmentos(resultado, indices, formato))) as zf:
+        # Un archivo por segmento, con las mismas filas que su descarga individual
+        assert zf.namelist() == [exportacion.nombre_archivo(v, formato) for v in indices]
+        for valor, posiciones in indices.items():
+            info = zf.getinfo(exportacion.nombre_archivo(valor, formato))
+            comprimido = zipfile.ZIP_DEFLATED if formato == 'csv' else zipfile.ZIP_STORED
+            assert info.compress_type == comprimido
+            pd.testing.assert_frame_equal(
+                leer_bytes(zf.read(info), formato),
+                leer_bytes(exportacion.segmento_a_bytes(resultado, posiciones, formato), formato))
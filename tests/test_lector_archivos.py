@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+import pandas as pd
+import pytest
+
+import lector_archivos
+import procesamiento_por_bloques
+from conftest import RUTA_DATOS
+
+
+@pytest.fixture(scope='module')
+def referencia():
+    # pd.read_excel con los mismos tipos de texto
+    nombres = pd.read_excel(RUTA_DATOS, nrows=0).columns
+    return pd.read_excel(RUTA_DATOS, dtype=lector_archivos.tipos_texto(nombres))
+
+
+@pytest.mark.parametrize('motor', list(lector_archivos.MOTORES))
+def test_excel_igual_a_read_excel(motor, referencia):
+    df = lector_archivos.leer_excel(RUTA_DATOS, motor=motor)
+    pd.testing.assert_frame_equal(df, referencia)
+    # calamine vuelve a leer con openpyxl si hay fechas anteriores a 1900
+    assert lector_archivos.ultimo_reporte['motor'] in [motor, 'openpyxl']
+    assert lector_archivos.ultimo_reporte['filas'] == len(referencia)
+
+
+@pytest.mark.parametrize('motor', list(lector_archivos.MOTORES))
+def test_excel_columnas_e_indice(motor, referencia):
+    df = lector_archivos.leer_excel(RUTA_DATOS, columnas=lector_archivos.COLUMNAS_MODELO,
+                                    motor=motor, index_col=0)
+    # Las columnas se comparan normalizadas y conservan el orden del archivo
+    columnas = [c for c in referencia.columns
+                if lector_archivos.normalizar_columna(c) in lector_archivos.COLUMNAS_MODELO]
+    pd.testing.assert_frame_equal(df, referencia[columnas].set_index(columnas[0]))
+
+
+def test_excel_desde_archivo_subido(referencia):
+    # Objeto tipo archivo (como el de st.file_uploader): se relee desde el inicio
+    with open(RUTA_DATOS, 'rb') as file:
+        file.read(10)
+        df = lector_archivos.leer_archivo(file, formato='xlsx')
+    pd.testing.assert_frame_equal(df, referencia)
+
+
+def test_mismos_datos_en_los_tres_formatos(referencia, tmp_path):
+    # El mismo contenido en xlsx, csv y parquet da el mismo DataFrame
+    referencia.to_csv(tmp_path / 'datos.csv', index=False)
+    referencia.to_parquet(tmp_path / 'datos.parquet', index=False)
+    xlsx = lector_archivos.leer_archivo(RUTA_DATOS)
+    csv = lector_archivos.leer_archivo(str(tmp_path / 'datos.csv'))
+    parquet = lector_archivos.leer_archivo(str(tmp_path / 'datos.parquet'))
+    pd.testing.assert_frame_equal(csv, xlsx)
+    pd.testing.assert_frame_equal(parquet, xlsx)
+
+
+def test_csv_numericas_float_en_todos_los_bloques(tmp_path):
+    # Sin vacíos ni decimales en el primer bloque read_csv inferiría int64
+    n = 300
+    df = pd.DataFrame({'NIT9': range(n), 'CONSPROM': [1200] * n, 'NUMERODEEMPLEADOS': [5] * n})
+    df['CONSPROM'] = df['CONSPROM'].astype(object)
+    df.loc[250, 'CONSPROM'] = None
+    ruta = str(tmp_path / 'datos.csv')
+    df.to_csv(ruta, index=False)
+
+    leido = lector_archivos.leer_csv(ruta, tamano_bloque=100)
+    assert leido['NIT9'].dtype == 'float64'
+    assert leido['CONSPROM'].dtype == 'float64'
+    assert leido['CONSPROM'].isna().sum() == 1
+    # Las columnas que no son numéricas conocidas conservan la inferencia
+    assert leido['NUMERODEEMPLEADOS'].dtype == 'int64'
+
+    bloques = list(procesamiento_por_bloques.leer_bloques(ruta, tamano_bloque=100))
+    assert len(bloques) == 3
+    for bloque in bloques:
+        assert bloque['NIT9'].dtype == 'float64'
+        assert bloque['CONSPROM'].dtype == 'float64'
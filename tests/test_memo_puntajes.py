@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import os
+
+import numpy as np
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def _df_code(nits, valor=0.0):
+    return pd.DataFrame({'NIT9': nits, 'ACTIVOSTOTALES': np.arange(len(nits)) + valor,
+                         'T0': np.uint8(1)})
+
+
+class Puntuador():
+
+    def __init__(self):
+        self.filas = []
+
+    def __call__(self, df):
+        self.filas.append(len(df))
+        return np.tile(df['ACTIVOSTOTALES'].to_numpy()[:, None], (1, len(vp.COLS_PRODUCTO)))
+
+
+def _partes(memo):
+    return sorted(a for a in os.listdir(memo._carpeta('v1')) if a.endswith('.parquet'))
+
+
+def test_reutiliza_y_escribe_solo_filas_nuevas(tmp_path):
+    memo = vp.MemoPuntajes(directorio=str(tmp_path))
+    puntuador = Puntuador()
+    df = _df_code(['1', '2', '3'])
+    primero = memo.puntuar(df, True, 'v1', puntuador)
+    segundo = memo.puntuar(df, True, 'v1', puntuador)
+    np.testing.assert_array_equal(primero, segundo)
+    assert puntuador.filas == [3]
+    assert memo.ultimo_reporte['fraccion_reutilizada'] == 1.0
+    assert len(_partes(memo)) == 1
+
+    # Un NIT9 cambia y otro es nuevo: la parte nueva solo tiene esas dos filas
+    df2 = pd.concat([df.iloc[:2], _df_code(['3', '4'], valor=10.0)], ignore_index=True)
+    memo.puntuar(df2, True, 'v1', puntuador)
+    assert puntuador.filas == [3, 2]
+    partes = _partes(memo)
+    assert len(partes) == 2
+    assert len(pd.read_parquet(os.path.join(memo._carpeta('v1'), partes[-1]))) == 2
+
+    # Otro proceso (instancia nueva) lee las partes y reutiliza todo
+    otro = vp.MemoPuntajes(directorio=str(tmp_path))
+    np.testing.assert_array_equal(otro.puntuar(df2, True, 'v1', Puntuador()),
+                                  memo.puntuar(df2, True, 'v1', puntuador))
+    assert otro.ultimo_reporte['fraccion_reutilizada'] == 1.0
+
+
+def test_limite_de_entradas_y_compactacion(tmp_path, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(vp.time, 'time', lambda: reloj[0])
+    memo = vp.MemoPuntajes(directorio=str(tmp_path), max_entradas=4, max_partes=2)
+    for k in range(4):
+        reloj[0] += 1
+        memo.puntuar(_df_code([str(10 * k), str(10 * k + 1)]), True, 'v1', Puntuador())
+    # Quedan los 4 puntuados más recientemente, en una sola parte compactada
+    assert sorted(memo.tablas['v1'].index) == ['20', '21', '30', '31']
+    assert len(_partes(memo)) <= 2
+    otro = vp.MemoPuntajes(directorio=str(tmp_path), max_entradas=4)
+    otro.puntuar(_df_code(['20', '21']), True, 'v1', Puntuador())
+    assert otro.ultimo_reporte['reutilizadas'] == 2
+
+
+def test_vencimiento(tmp_path, monkeypatch):
+    reloj = [1000.0]
+    monkeypatch.setattr(vp.time, 'time', lambda: reloj[0])
+    memo = vp.MemoPuntajes(directorio=str(tmp_path), ttl=60)
+    puntuador = Puntuador()
+    df = _df_code(['1', '2'])
+    memo.puntuar(df, True, 'v1', puntuador)
+    reloj[0] += 30
+    memo.puntuar(df, True, 'v1', puntuador)
+    reloj[0] += 61
+    memo.puntuar(df, True, 'v1', puntuador)
+    assert puntuador.filas == [2, 2]
+
+
+def test_errores_de_disco_se_registran(tmp_path, monkeypatch, caplog):
+    memo = vp.MemoPuntajes(directorio=str(tmp_path))
+    os.makedirs(memo._carpeta('v1'))
+    with open(os.path.join(memo._carpeta('v1'), '0_corrupta.parquet'), 'wb') as file:
+        file.write(b'no es parquet')
+
+    def sin_escritura(version, df):
+        raise OSError('Read-only file system')
+    monkeypatch.setattr(memo, '_escribir', sin_escritura)
+
+    puntuador = Puntuador()
+    df = _df_code(['1', '2'])
+    with caplog.at_level('WARNING'):
+        primero = memo.puntuar(df, True, 'v1', puntuador)
+    mensajes = [r.getMessage() for r in caplog.records]
+    assert any('parte ilegible 0_corrupta.parquet' in m for m in mensajes)
+    assert any('no se pudo guardar' in m and 'Read-only' in m for m in mensajes)
+    # Los puntajes quedan en memoria
+    np.testing.assert_array_equal(memo.puntuar(df, True, 'v1', puntuador), primero)
+    assert puntuador.filas == [2]
+
+
+def test_predict_proba_sin_memo_por_defecto(datos_prueba, tmp_path, monkeypatch):
+    assert not vp.MEMO_PUNTAJES
+
+    def no_usar(*args, **kwargs):
+        raise AssertionError('memo_puntajes no debe usarse')
+    monkeypatch.setattr(vp.memo_puntajes, 'puntuar', no_usar)
+    sin_memo, _ = vp.Modelos_2(datos_prueba.copy()).predict_proba()
+
+    monkeypatch.setattr(vp, 'MEMO_PUNTAJES', True)
+    monkeypatch.setattr(vp, 'memo_puntajes', vp.MemoPuntajes(directorio=str(tmp_path)))
+    for _ in range(2):
+        ob = vp.Modelos_2(datos_prueba.copy())
+        con_memo, _ = ob.predict_proba()
+        pd.testing.assert_frame_equal(con_memo, sin_memo)
+    assert ob.reporte_puntajes['fraccion_reutilizada'] == 1.0
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+import os
+
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+class Contador():
+
+    """ ClasificadorSectores que cuenta los textos que clasifica. """
+
+    def __init__(self):
+        self.etiquetas = vp.clasificador_sectores.etiquetas
+        self.palabras = vp.clasificador_sectores.palabras
+        self.textos = []
+
+    def sector(self, texto):
+        self.textos.append(texto)
+        return vp.clasificador_sectores.sector(texto)
+
+
+TEXTOS = ['COMERCIO AL POR MAYOR', 'CULTIVO DE CAFE', 'TRANSPORTE DE CARGA', 'OTRA COSA']
+
+
+def _partes(memo):
+    return sorted(a for a in os.listdir(memo.carpeta) if a.endswith('.parquet'))
+
+
+def test_aciertos_y_persistencia(tmp_path):
+    serie = pd.Series(TEXTOS[:3] + [TEXTOS[0], None], index=range(10, 15))
+    esperado = vp.clasificador_sectores.clasificar(serie)
+
+    contador = Contador()
+    memo = vp.MemoSectores(clasificador=contador, directorio=str(tmp_path))
+    pd.testing.assert_series_equal(memo.clasificar(serie), esperado)
+    assert sorted(contador.textos) == sorted(TEXTOS[:3])
+    assert memo.ultimo_reporte == {'filas': 5, 'unicos': 3, 'aciertos': 0, 'tasa_aciertos': 0.0}
+
+    # Segunda llamada: un solo texto nuevo, y la parte nueva solo lo tiene a él
+    pd.testing.assert_series_equal(memo.clasificar(pd.Series(TEXTOS)),
+                                   vp.clasificador_sectores.clasificar(pd.Series(TEXTOS)))
+    assert contador.textos[3:] == [TEXTOS[3]]
+    assert memo.ultimo_reporte['aciertos'] == 3
+    assert (memo.consultas, memo.aciertos) == (7, 3)
+    partes = _partes(memo)
+    assert len(partes) == 2
+    assert pd.read_parquet(os.path.join(memo.carpeta, partes[-1]))['TEXTO'].tolist() == [TEXTOS[3]]
+
+    # Otra instancia (otro proceso) lee las partes y no clasifica nada
+    otro_contador = Contador()
+    otro = vp.MemoSectores(clasificador=otro_contador, directorio=str(tmp_path))
+    pd.testing.assert_series_equal(otro.clasificar(serie), esperado)
+    assert otro_contador.textos == []
+    assert otro.tasa_aciertos() == 1.0
+
+
+def test_limite_y_compactacion(tmp_path):
+    memo = vp.MemoSectores(clasificador=Contador(), directorio=str(tmp_path),
+                           max_entradas=2, max_partes=2)
+    for texto in TEXTOS:
+        memo.clasificar(pd.Series([texto]))
+    # Quedan los dos agregados más recientemente, compactados
+    assert list(memo.tabla) == TEXTOS[2:]
+    assert len(_partes(memo)) <= 2
+    otro = vp.MemoSectores(clasificador=Contador(), directorio=str(tmp_path), max_entradas=2)
+    otro.clasificar(pd.Series(TEXTOS[2:]))
+    assert otro.ultimo_reporte['aciertos'] == 2
+
+
+def test_errores_de_disco_se_registran(tmp_path, monkeypatch, caplog):
+    memo = vp.MemoSectores(clasificador=Contador(), directorio=str(tmp_path))
+    os.makedirs(memo.carpeta)
+    with open(os.path.join(memo.carpeta, '0_corrupta.parquet'), 'wb') as file:
+        file.write(b'no es parquet')
+
+    def sin_escritura(tabla):
+        raise OSError('Read-only file system')
+    monkeypatch.setattr(memo, '_escribir', sin_escritura)
+
+    with caplog.at_level('WARNING'):
+        memo.clasificar(pd.Series(TEXTOS))
+    mensajes = [r.getMessage() for r in caplog.records]
+    assert any('parte ilegible 0_corrupta.parquet' in m for m in mensajes)
+    assert any('no se pudo guardar' in m and 'Read-only' in m for m in mensajes)
+    # La tabla queda en memoria
+    memo.clasificar(pd.Series(TEXTOS))
+    assert memo.ultimo_reporte['aciertos'] == len(TEXTOS)
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+"""PuntuadorUnitario contra Modelos_2.predict_proba con los registros de los
+datos de prueba (un tercio con CONSPROM = 0, que van por Cla1-2)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import modelo_unitario
+import puntuacion
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+@pytest.fixture(scope='module')
+def formulario(datos_prueba):
+    df = datos_prueba.copy()
+    df.columns = [modelo_unitario.normalizar_texto(c) for c in df.columns]
+    df = df[modelo_unitario.CAMPOS_FORMULARIO].copy()
+    df.loc[df.index[::3], 'CONSPROM'] = 0
+    df['FECHACONSTITUCION'] = df['FECHACONSTITUCION'].astype('datetime64[ns]')
+    return df
+
+
+@pytest.fixture(scope='module')
+def referencia(formulario):
+    _, Xf = vp.Modelos_2(formulario.copy()).predict_proba()
+    return Xf
+
+
+def _columnas_ranking(df):
+    return [c for c in df.columns if c.startswith(('Producto_', 'Probabilidad_', 'Valor_probabilidad'))]
+
+
+def _comparar(puntuador, formulario, referencia):
+    filas = [puntuador.resultado(r.to_dict()) for _, r in formulario.iterrows()]
+    unitario = pd.concat([f for f in filas if len(f) > 0], ignore_index=True)
+    assert len(unitario) == len(referencia) > 0
+    # Se compara el ranking fila a fila (las columnas de datos de Xf vienen de un merge por NIT9)
+    for c in _columnas_ranking(referencia):
+        if c.startswith('Valor_probabilidad'):
+            np.testing.assert_allclose(unitario[c].astype(float), referencia[c], rtol=0, atol=1e-6)
+        else:
+            assert unitario[c].tolist() == referencia[c].tolist(), c
+
+
+def test_igual_a_predict_proba(formulario, referencia):
+    puntuador = modelo_unitario.PuntuadorUnitario()
+    assert all(m[4] is not None for m in puntuador.modelos.values())
+    _comparar(puntuador, formulario, referencia)
+
+
+def test_sin_kernel_usa_el_pipeline(formulario, referencia, monkeypatch):
+    monkeypatch.setattr(puntuacion, 'kernel', lambda modelo: None)
+    puntuador = modelo_unitario.PuntuadorUnitario()
+    assert all(m[3] is None and m[4] is None for m in puntuador.modelos.values())
+    n = sum(puntuador.puntuar(r.to_dict()) is not None for _, r in formulario.iloc[:60].iterrows())
+    _comparar(puntuador, formulario.iloc[:60], referencia.iloc[:n])
+
+
+def test_arboles_que_no_coinciden_se_descartan(monkeypatch):
+    original = modelo_unitario.ArbolesOvO.probabilidades_pares
+    monkeypatch.setattr(modelo_unitario.ArbolesOvO, 'probabilidades_pares',
+                        lambda self, x_u: original(self, x_u) + np.float32(1e-3))
+    puntuador = modelo_unitario.PuntuadorUnitario()
+    assert all(m[3] is not None and m[4] is None for m in puntuador.modelos.values())
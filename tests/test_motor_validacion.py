@@ -0,0 +1,18 @@
+# -*- coding: utf-8 -*-
+import copy
+
+import pytest
+
+import motor_validacion
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def test_esquema_incluido_coincide_con_el_encoder():
+    vp.revisar_esquema_encoder(motor_validacion.motor)
+
+
+def test_categoria_sin_columna_en_el_encoder():
+    esquema = copy.deepcopy(motor_validacion.ESQUEMA)
+    esquema['categorias']['FORMALEGAL'].append('COOPERATIVA')
+    with pytest.raises(ValueError, match='COOPERATIVA'):
+        vp.revisar_esquema_encoder(motor_validacion.MotorValidacion(esquema))
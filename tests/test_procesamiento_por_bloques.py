@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+import procesamiento_por_bloques
+
+
+def _columna_email(df):
+    return [c for c in df.columns if c.upper().replace(' ', '') == 'EMAIL'][0]
+
+
+def test_csv_bloques_con_tipos_de_texto(tmp_path):
+    df = pd.DataFrame({'EMAIL': [np.nan] * 3 + ['a@b.co'] * 3, 'CONSPROM': range(6)})
+    df.to_csv(tmp_path / 'e.csv', index=False)
+    bloques = list(procesamiento_por_bloques.leer_bloques(
+        str(tmp_path / 'e.csv'), tamano_bloque=3))
+    assert [b['EMAIL'].dtype for b in bloques] == [object, object]
+    assert bloques[1]['EMAIL'].tolist() == ['a@b.co'] * 3
+
+
+def test_parquet_columna_vacia_en_el_primer_bloque(tmp_path):
+    destino = str(tmp_path / 'o.parquet')
+    with procesamiento_por_bloques.EscritorBloques(destino) as escritor:
+        escritor.escribir(pd.DataFrame({'EMAIL': pd.Series([np.nan] * 2, dtype=object),
+                                        'VALOR': [1.5, 2.0]}))
+        escritor.escribir(pd.DataFrame({'EMAIL': ['a@b.co', np.nan], 'VALOR': [3.0, np.nan]}))
+    leido = pd.read_parquet(destino)
+    assert leido['EMAIL'].tolist()[2] == 'a@b.co'
+    assert leido['EMAIL'].isna().sum() == 3
+    assert str(pq.read_schema(destino).field('EMAIL').type) == 'string'
+
+
+def test_puntuar_archivo_csv_a_parquet(tmp_path, datos_prueba):
+    # EMAIL vacío en los primeros 150 registros: el primer bloque no tiene valores
+    df = datos_prueba.copy()
+    email = _columna_email(df)
+    df[email] = df[email].astype(object)
+    df.loc[df.index[:150], email] = np.nan
+    df.to_csv(tmp_path / 't.csv', index=False)
+
+    filas_parquet = procesamiento_por_bloques.puntuar_archivo(
+        str(tmp_path / 't.csv'), str(tmp_path / 'o.parquet'), tamano_bloque=100)
+    filas_csv = procesamiento_por_bloques.puntuar_archivo(
+        str(tmp_path / 't.csv'), str(tmp_path / 'o.csv'), tamano_bloque=100)
+
+    assert filas_parquet == filas_csv > 0
+    por_parquet = pd.read_parquet(tmp_path / 'o.parquet')
+    por_csv = pd.read_csv(tmp_path / 'o.csv', dtype={email: object})
+    assert por_parquet[email].notna().sum() == por_csv[email].notna().sum() > 0
+
+
+def test_parquet_columna_entera_y_luego_decimal(tmp_path, datos_prueba):
+    # CAPEX entero en las primeras 300 filas y 1.5 después: read_csv infiere
+    # int64 en los primeros bloques y float64 en los siguientes
+    df = datos_prueba.copy()
+    df['CAPEX'] = '1'
+    df.loc[df.index[300:], 'CAPEX'] = '1.5'
+    df.to_csv(tmp_path / 't.csv', index=False)
+
+    filas = procesamiento_por_bloques.puntuar_archivo(
+        str(tmp_path / 't.csv'), str(tmp_path / 'o.parquet'), tamano_bloque=100)
+    leido = pd.read_parquet(tmp_path / 'o.parquet')
+    assert len(leido) == filas > 0
+    assert str(pq.read_schema(tmp_path / 'o.parquet').field('CAPEX').type) == 'double'
+    assert set(leido['CAPEX']) == {1.0, 1.5}
+
+
+def test_parquet_texto_y_luego_numeros(tmp_path):
+    destino = str(tmp_path / 'o.parquet')
+    with procesamiento_por_bloques.EscritorBloques(destino) as escritor:
+        escritor.escribir(pd.DataFrame({'CODIGO': ['A1', np.nan], 'N': [1, 2]}))
+        escritor.escribir(pd.DataFrame({'CODIGO': [7.0, np.nan], 'N': [3.5, np.nan]}))
+    leido = pd.read_parquet(destino)
+    assert leido['CODIGO'].tolist() == ['A1', None, '7', None]
+    assert leido['N'].tolist()[:3] == [1.0, 2.0, 3.5]
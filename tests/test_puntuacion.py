@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+import pytest
+
+import puntuacion
+import registro_modelos
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+@pytest.fixture(scope='module')
+def codificados(datos_prueba):
+    ob = vp.Modelos_2(datos_prueba.copy())
+    ob.Logs()
+    return ob.Encoder()
+
+
+@pytest.mark.parametrize('nombre', list(registro_modelos.ARCHIVOS_MODELOS))
+def test_kernel_igual_al_pipeline(nombre, codificados):
+    modelo = registro_modelos.registro.obtener(nombre)
+    k = puntuacion.kernel(modelo)
+    assert k is not None
+    # Datos de prueba codificados y la muestra sintética de la carga
+    assert puntuacion.validar_kernel(modelo, codificados[k.columnas]) <= 1e-6
+    assert puntuacion.validar_kernel(modelo, puntuacion.muestra_kernel(k)) <= 1e-6
+
+
+@pytest.mark.parametrize('nombre', list(registro_modelos.ARCHIVOS_MODELOS))
+def test_rango_iteraciones(nombre):
+    # Mismo resultado que el método privado de xgboost 1.7.4, si existe
+    ovo = registro_modelos.registro.obtener(nombre).named_steps['onevsoneclassifier']
+    for est in ovo.estimators_:
+        if hasattr(est, '_get_iteration_range'):
+            assert puntuacion.rango_iteraciones(est) == est._get_iteration_range(None)
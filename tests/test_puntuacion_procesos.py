@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+"""puntuar con n_procesos > 1: mismas probabilidades que en serie y el pool se
+recrea cuando cambian los modelos del registro."""
+import shutil
+
+import numpy as np
+import pytest
+
+import puntuacion
+import registro_modelos
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+@pytest.fixture(scope='module')
+def codificados(datos_prueba):
+    ob = vp.Modelos_2(datos_prueba.copy())
+    ob.Logs()
+    return ob.Encoder()
+
+
+@pytest.fixture
+def pool_pequeno(monkeypatch):
+    monkeypatch.setattr(puntuacion, 'MIN_FILAS_POR_PROCESO', 50)
+    yield
+    puntuacion.cerrar_pool()
+
+
+@pytest.mark.parametrize('nombre', list(registro_modelos.ARCHIVOS_MODELOS))
+def test_procesos_igual_que_en_serie(nombre, codificados, pool_pequeno):
+    modelo = registro_modelos.registro.obtener(nombre)
+    X = codificados[puntuacion.kernel(modelo).columnas]
+    serie = puntuacion.puntuar(nombre, X, n_procesos=1)
+    procesos = puntuacion.puntuar(nombre, X, n_procesos=2)
+    np.testing.assert_array_equal(procesos, serie)
+
+
+def test_pool_se_recrea_al_cambiar_los_modelos(tmp_path, codificados, pool_pequeno):
+    # Registro propio en tmp_path: Cla1 y Cla2 con los mismos nombres lógicos
+    for nombre in ['Cla1', 'Cla2']:
+        shutil.copy(registro_modelos.registro.ruta(nombre), tmp_path)
+    archivos = {'Cla1': registro_modelos.ARCHIVOS_MODELOS['Cla1'],
+                'Cla2': registro_modelos.ARCHIVOS_MODELOS['Cla2']}
+    registro = registro_modelos.RegistroModelos(archivos=archivos, directorio=str(tmp_path))
+    X = codificados[puntuacion.kernel(registro.obtener('Cla1')).columnas]
+    antes = puntuacion.puntuar('Cla1', X, registro=registro, n_procesos=2)
+    pool = puntuacion.obtener_pool(2, registro)
+
+    # Se reemplaza el archivo de Cla1 por otro modelo; los procesos deben usar el nuevo
+    shutil.copy(registro_modelos.registro.ruta('Cla1-2'), tmp_path / archivos['Cla1'])
+    assert registro.recargar() == ['Cla1']
+    X = codificados[puntuacion.kernel(registro.obtener('Cla1')).columnas]
+    despues = puntuacion.puntuar('Cla1', X, registro=registro, n_procesos=2)
+    assert puntuacion.obtener_pool(2, registro) is not pool
+    np.testing.assert_array_equal(despues, puntuacion.puntuar('Cla1', X, registro=registro,
+                                                              n_procesos=1))
+    assert not np.array_equal(antes, despues)
@@ -0,0 +1,37 @@
+# -*- coding: utf-8 -*-
+"""Bandas de etiquetar_rangos y rango_proba exactamente en los cortes de
+rangos_proba.json (las etiquetas por banda son las que emitía el código)."""
+import numpy as np
+import pandas as pd
+import pytest
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+# (probabilidad, banda de los tres productos con cortes 0.4/0.7, banda de los demás con 0.4/0.65)
+CORTES = [(0.0, 'Baja', 'Baja'),
+          (np.nextafter(0.4, 0), 'Baja', 'Baja'),
+          (0.4, 'Alta', 'Alta'),
+          (np.nextafter(0.65, 0), 'Alta', 'Alta'),
+          (0.65, 'Alta', 'Media'),
+          (np.nextafter(0.7, 0), 'Alta', 'Media'),
+          (0.7, 'Media', 'Media'),
+          (1.0, 'Media', 'Media')]
+
+CORTE_07 = ['INSTALACIONES', 'REDESELECTRICAS', 'MANTENIMIENTO']
+
+
+def test_bandas_en_los_cortes():
+    pr = pd.DataFrame({p: [g for g, _, _ in CORTES] + [np.nan] for p in vp.COLS_PRODUCTO})
+    rangos = vp.Modelos_2.etiquetar_rangos(None, pr)
+    for p in vp.COLS_PRODUCTO:
+        k = 1 if p in CORTE_07 else 2
+        assert rangos['R.' + p].tolist()[:-1] == [c[k] for c in CORTES], p
+        assert pd.isna(rangos['R.' + p].iloc[-1])
+
+
+@pytest.mark.parametrize('producto', vp.COLS_PRODUCTO)
+def test_rango_proba_igual_a_etiquetar_rangos(producto):
+    k = 1 if producto in CORTE_07 else 2
+    for c in CORTES:
+        assert vp.Modelos_2.rango_proba(None, c[0], producto) == c[k]
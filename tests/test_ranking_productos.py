@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""Ranking de productos de predict_proba (argsort + take_along_axis) contra el
+orden fila a fila con sort_values del código original, con empates."""
+import numpy as np
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def ranking_referencia(probas_rangos):
+    # Loop original de predict_proba: sort_values(ascending=False) por fila
+    df_r = probas_rangos[vp.COLS_PRODUCTO]
+    filas = []
+    for i in range(len(df_r)):
+        fila = {}
+        orden = df_r.loc[i, :].sort_values(ascending=False).keys()
+        for j, p in enumerate(orden):
+            fila['Producto_' + str(j+1)] = p
+            fila['Probabilidad_' + str(j+1)] = probas_rangos.loc[i, 'R.' + p]
+            fila['Valor_probabilidad' + str(j+1)] = probas_rangos.loc[i, p]
+        filas.append(fila)
+    return pd.DataFrame(filas)
+
+
+def test_ranking_con_empates(datos_prueba, monkeypatch):
+    # Probabilidades con muchos empates (una decimal) y filas completas empatadas
+    rng = np.random.default_rng(0)
+
+    def puntuar(self, df_code, tiene_consprom=True):
+        probas = rng.integers(0, 10, size=(len(df_code), len(vp.COLS_PRODUCTO))) / 10
+        probas[::7] = 0.5
+        probas[1::5, [0, 3, 6]] = 0.7
+        return probas
+    monkeypatch.setattr(vp.Modelos_2, 'puntuar_codificado', puntuar)
+
+    probas_rangos, resultado = vp.Modelos_2(datos_prueba.copy()).predict_proba()
+    referencia = ranking_referencia(probas_rangos)
+    pd.testing.assert_frame_equal(resultado[list(referencia.columns)], referencia,
+                                  check_dtype=False)
+    # Filas empatadas: los productos quedan en el orden de COLS_PRODUCTO
+    assert resultado.loc[0, ['Producto_' + str(j+1) for j in range(8)]].tolist() == vp.COLS_PRODUCTO
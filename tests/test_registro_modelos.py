@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+import os
+
+import joblib
+
+import registro_modelos
+
+
+def _registro(tmp_path):
+    joblib.dump({'version': 1}, str(tmp_path / 'a.pkl'))
+    return registro_modelos.RegistroModelos(archivos={'A': 'a.pkl'}, directorio=str(tmp_path))
+
+
+def test_recargar_solo_si_cambia_el_archivo(tmp_path):
+    registro = _registro(tmp_path)
+    assert registro.recargar() == ['A']
+    hashes = registro.hashes()
+    assert registro.recargar() == []
+
+    # Solo cambia el mtime: se actualiza la firma sin volver a cargar
+    path = registro.ruta('A')
+    os.utime(path, ns=(0, 0))
+    assert registro.recargar() == []
+    assert registro.hashes() == hashes
+
+    # Cambia el contenido: se recarga y cambia la huella
+    joblib.dump({'version': 2}, path)
+    assert registro.recargar() == ['A']
+    assert registro['A'] == {'version': 2}
+    assert registro.hashes() != hashes
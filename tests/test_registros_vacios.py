@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Log de vacíos: rangos de filas consecutivas (rangos_indices), conteos de
+obtener_registros_vacios y el corte en MAX_RANGOS_VACIOS."""
+import re
+
+import numpy as np
+import pandas as pd
+
+import motor_validacion
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def test_rangos_indices():
+    assert motor_validacion.rangos_indices([1, 2, 3, 7, 9, 10]) == '1-3,7,9-10'
+    assert motor_validacion.rangos_indices([4]) == '4'
+    assert motor_validacion.rangos_indices([]) == ''
+    assert motor_validacion.rangos_indices([1, 2, 3, 7, 9, 10], max_rangos=2) == '1-3,7,... (1 rangos más)'
+    assert motor_validacion.rangos_indices([1, 3, 5, 7], max_rangos=1) == '1,... (3 rangos más)'
+    # Índices no enteros se listan uno a uno
+    assert motor_validacion.rangos_indices(['a', 'b', 'c'], max_rangos=2) == 'a,b,... (1 rangos más)'
+
+
+def _df():
+    a = np.arange(12, dtype=float)
+    a[[0, 1, 2, 4, 7, 8, 9]] = np.nan
+    c = pd.Series(['x'] * 11 + [None], dtype=object)
+    return pd.DataFrame({'A': a, 'B': np.arange(12), 'C': c.to_numpy()}, index=range(1, 13))
+
+
+def test_conteos_y_rangos():
+    ob = vp.Modelos_2(_df())
+    resultado = ob.obtener_registros_vacios(_df())
+    esperado = pd.DataFrame({'Nombre campo': ['A', 'C'],
+                             'Registros vacíos': [7, 1],
+                             'Índices de los registros vacíos': ['1-3,5,8-10', '12']})
+    pd.testing.assert_frame_equal(resultado, esperado)
+
+
+def test_corte_por_entorno(monkeypatch):
+    ob = vp.Modelos_2(_df())
+    assert ob.obtener_registros_vacios(_df(), max_rangos=2)['Índices de los registros vacíos'].tolist() == \
+        ['1-3,5,... (1 rangos más)', '12']
+    # Sin max_rangos se usa MAX_RANGOS_VACIOS (APPBASE_MAX_RANGOS_LOG)
+    monkeypatch.setattr(motor_validacion, 'MAX_RANGOS_VACIOS', 1)
+    assert ob.obtener_registros_vacios(_df())['Índices de los registros vacíos'].tolist() == \
+        ['1-3,... (2 rangos más)', '12']
+
+
+def test_formato_de_los_logs(datos_prueba, monkeypatch):
+    monkeypatch.setattr(motor_validacion, 'MAX_RANGOS_VACIOS', 2)
+    df = datos_prueba.copy()
+    # NIT9 ya tiene vacíos en 17-23; con tres salteados hay 4 rangos y se listan 2
+    df.loc[[40, 42, 44], 'NIT9'] = np.nan
+    lista_logs, _, _ = vp.Modelos_2(df).Logs()
+    vacios = [linea.split(' - ', 1)[1] for linea in lista_logs if 'campos vacios' in linea]
+    assert len(vacios) > 0
+    patron = re.compile(r'En la columna \S+ se encontraron (\d+) registros con campos vacios '
+                        r'en las filas: (\d+(-\d+)?)(,\d+(-\d+)?)?(,\.\.\. \((\d+) rangos más\))?\.$')
+    for linea in vacios:
+        assert patron.match(linea) is not None, linea
+    assert any(linea.endswith('10 registros con campos vacios en las filas: 17-23,40,... (2 rangos más).')
+               for linea in vacios)
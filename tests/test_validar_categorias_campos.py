@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""validar_categorias_campos con un frame armado a mano: registros excluidos
+por vacíos o 'NAN'/'nan' en los campos requeridos, categorías no esperadas y
+el frame de entrada sin modificar."""
+import numpy as np
+import pandas as pd
+
+import validar_preprocesar_predecir_organizarrtados as vp
+
+
+def _df():
+    return pd.DataFrame({
+        'NIT9': [1.0, 2.0, np.nan, 4.0, 5.0, 6.0],
+        'TAMANOEMPRESA': ['GRANEMPRESA', 'MICRO', 'PEQUENAEMPRESA', 'NAN', 'MEDIANAEMPRESA', 'GRANEMPRESA'],
+        'DEPARTAMENTO': ['ANTIOQUIA', 'META', 'ANTIOQUIA', 'ANTIOQUIA', 'nan', 'MARTE'],
+        # No es campo requerido: 'NAN' se revisa como vacío, que no es categoría posible
+        'RANGOCONSUMO': ['NAN', 'MENORA5000', 'MENORA5000', 'MENORA5000', 'MENORA5000', 'OTRO'],
+    }, index=[5, 6, 7, 8, 9, 10])
+
+
+CATEGORIAS = {'TAMANOEMPRESA': ['GRANEMPRESA', 'MEDIANAEMPRESA', 'PEQUENAEMPRESA'],
+              'DEPARTAMENTO': ['ANTIOQUIA', 'META'],
+              'RANGOCONSUMO': ['MENORA5000', 'MAYORA55000']}
+
+
+def test_categorias_no_esperadas():
+    df = _df()
+    revision = vp.Modelos_2(_df()).validar_categorias_campos(df, CATEGORIAS)
+    # 7 (NIT9 vacío), 8 ('NAN') y 9 ('nan') no se revisan
+    assert revision['TAMANOEMPRESA'] == ([6], [5, 10], ['MICRO'])
+    assert revision['DEPARTAMENTO'] == ([10], [5, 6], ['MARTE'])
+    distintos, posibles, incorrectas = revision['RANGOCONSUMO']
+    assert (distintos, posibles) == ([5, 10], [6])
+    assert np.isnan(incorrectas[0]) and incorrectas[1] == 'OTRO'
+    pd.testing.assert_frame_equal(df, _df())
+
+
+def test_un_campo_igual_que_todos_a_la_vez():
+    ob = vp.Modelos_2(_df())
+    revision = ob.validar_categorias_campos(_df(), CATEGORIAS)
+    for campo, categorias in CATEGORIAS.items():
+        uno = ob.validar_categorias(_df(), campo, categorias)
+        assert uno[:2] == revision[campo][:2]
+        assert [str(v) for v in uno[2]] == [str(v) for v in revision[campo][2]]
+
+
+def test_sin_vacios_todos_se_revisan():
+    df = _df().iloc[[0, 1, 5]]
+    revision = vp.Modelos_2(df.copy()).validar_categorias_campos(df, {'TAMANOEMPRESA': CATEGORIAS['TAMANOEMPRESA']})
+    assert revision['TAMANOEMPRESA'] == ([6], [5, 10], ['MICRO'])
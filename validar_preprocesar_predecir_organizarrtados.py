@@ -10,6 +10,14 @@ Original file is located at
 # Emergia/Mayo/15/2023
 # LSCV
 
+import os
+import json
+import hashlib
+import itertools
+import logging
+import tempfile
+import time
+import threading
 import numpy as np
 import pandas as pd
 import joblib	    # Para carga de modelo
@@ -17,6 +25,467 @@ from datetime import datetime
 from sklearn.utils.extmath import row_norms
 import plotly.graph_objects as go
 import pytz
+import registro_modelos
+import puntuacion
+import lector_archivos
+import motor_validacion
+
+
+# Diccionario Actividades Econmicas (palabras clave sobre el texto ya normalizado)
+PALABRAS_SIN_ACTIVIDAD = ['SIN ACTIVIDAD']
+PALABRAS_AGRO = ['CULTIVO', 'CRIA', 'PROPAGACION', 'PLANTAS', 'DESCAFEINADO', 'AGRICOLA', 'PECUARIA', 'AGRICOLA', 'CULTIVOS',
+                 'GANADERIA', 'GANADO', 'CORRAL', 'ANIMALES', 'AGRICULTURA', 'CAFE']  # 'Agropecuario'
+
+PALABRAS_SERVICIOS = ['PREPARADAS', 'ARRENDADOS', 'ALOJAMIENTO', 'CENTROS', 'LLAMADAS', 'HOSPITALES', 'CLINICAS', 'CONSULTORIA', 'INSTALACIONES',
+                      'PROGRAMACION', 'TELEVISION', 'RADIO', 'RADIODIFUSION', 'INMOBILIARIAS',  'SERVICIO', 'DISTRIBUCION', 'AGUA',
+                      'PUBLICIDAD', 'AUXILIARES', 'IMPRESION', 'APOYO', 'DIAGNOSTICO', 'INVESTIGACIONES', 'COMIDAS',
+                      'COMERCIALES', 'LIBROS', 'MUSICALES', 'PROFESIONALES', 'MEDICA', 'MANTENIMIENTO', 'CINEMATOGRAFICAS',
+                      'NIVELES', 'ADMINISTRACION', 'SALUD', 'PARQUES', 'TEMATICOS', 'RECOLECCION', 'SISTEMAS', 'INFORMATICOS',
+                      'PROCESAMIENTO DE DATOS', 'OTRAS ASOCIACIONES', 'ENSAYOS', 'ESTUDIOS DE MERCADO', 'RECREATIVAS', 'CLUBES DEPORTIVOS',
+                      'CONSULTARIA DE GESTION', 'RESIDUALES', 'ATRACCIONES', 'INGENIERIA', 'ASOCIACIONES', 'CLUBES', 'LIBROS', 'TALENTO',
+                      'RECREATIVAS', 'AGUA', 'MEDICA', 'PELUQUERIA',
+                      'UNIVERSIDADES',  'COMUNIDADES', 'EVACUACION', 'RECUPERACION',  'REPARACION', 'ALOJAMIENTO',
+                      'EXPENDIO', 'EVENTOS', 'EDICION',  'EMPRESARIAL', 'GESTION', 'CIENTIFICAS',
+                      'VIAJE', 'SEGURIDAD', 'OFICINA', 'EMPRESAS', 'SOCIAL', 'INSTITUCIONES', 'SEGURIDAD', 'EDUCACION', 'EDUCACION', 'SALUD',
+                      'MEDICA', 'TERAPEUTICO', 'APUESTAS', 'CLUBES', 'RECREATIVAS', 'ASOCIACIONES', 'SERVICIOS', 'ORGANIZACIONES',
+                      'EDUCACION', 'ASOCIACIONES',  'ENVASE', 'FOTOGRAFIA', 'SOCIA', 'SEGURIDAD', 'COMIDAS', 'DISENO',
+                      'JURIDICAS', 'PROFESIONALES', 'ALQUILER', 'ASERRADO', 'TALLADO', 'CURTIDO', 'ELECTRONICA', 'HOTELES',
+                      'EMPRESARIAL', 'CARGA',  'ASISTENCIA', 'SERVICIOS', 'FUNEBRES', 'RECUPERACION', 'ACONDICIONADO', 'TRATAMIENTO',
+                      'TURISMO', 'ORGANIZACIONES', 'ESTUDIOS']  # 'Servicios'
+
+PALABRAS_INDUSTRIAL = ['ELABORACION', 'FABRICACION', 'INDUSTRIAS', 'PROCESAMIENTO', 'TEXTILES', 'CONFECCION', 'FUNDICION', 'DERIVADOS DEL CAFE',
+                       'DESTILACION', 'EMPRESARIAL', 'MAQUINARIA', 'MAQUINARIA', 'CARNE', 'PESCADOS', 'FRUTAS', 'ACEITES', 'LACTEOS', 'MOLINERIA',
+                       'PANADERIA', 'ALIMENTICIOS', 'PREPARADOS', 'CERVEZAS', 'HILATURA', 'TEJEDURIA', 'TEXTILES', 'CONFECCION', 'FABRICACION',
+                       'INDUSTRIAS', 'FUNDICION', 'MAQUINARIA', 'CARNES', 'METAL', 'QUIMICA']  # 'Industrial'
+
+PALABRAS_TRANSPORTE = ['TRANSPORTE', 'AEROPUERTOS', 'ALMACENAMIENTO Y DEPOSITO',
+                       'TRANSPORTE', 'TRANSPORTE']  # Transporte
+PALABRAS_COMERCIO = ['COMERCIO', 'COMERCIALIZACION', 'COMERCIO',
+                     'COMERCIAL', 'ALIMENTOS', 'AUTOMOTRIZ']  # Comercio
+
+PALABRAS_FINANCIERO = ['CAPITAL', 'VALORES', 'BANCOS', 'BANCA', 'SERVICIO FINANCIERO', 'FINANCIERAS', 'COMPANIAS DE FINANCIAMIENTO',
+                       'FONDOS', 'BANCO', 'FINANCIERAS', 'FINANCIERO', 'FONDOS', 'SEGUROS', 'VALORES', 'FONDOS', 'SEGUROS', 'SEGUROS']  # Financiero
+
+PALABRAS_CONST = ['EDIFICIOS', 'CONSTRUCCION', 'ARQUITECTURA', 'CONSTRUCCION',
+                  'DEMOLICION', 'EDIFICIOS', 'CONSTRUCCION']  # Construcción
+PALABRAS_MINERO = ['GAS', 'CARBON', 'EXTRACCION', 'GENERACION', 'TRANSMISION', 'CARBON', 'ORO', 'MINERALES', 'PIEDRA',
+                   'ESMERALDAS', 'PETROLEO', 'ENERGIA', 'MINERIA']  # Minero y Energético
+
+PALABRAS_COMUNICACIONES = ['TELECOMUNICACIONES', 'TELECOMUNICACIONES', 'TELECOMUNICACIONES', 'ALAMBRICAS', 'INALAMBRICAS',
+                           'SATELITAL', 'TELECOMUNICACIONES']  # Comunicaciones
+
+# Orden de precedencia: si un texto coincide con varios sectores gana el último
+SECTORES_ACTIVIDAD = [('SIN ACTIVIDAD', PALABRAS_SIN_ACTIVIDAD),
+                      ('SERVICIOS', PALABRAS_SERVICIOS),
+                      ('AGROPECUARIO', PALABRAS_AGRO),
+                      ('INDUSTRIAL', PALABRAS_INDUSTRIAL),
+                      ('TRANSPORTE', PALABRAS_TRANSPORTE),
+                      ('COMERCIO', PALABRAS_COMERCIO),
+                      ('FINANCIERO', PALABRAS_FINANCIERO),
+                      ('CONSTRUCCION', PALABRAS_CONST),
+                      ('ENERGETICO', PALABRAS_MINERO),
+                      ('COMUNICACIONES', PALABRAS_COMUNICACIONES)]
+
+
+class ClasificadorSectores():
+
+    """ Asigna el sector económico a un texto de actividad en una sola pasada.
+        Equivale a aplicar Modelos_2.sectores una vez por sector, en orden,
+        dejando el último sector que coincide: se revisan los sectores de mayor
+        a menor precedencia y se detiene en la primera coincidencia.
+    """
+
+    def __init__(self, sectores=SECTORES_ACTIVIDAD):
+        self.etiquetas = [sector for sector, _ in sectores]
+        # Palabra clave -> precedencia del último sector que la contiene
+        prioridad = {}
+        for p, (sector, palabras) in enumerate(sectores):
+            for palabra in palabras:
+                prioridad[palabra] = p
+        # Palabras por sector, sin duplicados ni palabras que contienen a otra
+        # de igual o mayor precedencia (nunca cambian el resultado)
+        self.palabras = [[] for _ in sectores]
+        for palabra, p in prioridad.items():
+            if not any(o != palabra and o in palabra and q >= p for o, q in prioridad.items()):
+                self.palabras[p].append(palabra)
+        self._orden = [(self.etiquetas[p], tuple(self.palabras[p]))
+                       for p in range(len(sectores) - 1, -1, -1) if self.palabras[p]]
+
+    def sector(self, texto):
+        if not isinstance(texto, str):
+            return None
+        for etiqueta, palabras in self._orden:
+            for palabra in palabras:
+                if palabra in texto:
+                    return etiqueta
+        return None
+
+    def clasificar(self, serie):
+        return pd.Series([self.sector(x) for x in serie], index=serie.index, dtype=object)
+
+
+clasificador_sectores = ClasificadorSectores()
+
+# Variables categóricas del encoder: (campo, columnas indicadoras, categorías en orden)
+columns_F = ['F0', 'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8']
+ord_F = ['SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA',
+         'UNDEFINED', 'SCS', 'PERSONANATURAL']
+
+columns_T = ['T0', 'T1', 'T2']
+ord_T = ['GRANEMPRESA', 'MEDIANAEMPRESA', 'PEQUENAEMPRESA']
+
+columns_M = ['M1', 'M2', 'M3', 'M4', 'M5',
+             'M6', 'M7', 'M8', 'M9', 'M10', 'M11', 'M12']
+ord_M = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0]
+
+columns_A = ['A0', 'A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']
+ord_A = ['AGROPECUARIO', 'COMERCIO', 'COMUNICACIONES', 'CONSTRUCCION',
+         'ENERGETICO', 'FINANCIERO', 'INDUSTRIAL', 'SERVICIOS', 'TRANSPORTE']
+
+RUTA_RANGOS_PROBA = os.path.join(os.path.dirname(
+    os.path.abspath(__file__)), 'rangos_proba.json')
+
+# Orden de las columnas R.<producto> en etiquetar_rangos
+ORDEN_RANGOS = ['AUMENTOS_CARGA', 'CUENTASNUEVAS', 'INSTALACIONES', 'REDESELECTRICAS',
+                'MANTENIMIENTO', 'ESTUDIOS', 'FIBRA_OPTICA', 'ILUMINACION']
+
+
+def cargar_rangos_proba(path=RUTA_RANGOS_PROBA):
+    # producto -> (cortes ordenados, etiquetas); hay una etiqueta más que cortes
+    with open(path, 'r', encoding='utf-8') as file:
+        config = json.load(file)
+    rangos = {}
+    for grupo in config['grupos']:
+        etiquetas = grupo.get('etiquetas', config['etiquetas'])
+        cortes = sorted(grupo['cortes'])
+        if len(etiquetas) != len(cortes) + 1:
+            raise ValueError('rangos_proba: se esperan ' + str(len(cortes) + 1) +
+                             ' etiquetas para ' + str(grupo['productos']))
+        for producto in grupo['productos']:
+            rangos[producto] = (cortes, list(etiquetas))
+    return rangos
+
+
+RANGOS_PROBA = cargar_rangos_proba()
+
+BLOQUES_ONE_HOT = [('TAMANOEMPRESA', columns_T, ord_T),
+                   ('FORMALEGAL', columns_F, ord_F),
+                   ('ACTIVIDADES', columns_A, ord_A),
+                   ('MES_OFERTA', columns_M, ord_M)]
+
+
+def revisar_esquema_encoder(motor):
+    # Toda categoría que acepta la validación debe tener columna en el encoder;
+    # si no, el registro pasa la validación y bloque_one_hot falla al puntuar.
+    # Las columnas son las de los modelos entrenados, así que el esquema no
+    # puede agregar categorías a estos campos.
+    for campo, columnas, categorias in BLOQUES_ONE_HOT:
+        desconocidas = sorted(motor.categorias.get(campo, frozenset()) - set(categorias))
+        if len(desconocidas) > 0:
+            raise ValueError('esquema_validacion: categorías de ' + campo +
+                             ' sin columna en el encoder de los modelos: ' + ', '.join(desconocidas))
+
+
+revisar_esquema_encoder(motor_validacion.motor)
+
+# Directorio para tablas y resultados persistentes entre sesiones. Por defecto
+# en el directorio temporal: el del repositorio puede ser de solo lectura
+DIR_CACHE = os.environ.get('APPBASE_CACHE_DIR', os.path.join(
+    tempfile.gettempdir(), 'appbase_cache'))
+
+
+# Textos distintos en la tabla de sectores y partes en disco antes de compactar
+MAX_SECTORES = int(os.environ.get('APPBASE_MEMO_SECTORES_MAX', '200000'))
+MAX_PARTES_SECTORES = 32
+
+
+class MemoSectores():
+
+    """ Tabla persistente texto normalizado -> sector.
+        Solo se clasifican los textos distintos que no están en la tabla; el
+        resultado se propaga a todas las filas con los códigos de factorize.
+        La tabla vive en una carpeta cuyo nombre incluye una huella de
+        SECTORES_ACTIVIDAD, así un cambio en los diccionarios no reutiliza
+        etiquetas viejas. Cada llamada agrega solo sus textos nuevos como una
+        parte parquet y las partes se compactan cuando son muchas; con más de
+        max_entradas textos se eliminan los agregados hace más tiempo. Los
+        errores de disco se registran con logging.warning.
+    """
+
+    def __init__(self, clasificador=clasificador_sectores, directorio=DIR_CACHE,
+                 max_entradas=MAX_SECTORES, max_partes=MAX_PARTES_SECTORES):
+        self.clasificador = clasificador
+        huella = hashlib.sha256(repr([(e, p) for e, p in zip(
+            clasificador.etiquetas, clasificador.palabras)]).encode()).hexdigest()[:12]
+        self.carpeta = os.path.join(directorio, 'sectores_' + huella)
+        self.max_entradas = max_entradas
+        self.max_partes = max_partes
+        self.tabla = {}             # El orden de inserción es el de antigüedad
+        self._leidas = set()
+        self._filas_disco = 0
+        self._lock = threading.Lock()
+        self.consultas = 0          # Textos distintos consultados (acumulado)
+        self.aciertos = 0           # ... encontrados en la tabla
+        self.ultimo_reporte = {}
+
+    def _listar(self):
+        try:
+            return sorted(a for a in os.listdir(self.carpeta) if a.endswith('.parquet'))
+        except OSError:
+            return []
+
+    def _recortar(self):
+        sobran = len(self.tabla) - self.max_entradas if self.max_entradas is not None else 0
+        for texto in list(itertools.islice(self.tabla, max(sobran, 0))):
+            del self.tabla[texto]
+
+    def _refrescar(self):
+        # Lee solo las partes que aún no se leyeron (escritas por otros procesos)
+        for nombre in self._listar():
+            if nombre in self._leidas:
+                continue
+            try:
+                df = pd.read_parquet(os.path.join(self.carpeta, nombre))
+            except FileNotFoundError:  # Borrada por la compactación de otro proceso
+                continue
+            except Exception as e:
+                logging.warning('MemoSectores: parte ilegible %s: %s', nombre, e)
+            else:
+                self._filas_disco += len(df)
+                self.tabla.update(zip(df['TEXTO'], df['SECTOR']))
+            self._leidas.add(nombre)
+        self._recortar()
+
+    def _escribir(self, tabla):
+        os.makedirs(self.carpeta, exist_ok=True)
+        nombre = '%020d_%d_%d.parquet' % (time.time_ns(), os.getpid(), threading.get_ident())
+        tmp = os.path.join(self.carpeta, nombre + '.tmp')
+        pd.DataFrame({'TEXTO': list(tabla.keys()),
+                      'SECTOR': list(tabla.values())}).to_parquet(tmp, index=False)
+        os.replace(tmp, os.path.join(self.carpeta, nombre))
+        return nombre
+
+    def _guardar(self, nuevos):
+        """ Agrega los textos nuevos como una parte; con demasiadas partes o
+            filas en disco escribe la tabla en una sola parte y borra las demás.
+        """
+        try:
+            self._leidas.add(self._escribir(nuevos))
+            self._filas_disco += len(nuevos)
+            if len(self._leidas) <= self.max_partes and (self.max_entradas is None or
+                                                         self._filas_disco <= 2 * self.max_entradas):
+                return
+            anteriores = set(self._leidas)
+            compacta = self._escribir(self.tabla)
+            for nombre in anteriores:
+                try:
+                    os.remove(os.path.join(self.carpeta, nombre))
+                except OSError:
+                    pass
+            self._leidas = {compacta}
+            self._filas_disco = len(self.tabla)
+        except Exception as e:
+            # Sin escritura (p. ej. disco de solo lectura): la tabla queda en memoria
+            logging.warning('MemoSectores: no se pudo guardar en %s: %s', self.carpeta, e)
+
+    def clasificar(self, serie):
+        codigos, unicos = pd.factorize(serie)
+        with self._lock:
+            self._refrescar()
+            nuevos = {u: self.clasificador.sector(u) for u in unicos if u not in self.tabla}
+            etiquetas = np.array([nuevos[u] if u in nuevos else self.tabla[u] for u in unicos] +
+                                 [None], dtype=object)
+            if len(nuevos) > 0:
+                self.tabla.update(nuevos)
+                self._recortar()
+                self._guardar(nuevos)
+            aciertos = len(unicos) - len(nuevos)
+            self.consultas += len(unicos)
+            self.aciertos += aciertos
+
+        self.ultimo_reporte = {'filas': len(serie), 'unicos': len(unicos), 'aciertos': aciertos,
+                               'tasa_aciertos': aciertos / len(unicos) if len(unicos) > 0 else 1.0}
+        # codigo -1 (nulo) -> None
+        return pd.Series(etiquetas[codigos], index=serie.index, dtype=object)
+
+    def tasa_aciertos(self):
+        return self.aciertos / self.consultas if self.consultas > 0 else 0.0
+
+
+memo_sectores = MemoSectores()
+
+# Productos en el orden de las columnas de probabilidad de predict_proba
+COLS_PRODUCTO = ['AUMENTOS_CARGA', 'ESTUDIOS', 'INSTALACIONES', 'REDESELECTRICAS',
+                 'CUENTASNUEVAS', 'FIBRA_OPTICA', 'ILUMINACION', 'MANTENIMIENTO']
+
+
+# Memo de puntajes en disco: desactivado salvo APPBASE_MEMO_PUNTAJES=1
+MEMO_PUNTAJES = os.environ.get('APPBASE_MEMO_PUNTAJES', '0') == '1'
+
+# Límites del memo de puntajes, configurables por entorno
+MAX_PUNTAJES = int(os.environ.get('APPBASE_MEMO_PUNTAJES_MAX', '500000'))
+TTL_PUNTAJES = int(os.environ.get('APPBASE_MEMO_PUNTAJES_TTL_DIAS', '30')) * 86400
+
+# Partes en disco antes de compactarlas en un solo archivo
+MAX_PARTES_PUNTAJES = 32
+
+
+class MemoPuntajes():
+
+    """ Tabla persistente NIT9 -> (huella de la fila codificada, 8 probabilidades).
+        La huella es el hash de las columnas que ven los modelos (incluye los
+        indicadores M* de MES_OFERTA), así que solo se vuelven a puntuar las
+        filas nuevas o que cambiaron. Hay una carpeta por versión de modelos
+        (hash de los .pkl), de modo que un modelo nuevo no reutiliza puntajes.
+
+        Cada llamada agrega solo sus filas nuevas como un archivo (parte) en la
+        carpeta; cuando hay muchas partes o filas se compactan en uno. Los
+        puntajes vencen a los ttl segundos y, si hay más de max_entradas, se
+        eliminan los puntuados hace más tiempo. predict_proba solo lo usa con
+        APPBASE_MEMO_PUNTAJES=1; los errores de disco se registran con
+        logging.warning y el memo sigue en memoria.
+    """
+
+    def __init__(self, directorio=DIR_CACHE, max_entradas=MAX_PUNTAJES, ttl=TTL_PUNTAJES,
+                 max_partes=MAX_PARTES_PUNTAJES):
+        self.directorio = directorio
+        self.max_entradas = max_entradas
+        self.ttl = ttl
+        self.max_partes = max_partes
+        self.tablas = {}            # huella de modelos -> DataFrame indexado por NIT9
+        self._partes = {}           # huella de modelos -> partes ya leídas
+        self._filas_disco = {}      # huella de modelos -> filas en las partes
+        self._lock = threading.Lock()
+        self.ultimo_reporte = {}
+
+    def _carpeta(self, version):
+        return os.path.join(self.directorio, 'puntajes_' + version)
+
+    @staticmethod
+    def _tabla_vacia():
+        return pd.DataFrame(columns=['HUELLA', 'FECHA'] + COLS_PRODUCTO,
+                            index=pd.Index([], name='NIT9'))
+
+    def _listar(self, version):
+        # Los nombres empiezan con la hora en ns: el orden es el de escritura
+        try:
+            return sorted(a for a in os.listdir(self._carpeta(version)) if a.endswith('.parquet'))
+        except OSError:
+            return []
+
+    def _combinar(self, tabla, filas):
+        # Las filas nuevas reemplazan a las del mismo NIT9; luego vencimiento y límite
+        if len(tabla) == 0:
+            tabla = filas
+        else:
+            tabla = pd.concat([tabla[~tabla.index.isin(filas.index)], filas])
+        if self.ttl is not None and len(tabla) > 0:
+            tabla = tabla[tabla['FECHA'].to_numpy(dtype=float) >= time.time() - self.ttl]
+        if self.max_entradas is not None and len(tabla) > self.max_entradas:
+            orden = np.argsort(tabla['FECHA'].to_numpy(dtype=float), kind='stable')
+            tabla = tabla.iloc[np.sort(orden[len(tabla) - self.max_entradas:])]
+        return tabla
+
+    def _refrescar(self, version):
+        # Lee solo las partes que aún no se leyeron (escritas por otros procesos)
+        leidas = self._partes.setdefault(version, set())
+        tabla = self.tablas.get(version, self._tabla_vacia())
+        for nombre in self._listar(version):
+            if nombre in leidas:
+                continue
+            try:
+                parte = pd.read_parquet(os.path.join(self._carpeta(version), nombre))
+            except FileNotFoundError:  # Borrada por la compactación de otro proceso
+                continue
+            except Exception as e:
+                logging.warning('MemoPuntajes: parte ilegible %s: %s', nombre, e)
+                leidas.add(nombre)
+                continue
+            leidas.add(nombre)
+            self._filas_disco[version] = self._filas_disco.get(version, 0) + len(parte)
+            tabla = self._combinar(tabla, parte[~parte.index.duplicated(keep='last')])
+        self.tablas[version] = tabla
+
+    def _escribir(self, version, df):
+        carpeta = self._carpeta(version)
+        os.makedirs(carpeta, exist_ok=True)
+        nombre = '%020d_%d_%d.parquet' % (time.time_ns(), os.getpid(), threading.get_ident())
+        tmp = os.path.join(carpeta, nombre + '.tmp')
+        df.to_parquet(tmp)
+        os.replace(tmp, os.path.join(carpeta, nombre))
+        return nombre
+
+    def _guardar(self, version, filas):
+        """ Agrega filas como una parte nueva; si hay demasiadas partes o filas
+            en disco, escribe la tabla completa en una sola parte y borra las
+            partes que ya contiene.
+        """
+        try:
+            leidas = self._partes.setdefault(version, set())
+            leidas.add(self._escribir(version, filas))
+            self._filas_disco[version] = self._filas_disco.get(version, 0) + len(filas)
+            if len(leidas) <= self.max_partes and (self.max_entradas is None or
+                                                   self._filas_disco[version] <= 2 * self.max_entradas):
+                return
+            anteriores = set(leidas)
+            compacta = self._escribir(version, self.tablas[version])
+            for nombre in anteriores:
+                try:
+                    os.remove(os.path.join(self._carpeta(version), nombre))
+                except OSError:
+                    pass
+            self._partes[version] = {compacta}
+            self._filas_disco[version] = len(self.tablas[version])
+        except Exception as e:
+            # Sin escritura (p. ej. disco de solo lectura): los puntajes quedan en memoria
+            logging.warning('MemoPuntajes: no se pudo guardar en %s: %s', self._carpeta(version), e)
+
+    @staticmethod
+    def huellas(df_code, tiene_consprom):
+        # Hash por fila de las columnas codificadas (sin NIT9), más las columnas presentes
+        cols = [c for c in df_code.columns if c != 'NIT9']
+        base = int(hashlib.sha256(repr((cols, tiene_consprom)).encode()).hexdigest()[:16], 16)
+        return pd.util.hash_pandas_object(df_code[cols], index=False).to_numpy() ^ np.uint64(base)
+
+    def puntuar(self, df_code, tiene_consprom, version, puntuar_filas):
+        """ Probabilidades (n x 8, orden COLS_PRODUCTO) de df_code; puntuar_filas
+            solo recibe las filas cuya huella no está en la tabla (o venció).
+        """
+        huellas = self.huellas(df_code, tiene_consprom)
+        nits = df_code['NIT9'].astype(str).to_numpy()
+        with self._lock:
+            self._refrescar(version)
+            tabla = self.tablas[version]
+        # Posición de cada NIT9 en la tabla (-1 si no está); la huella se compara en int64
+        pos = tabla.index.get_indexer(nits)
+        reutilizar = pos >= 0
+        reutilizar[reutilizar] = tabla['HUELLA'].to_numpy(
+            dtype=np.int64)[pos[reutilizar]] == huellas[reutilizar].astype(np.int64)
+        if self.ttl is not None:
+            reutilizar[reutilizar] = tabla['FECHA'].to_numpy(
+                dtype=float)[pos[reutilizar]] >= time.time() - self.ttl
+
+        probas = np.empty((len(df_code), len(COLS_PRODUCTO)))
+        probas[reutilizar] = tabla[COLS_PRODUCTO].to_numpy(dtype=float)[pos[reutilizar]]
+        nuevas = ~reutilizar
+        if nuevas.any():
+            probas[nuevas] = puntuar_filas(df_code[nuevas])
+            filas = pd.DataFrame(probas[nuevas], columns=COLS_PRODUCTO,
+                                 index=pd.Index(nits[nuevas], name='NIT9'))
+            filas.insert(0, 'FECHA', time.time())
+            filas.insert(0, 'HUELLA', huellas[nuevas].astype(np.int64))
+            filas = filas[~filas.index.duplicated(keep='last')]
+            with self._lock:
+                self.tablas[version] = self._combinar(self.tablas[version], filas)
+                self._guardar(version, filas)
+
+        n = len(df_code)
+        self.ultimo_reporte = {'filas': n, 'reutilizadas': int(reutilizar.sum()),
+                               'fraccion_reutilizada': float(reutilizar.sum()) / n if n > 0 else 0.0}
+        return probas
+
+
+memo_puntajes = MemoPuntajes()
 
 
 class Modelos_2():
@@ -27,10 +496,55 @@ class Modelos_2():
         Crea los logs de validación
     """
 
-    def __init__(self, df_in):
+    def __init__(self, df_in, registro=None, n_procesos=None):
+        self.n_transform_load = 0   # Veces que transform_load se ejecutó realmente
         self.df_in = df_in
-
-    def transform_load(self):  # todo a mayuscula y tranformar tipos de datos a los requeridos
+        # Modelos compartidos por proceso (ver registro_modelos.py)
+        self.registro = registro if registro is not None else registro_modelos.registro
+        # Procesos para puntuar; None usa puntuacion.N_PROCESOS (APPBASE_N_PROCESOS)
+        self.n_procesos = n_procesos
+
+    @classmethod
+    def desde_archivo(cls, fuente, formato=None, columnas=None, registro=None, n_procesos=None):
+        """ Crea el objeto a partir de una cartera en xlsx, csv o parquet (ruta u
+            objeto de st.file_uploader). columnas limita la lectura, p. ej. a
+            lector_archivos.COLUMNAS_VALIDACION; None lee todas.
+        """
+        df = lector_archivos.leer_archivo(fuente, formato=formato, columnas=columnas)
+        df.index = range(1, len(df)+1)
+        try:
+            df['FECHACONSTITUCION'] = df['FECHACONSTITUCION'].astype(
+                'datetime64[ns]')
+        except:
+            pass
+        return cls(df, registro=registro, n_procesos=n_procesos)
+
+    @property
+    def df_in(self):
+        return self._df_in
+
+    @df_in.setter
+    def df_in(self, df):
+        # Reasignar df_in invalida el resultado memorizado de transform_load
+        self._df_in = df
+        self._cache_transform = None
+        self._validacion = None
+
+    def invalidar_transform_load(self):
+        # Para cambios in-place sobre df_in que no pasan por el setter
+        self._cache_transform = None
+        self._validacion = None
+
+    def transform_load(self):
+        # Se calcula una vez por df_in; cada llamada recibe copias porque los
+        # consumidores modifican los frames (replace inplace, .loc, columnas nuevas)
+        if self._cache_transform is None:
+            self._cache_transform = self._transform_load()
+            self.n_transform_load += 1
+        df, df_con_nulls = self._cache_transform
+        return df.copy(), df_con_nulls.copy()
+
+    def _transform_load(self):  # todo a mayuscula y tranformar tipos de datos a los requeridos
         df = self.df_in.copy()
         df.columns = df.columns.str.normalize('NFKD').str.encode(
             'ascii', errors='ignore').str.decode('utf-8')
@@ -72,12 +586,8 @@ class Modelos_2():
 
         # df = df.reset_index(drop=True)
 
-        for index, row in df[lista_campos].iterrows():
-            # Verifica si algún campo contiene el string 'NAN'
-            if 'NAN' in row.values:
-                # print(row.values)
-                # Elimina el registro correspondiente
-                df = df.drop(index)
+        # Elimina los registros con el string 'NAN' en algún campo requerido
+        df = self.eliminar_registros_nan(df, lista_campos)
 
         # Reinicia los índices del dataframe resultante
         # df = df.reset_index(drop=True)
@@ -125,6 +635,18 @@ class Modelos_2():
         # Devuelve el dataframe sin los registros vacíos
         return df
 
+    def eliminar_registros_nan(self, dataframe, campos):
+        # Equivale a recorrer con iterrows y hacer drop si 'NAN' in row.values,
+        # pero con una sola máscara booleana. Solo las columnas de texto pueden
+        # contener el string 'NAN'.
+        cols_txt = [c for c in campos if dataframe[c].dtype == object]
+        if len(cols_txt) == 0:
+            return dataframe
+        mask = (dataframe[cols_txt].values == 'NAN').any(axis=1)
+        if not mask.any():
+            return dataframe
+        return dataframe[~mask].copy()
+
     # CALCULO LA EDAD DE LAS EMPRESAS
     def Ano(self, df):
         s = df.year
@@ -148,103 +670,17 @@ class Modelos_2():
             if i in df:
                 return sector
 
-    def Agrupar_actividades(self, Act_CIIU='ACTIVIDADPRINCIPAL(EMIS)'):  # IMPORTANTE
+    def Agrupar_actividades(self, Act_CIIU='ACTIVIDADPRINCIPAL(EMIS)', df_a=None):  # IMPORTANTE
+        # df_a: frame de transform_load ya calculado (se modifica); None lo pide
 
-        df_a, df_con_nulls = self.transform_load()
+        if df_a is None:
+            df_a, df_con_nulls = self.transform_load()
         # print(df_a)
-        # # Diccionario Actividades Econmicas
-        actividad = ['SIN ACTIVIDAD']
-        agro = ['CULTIVO', 'CRIA', 'PROPAGACION', 'PLANTAS', 'DESCAFEINADO', 'AGRICOLA', 'PECUARIA', 'AGRICOLA', 'CULTIVOS',
-                'GANADERIA', 'GANADO', 'CORRAL', 'ANIMALES', 'AGRICULTURA', 'CAFE']  # 'Agropecuario'
-
-        servicios = ['PREPARADAS', 'ARRENDADOS', 'ALOJAMIENTO', 'CENTROS', 'LLAMADAS', 'HOSPITALES', 'CLINICAS', 'CONSULTORIA', 'INSTALACIONES',
-                     'PROGRAMACION', 'TELEVISION', 'RADIO', 'RADIODIFUSION', 'INMOBILIARIAS',  'SERVICIO', 'DISTRIBUCION', 'AGUA',
-                     'PUBLICIDAD', 'AUXILIARES', 'IMPRESION', 'APOYO', 'DIAGNOSTICO', 'INVESTIGACIONES', 'COMIDAS',
-                     'COMERCIALES', 'LIBROS', 'MUSICALES', 'PROFESIONALES', 'MEDICA', 'MANTENIMIENTO', 'CINEMATOGRAFICAS',
-                     'NIVELES', 'ADMINISTRACION', 'SALUD', 'PARQUES', 'TEMATICOS', 'RECOLECCION', 'SISTEMAS', 'INFORMATICOS',
-                     'PROCESAMIENTO DE DATOS', 'OTRAS ASOCIACIONES', 'ENSAYOS', 'ESTUDIOS DE MERCADO', 'RECREATIVAS', 'CLUBES DEPORTIVOS',
-                     'CONSULTARIA DE GESTION', 'RESIDUALES', 'ATRACCIONES', 'INGENIERIA', 'ASOCIACIONES', 'CLUBES', 'LIBROS', 'TALENTO',
-                     'RECREATIVAS', 'AGUA', 'MEDICA', 'PELUQUERIA',
-                     'UNIVERSIDADES',  'COMUNIDADES', 'EVACUACION', 'RECUPERACION',  'REPARACION', 'ALOJAMIENTO',
-                     'EXPENDIO', 'EVENTOS', 'EDICION',  'EMPRESARIAL', 'GESTION', 'CIENTIFICAS',
-                     'VIAJE', 'SEGURIDAD', 'OFICINA', 'EMPRESAS', 'SOCIAL', 'INSTITUCIONES', 'SEGURIDAD', 'EDUCACION', 'EDUCACION', 'SALUD',
-                     'MEDICA', 'TERAPEUTICO', 'APUESTAS', 'CLUBES', 'RECREATIVAS', 'ASOCIACIONES', 'SERVICIOS', 'ORGANIZACIONES',
-                     'EDUCACION', 'ASOCIACIONES',  'ENVASE', 'FOTOGRAFIA', 'SOCIA', 'SEGURIDAD', 'COMIDAS', 'DISENO',
-                     'JURIDICAS', 'PROFESIONALES', 'ALQUILER', 'ASERRADO', 'TALLADO', 'CURTIDO', 'ELECTRONICA', 'HOTELES',
-                     'EMPRESARIAL', 'CARGA',  'ASISTENCIA', 'SERVICIOS', 'FUNEBRES', 'RECUPERACION', 'ACONDICIONADO', 'TRATAMIENTO',
-                     'TURISMO', 'ORGANIZACIONES', 'ESTUDIOS']  # 'Servicios'
-
-        industrial = ['ELABORACION', 'FABRICACION', 'INDUSTRIAS', 'PROCESAMIENTO', 'TEXTILES', 'CONFECCION', 'FUNDICION', 'DERIVADOS DEL CAFE',
-                      'DESTILACION', 'EMPRESARIAL', 'MAQUINARIA', 'MAQUINARIA', 'CARNE', 'PESCADOS', 'FRUTAS', 'ACEITES', 'LACTEOS', 'MOLINERIA',
-                      'PANADERIA', 'ALIMENTICIOS', 'PREPARADOS', 'CERVEZAS', 'HILATURA', 'TEJEDURIA', 'TEXTILES', 'CONFECCION', 'FABRICACION',
-                      'INDUSTRIAS', 'FUNDICION', 'MAQUINARIA', 'CARNES', 'METAL', 'QUIMICA']  # 'Industrial'
-
-        transporte = ['TRANSPORTE', 'AEROPUERTOS', 'ALMACENAMIENTO Y DEPOSITO',
-                      'TRANSPORTE', 'TRANSPORTE']  # Transporte
-        comercio = ['COMERCIO', 'COMERCIALIZACION', 'COMERCIO',
-                    'COMERCIAL', 'ALIMENTOS', 'AUTOMOTRIZ']  # Comercio
-
-        financiero = ['CAPITAL', 'VALORES', 'BANCOS', 'BANCA', 'SERVICIO FINANCIERO', 'FINANCIERAS', 'COMPANIAS DE FINANCIAMIENTO',
-                      'FONDOS', 'BANCO', 'FINANCIERAS', 'FINANCIERO', 'FONDOS', 'SEGUROS', 'VALORES', 'FONDOS', 'SEGUROS', 'SEGUROS']  # Financiero
-
-        const = ['EDIFICIOS', 'CONSTRUCCION', 'ARQUITECTURA', 'CONSTRUCCION',
-                 'DEMOLICION', 'EDIFICIOS', 'CONSTRUCCION']  # Construcción
-        minero = ['GAS', 'CARBON', 'EXTRACCION', 'GENERACION', 'TRANSMISION', 'CARBON', 'ORO', 'MINERALES', 'PIEDRA',
-                  'ESMERALDAS', 'PETROLEO', 'ENERGIA', 'MINERIA']  # Minero y Energético
-
-        comunicaciones = ['TELECOMUNICACIONES', 'TELECOMUNICACIONES', 'TELECOMUNICACIONES', 'ALAMBRICAS', 'INALAMBRICAS',
-                          'SATELITAL', 'TELECOMUNICACIONES']  # Comunicaciones
-
         df_a[Act_CIIU].replace(np.nan, 'SIN ACTIVIDAD', inplace=True)
 
-        def n(x): return self.sectores(x, actividad, 'SIN ACTIVIDAD')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        df_a['ACTIVIDADES'] = s1
-
-        def n(x): return self.sectores(x, servicios, 'SERVICIOS')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, agro, 'AGROPECUARIO')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, industrial, 'INDUSTRIAL')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, transporte, 'TRANSPORTE')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, comercio, 'COMERCIO')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, financiero, 'FINANCIERO')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, const, 'CONSTRUCCION')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, minero, 'ENERGETICO')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
-
-        def n(x): return self.sectores(x, comunicaciones, 'COMUNICACIONES')
-        s1 = pd.DataFrame(df_a[Act_CIIU].apply(n))
-        ind = s1[~s1[Act_CIIU].isnull()].index
-        df_a.loc[ind, 'ACTIVIDADES'] = s1.loc[ind, Act_CIIU]
+        # Solo se clasifican los textos distintos que no están en la tabla persistente
+        df_a['ACTIVIDADES'] = memo_sectores.clasificar(df_a[Act_CIIU])
+        self.reporte_sectores = memo_sectores.ultimo_reporte
 
         df_a['ACTIVIDADES'].fillna('Actividad_Desconocida', inplace=True)
         return df_a
@@ -262,6 +698,7 @@ class Modelos_2():
 
         df_tmp.reset_index(drop=True, inplace=True)
         self.df_in.reset_index(drop=True, inplace=True)
+        self.invalidar_transform_load()
         print(f"el tamaño 1 es {len(df_tmp)} el dos {len(self.df_in)}")
 
         df_tmp = df_tmp[df_tmp['ACTIVIDADES'] != 'Actividad_Desconocida']
@@ -284,74 +721,42 @@ class Modelos_2():
         columns1 = df_tmp.columns
         # print(columns1)
 
-        columns_F = ['F0', 'F1', 'F2', 'F3', 'F4', 'F5', 'F6', 'F7', 'F8']
-        ord_F = ['SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA',
-                 'UNDEFINED', 'SCS', 'PERSONANATURAL']
+        # Forma legal fuera de las categorías del esquema -> categoría por defecto
+        motor = motor_validacion.motor
+        indf = df_tmp.index[~df_tmp['FORMALEGAL'].isin(motor.categorias['FORMALEGAL'])]
 
-        columns_T = ['T0', 'T1', 'T2']
-        ord_T = ['GRANEMPRESA', 'MEDIANAEMPRESA', 'PEQUENAEMPRESA']
+        df_tmp.loc[indf, 'FORMALEGAL'] = motor.categoria_defecto['FORMALEGAL']
 
-        columns_M = ['M1', 'M2', 'M3', 'M4', 'M5',
-                     'M6', 'M7', 'M8', 'M9', 'M10', 'M11', 'M12']
-        ord_M = [1.0, 2.0, 3.0, 4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0, 12.0]
+        # Columnas numéricas en el orden original (las categóricas se reemplazan por indicadores)
+        cols_num = [c for c in columns1 if c not in [
+            'TAMANOEMPRESA', 'FORMALEGAL', 'MES_OFERTA']]
+        df_num = df_tmp[cols_num].fillna(0)
 
-        columns_A = ['A0', 'A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']
-        ord_A = ['AGROPECUARIO', 'COMERCIO', 'COMUNICACIONES', 'CONSTRUCCION',
-                 'ENERGETICO', 'FINANCIERO', 'INDUSTRIAL', 'SERVICIOS', 'TRANSPORTE']
-
-        columnas_totales = list(columns1) + columns_T + \
-            columns_F + columns_A + columns_M  # columns_D +
-        df_r = pd.DataFrame(columns=columnas_totales)
-
-        if 'CONSPROM' in df_tmp.columns:
-            df_r[['NIT9', 'NUMERODEEMPLEADOS', 'GANANCIASDESPUESDEIMPUESTOS', 'TOTALINGRESOOPERATIVO', 'ACTIVOSTOTALES', 'EDAD', 'MES_OFERTA', 'CONSPROM', 'ACTIVIDADES', 'TAMANOEMPRESA', 'FORMALEGAL', 'TOTALDEPATRIMONIO'
-                  ]] = df_tmp[['NIT9', 'NUMERODEEMPLEADOS', 'GANANCIASDESPUESDEIMPUESTOS', 'TOTALINGRESOOPERATIVO', 'ACTIVOSTOTALES', 'EDAD', 'MES_OFERTA', 'CONSPROM', 'ACTIVIDADES', 'TAMANOEMPRESA', 'FORMALEGAL', 'TOTALDEPATRIMONIO']]
-        else:
-            df_r[['NIT9', 'NUMERODEEMPLEADOS', 'GANANCIASDESPUESDEIMPUESTOS', 'TOTALINGRESOOPERATIVO', 'ACTIVOSTOTALES', 'EDAD', 'MES_OFERTA', 'ACTIVIDADES', 'TAMANOEMPRESA', 'FORMALEGAL', 'TOTALDEPATRIMONIO'
-                  ]] = df_tmp[['NIT9', 'NUMERODEEMPLEADOS', 'GANANCIASDESPUESDEIMPUESTOS', 'TOTALINGRESOOPERATIVO', 'ACTIVOSTOTALES', 'EDAD', 'MES_OFERTA', 'ACTIVIDADES', 'TAMANOEMPRESA', 'FORMALEGAL', 'TOTALDEPATRIMONIO']]
-
-        # Forma legal  ['SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA',  'UNDEFINED', 'SCS', 'PERSONANATURAL']
-        indf = df_tmp[(df_tmp['FORMALEGAL'] != 'SAS') & (df_tmp['FORMALEGAL'] != 'LTDA') & (df_tmp['FORMALEGAL'] != 'SA') &
-                      (df_tmp['FORMALEGAL'] != 'ESAL') & (df_tmp['FORMALEGAL'] != 'SUCURSALEXTRANJERA') & (df_tmp['FORMALEGAL'] != 'SCA') &
-                      (df_tmp['FORMALEGAL'] != 'UNDEFINED') & (df_tmp['FORMALEGAL'] != 'SCS') & (df_tmp['FORMALEGAL'] != 'PERSONANATURAL')].index
-
-        df_tmp.loc[indf, 'FORMALEGAL'] = 'UNDEFINED'
-        # print(indf)
-        if 'FORMALEGAL' in df_tmp.columns:
-            for i in df_tmp['FORMALEGAL'].unique():
-                col = columns_F[ord_F.index(i)]
-                ind = df_tmp[df_tmp['FORMALEGAL'] == i].index
-                df_r.loc[ind, col] = 1
-            df_r.drop(['FORMALEGAL'], axis=1, inplace=True)
-
-        # Tamaño Empresa
-        if 'TAMANOEMPRESA' in df_tmp.columns:
-            for i in df_tmp['TAMANOEMPRESA'].unique():
-                col = columns_T[ord_T.index(i)]
-                ind = df_tmp[df_tmp['TAMANOEMPRESA'] == i].index
-                df_r.loc[ind, col] = 1
-            df_r.drop(['TAMANOEMPRESA'], axis=1, inplace=True)
-
-        # Mes Oferta
-        if 'MES_OFERTA' in df_tmp.columns:
-            for i in df_tmp['MES_OFERTA'].unique():
-                print(f"mes {i}")
-                col = columns_M[ord_M.index(i)]
-                ind = df_tmp[df_tmp['MES_OFERTA'] == i].index
-                df_r.loc[ind, col] = 1
-            df_r.drop(['MES_OFERTA'], axis=1, inplace=True)
-
-        # Actividad
-        if 'ACTIVIDADES' in df_tmp.columns:
-            for i in df_tmp['ACTIVIDADES'].unique():
-                col = columns_A[ord_A.index(i)]
-                ind = df_tmp[df_tmp['ACTIVIDADES'] == i].index
-                df_r.loc[ind, col] = 1
-            # df_r.drop(['ACTIVIDADES'], axis=1, inplace=True) ------------------------------------------------------------------------- 444
-
-        df_r.fillna(0, inplace=True)
+        # Bloque indicador T*, F*, A*, M* como una sola matriz uint8
+        bloque = self.bloque_one_hot(df_tmp)
+        df_r = pd.concat([df_num, bloque], axis=1)
         return df_r
 
+    def bloque_one_hot(self, df_tmp):
+        # Construye las columnas indicadoras a partir de los códigos de categoría,
+        # sin escrituras .loc por categoría ni frame intermedio de tipo object
+        n = len(df_tmp)
+        ancho = sum(len(columnas) for _, columnas, _ in BLOQUES_ONE_HOT)
+        bloque = np.zeros((n, ancho), dtype=np.uint8)
+        filas = np.arange(n)
+        columnas_bloque = []
+        inicio = 0
+        for campo, columnas, categorias in BLOQUES_ONE_HOT:
+            codigos = pd.Categorical(df_tmp[campo], categories=categorias).codes
+            if (codigos < 0).any():
+                # Igual que ord.index(valor): una categoría fuera de la lista es un error
+                valor = df_tmp[campo].iloc[np.flatnonzero(codigos < 0)[0]]
+                raise ValueError(f'{valor!r} is not in list')
+            bloque[filas, inicio + codigos] = 1
+            columnas_bloque += columnas
+            inicio += len(columnas)
+        return pd.DataFrame(bloque, index=df_tmp.index, columns=columnas_bloque)
+
         ######## CLASIFICADORES ########
     def Cla1_predict(self, df1):
         X_test = df1.copy()
@@ -365,16 +770,8 @@ class Modelos_2():
         X_test = X_test.loc[:, cols].copy()
 
         X_test.reset_index(inplace=True, drop=True)
-        path = 'models/Cla1_Aum_Carg_Red_elec_balanced_v1.pkl'
-        my_model_loaded = joblib.load(path)           # Carga del modelo
-
-        X_u = my_model_loaded.named_steps['columntransformer'].transform(
-            X_test)  # estandarizo X_test
-        scores = my_model_loaded.named_steps['onevsoneclassifier'].decision_function(
-            X_u)  # scores de predicción
-        # Convierto scores aprobabilidades
-        probabilidades = np.exp(
-            scores)/np.sum(np.exp(scores), axis=1, keepdims=True)
+        probabilidades = puntuacion.puntuar('Cla1', X_test, registro=self.registro,
+                                            n_procesos=self.n_procesos)  # Modelo ya cargado
 
         return probabilidades  # predict_proba
 
@@ -386,16 +783,8 @@ class Modelos_2():
                                 'ACTIVOSTOTALES']].copy()
 
         X_test.reset_index(inplace=True, drop=True)
-        path = 'models/Cla1-2_Aum_Carg_Red_elec_balanced_v2.pkl'  # sin consprom
-        my_model_loaded = joblib.load(path)           # Carga del modelo
-
-        X_u = my_model_loaded.named_steps['columntransformer'].transform(
-            X_test)  # estandarizo X_test
-        scores = my_model_loaded.named_steps['onevsoneclassifier'].decision_function(
-            X_u)  # scores de predicción
-        # Convierto scores aprobabilidades
-        probabilidades = np.exp(
-            scores)/np.sum(np.exp(scores), axis=1, keepdims=True)
+        probabilidades = puntuacion.puntuar('Cla1-2', X_test, registro=self.registro,
+                                            n_procesos=self.n_procesos)  # sin consprom
 
         return probabilidades  # predict_proba
 
@@ -407,16 +796,8 @@ class Modelos_2():
                          'A0', 'A1', 'A2', 'A3', 'A4', 'A5', 'A6', 'A7', 'A8']]
 
         X_test.reset_index(inplace=True, drop=True)
-        path = 'models/Cla2_Mant_Cuentas_Ilum_FibraO.pkl'
-        my_model_loaded = joblib.load(path)  # Carga mdelo
-
-        X_u = my_model_loaded.named_steps['columntransformer'].transform(
-            X_test)  # estandarizo X_test
-        scores = my_model_loaded.named_steps['onevsoneclassifier'].decision_function(
-            X_u)  # scores de predicción
-        # Convierto scores aprobabilidades
-        probabilidades = np.exp(
-            scores)/np.sum(np.exp(scores), axis=1, keepdims=True)
+        probabilidades = puntuacion.puntuar('Cla2', X_test, registro=self.registro,
+                                            n_procesos=self.n_procesos)  # Modelo ya cargado
 
         return probabilidades  # predict_proba
 
@@ -433,67 +814,58 @@ class Modelos_2():
 
         return my_model_loaded.predict_proba(X_test)  # predict_proba
 
-    def rango_proba(self, g):  # ------------------------------------- ETIQUETAR PROBABILIDADES  ------------------------------------------------------
-        if g < 0.4:
-            return 'Baja'  # 'Menor a 40%'#
-
-        if (g >= 0.4) & (g < 0.65):
-            return 'Alta'  # 'Entre 40% y 60%' #
-
-        if (g >= 0.65):
-            return 'Media'  # 'Mayor a 60%' #
+    def rango_proba(self, g, producto='AUMENTOS_CARGA'):  # ------------------------------------- ETIQUETAR PROBABILIDADES  ------------------------------------------------------
+        # Cortes y etiquetas por producto en rangos_proba.json
+        if pd.isna(g):
+            return None
+        cortes, etiquetas = RANGOS_PROBA[producto]
+        return etiquetas[int(np.searchsorted(cortes, g, side='right'))]
 
     def etiquetar_rangos(self, pr):
         df_c = pr.copy()
 
-        def n(x): return self.rango_proba(x)
-        # n = lambda x:  self.rango_proba(x)
-
-        # print(df_c.columns)
-        s1 = pd.DataFrame(df_c['AUMENTOS_CARGA'].apply(n))  # --
-        ind = s1[~s1['AUMENTOS_CARGA'].isnull()].index
-        df_c.loc[ind, 'R.AUMENTOS_CARGA'] = s1.loc[ind, 'AUMENTOS_CARGA']
-        # df_c.loc[ind, 'P.AUMENTOS_CARGA'] = df_c.loc[ind, 'AUMENTOS_CARGA']       # probas
-
-        s1 = pd.DataFrame(df_c['CUENTASNUEVAS'].apply(n))  # --
-        ind = s1[~s1['CUENTASNUEVAS'].isnull()].index
-        df_c.loc[ind, 'R.CUENTASNUEVAS'] = s1.loc[ind, 'CUENTASNUEVAS']
-
-        s1 = pd.DataFrame(df_c['INSTALACIONES'].apply(n))
-        ind = s1[~s1['INSTALACIONES'].isnull()].index
-        df_c.loc[ind, 'R.INSTALACIONES'] = s1.loc[ind, 'INSTALACIONES']
-
-        s1 = pd.DataFrame(df_c['REDESELECTRICAS'].apply(n))
-        ind = s1[~s1['REDESELECTRICAS'].isnull()].index
-        df_c.loc[ind, 'R.REDESELECTRICAS'] = s1.loc[ind, 'REDESELECTRICAS']
+        productos = [p for p in ORDEN_RANGOS if p in df_c.columns]
+        matriz = df_c[productos].to_numpy(dtype=float)
 
-        s1 = pd.DataFrame(df_c['MANTENIMIENTO'].apply(n))
-        ind = s1[~s1['MANTENIMIENTO'].isnull()].index
-        df_c.loc[ind, 'R.MANTENIMIENTO'] = s1.loc[ind, 'MANTENIMIENTO']
+        # Tabla de cortes (producto x corte) y de etiquetas (producto x banda)
+        n_cortes = max(len(RANGOS_PROBA[p][0]) for p in productos)
+        cortes = np.full((len(productos), n_cortes), np.inf)
+        etiquetas = np.full((len(productos), n_cortes + 1), np.nan, dtype=object)
+        for k, p in enumerate(productos):
+            c, e = RANGOS_PROBA[p]
+            cortes[k, :len(c)] = c
+            etiquetas[k, :len(e)] = e
 
-        s1 = pd.DataFrame(df_c['ESTUDIOS'].apply(n))  # --
-        ind = s1[~s1['ESTUDIOS'].isnull()].index
-        df_c.loc[ind, 'R.ESTUDIOS'] = s1.loc[ind, 'ESTUDIOS']
+        # Banda de cada celda = cantidad de cortes alcanzados (>=), sobre toda la matriz
+        banda = (matriz[:, :, None] >= cortes[None, :, :]).sum(axis=2)
+        rangos = etiquetas[np.arange(len(productos))[None, :], banda]
+        rangos[np.isnan(matriz)] = np.nan
 
-        s1 = pd.DataFrame(df_c['FIBRA_OPTICA'].apply(n))  # --
-        ind = s1[~s1['FIBRA_OPTICA'].isnull()].index
-        df_c.loc[ind, 'R.FIBRA_OPTICA'] = s1.loc[ind, 'FIBRA_OPTICA']
-
-        s1 = pd.DataFrame(df_c['ILUMINACION'].apply(n))  # --
-        ind = s1[~s1['ILUMINACION'].isnull()].index
-        df_c.loc[ind, 'R.ILUMINACION'] = s1.loc[ind, 'ILUMINACION']
-
-        # s1 = pd.DataFrame(df_c['PV'].apply(n))
-        # ind = s1[~s1['PV'].isnull()].index
-        # df_c.loc[ind, 'R.PV'] = s1.loc[ind, 'PV']
-
-        # s1 = pd.DataFrame(df_c['DDV'].apply(n))
-        # ind = s1[~s1['DDV'].isnull()].index
-        # df_c.loc[ind, 'R.DDV'] = s1.loc[ind, 'DDV']
+        for k, p in enumerate(productos):
+            df_c['R.' + p] = rangos[:, k]
 
         return df_c
 
 # ------------------------------------------------------ PREDICCION  ------------------------------------------------------
+    def puntuar_codificado(self, df_code, tiene_consprom=True):
+        # Probabilidades (n x 8, orden COLS_PRODUCTO). Cada fila es independiente:
+        # con CONSPROM distinto de 0 y no vacío va a Cla1, si no a Cla1-2 (sin CONSPROM)
+        probas = np.empty((len(df_code), len(COLS_PRODUCTO)))
+        if len(df_code) == 0:
+            return probas
+        if tiene_consprom:
+            con_consprom = ((df_code['CONSPROM'] != 0) & (
+                df_code['CONSPROM'].notna())).to_numpy()
+        else:
+            con_consprom = np.zeros(len(df_code), dtype=bool)
+
+        if con_consprom.any():
+            probas[con_consprom, :4] = self.Cla1_predict(df_code[con_consprom])
+        if (~con_consprom).any():
+            probas[~con_consprom, :4] = self.Cla_12_predict(df_code[~con_consprom])
+        probas[:, 4:] = self.Cla2_predict(df_code)
+        return probas
+
     def predict_proba(self):
 
         df_code = self.Encoder()
@@ -502,86 +874,44 @@ class Modelos_2():
         df_code.reset_index(drop=True, inplace=True)
         df_i.reset_index(drop=True, inplace=True)
 
-        if 'CONSPROM' in list(df_i.columns):
-            # Contiene nulos o ceros en CONSPROM
-            if (df_i['CONSPROM'].isna().sum() > 0) | ((df_i['CONSPROM'] == 0).sum() > 0):
-                df_CONSPROM = df_code[(df_code['CONSPROM'] != 0) & (
-                    df_code['CONSPROM'].notna())]  # con CONSPROM diferente 0 y vacio
-                df_sin_CONSPROM = df_code[(df_code['CONSPROM'] == 0) | (
-                    df_code['CONSPROM'].isna())]  # SIN CONSPROM
-                # print(df_CONSPROM.shape,df_sin_CONSPROM.shape)
-
-                if df_CONSPROM.shape[0] > 0:
-                    probas1 = self.Cla1_predict(df_CONSPROM)
-                    df_i.loc[df_CONSPROM.index, [
-                        'AUMENTOS_CARGA', 'ESTUDIOS', 'INSTALACIONES', 'REDESELECTRICAS']] = probas1
-
-                if df_sin_CONSPROM.shape[0] > 0:
-                    probas1_2 = self.Cla_12_predict(df_sin_CONSPROM)
-                    df_i.loc[df_sin_CONSPROM.index, [
-                        'AUMENTOS_CARGA', 'ESTUDIOS', 'INSTALACIONES', 'REDESELECTRICAS']] = probas1_2
-
-                probas2 = self.Cla2_predict(df_code)
-                df_i.loc[df_code.index, ['CUENTASNUEVAS', 'FIBRA_OPTICA',
-                                         'ILUMINACION', 'MANTENIMIENTO']] = probas2
-
-            else:  # No nullos ni ceros en CONSPROM
-                probas1 = self.Cla1_predict(df_code)
-                df_i.loc[:, ['AUMENTOS_CARGA', 'ESTUDIOS',
-                             'INSTALACIONES', 'REDESELECTRICAS']] = probas1
-
-                probas2 = self.Cla2_predict(df_code)
-                df_i.loc[:, ['CUENTASNUEVAS', 'FIBRA_OPTICA',
-                             'ILUMINACION', 'MANTENIMIENTO']] = probas2
-
-        # df_r[['DDV', 'PV']] = probas3
-        else:    # No CONSPROM
-            probas1 = self.Cla_12_predict(df_code)
-            probas2 = self.Cla2_predict(df_code)
-            # probas3 = self.Cla3_predict(df_code)
-
-            df_i.loc[:, ['AUMENTOS_CARGA', 'ESTUDIOS',
-                         'INSTALACIONES', 'REDESELECTRICAS']] = probas1
-            df_i.loc[:, ['CUENTASNUEVAS', 'FIBRA_OPTICA',
-                         'ILUMINACION', 'MANTENIMIENTO']] = probas2
-            # df_i[['DDV', 'PV']] = probas3
-
-        cols_producto = ['AUMENTOS_CARGA', 'ESTUDIOS', 'INSTALACIONES', 'REDESELECTRICAS',
-                         'CUENTASNUEVAS', 'FIBRA_OPTICA', 'ILUMINACION', 'MANTENIMIENTO']
+        cols_producto = COLS_PRODUCTO
+        tiene_consprom = 'CONSPROM' in list(df_i.columns)
+        if MEMO_PUNTAJES:
+            # Solo se puntúan las filas nuevas o cambiadas; el resto sale de memo_puntajes
+            version = hashlib.sha256(
+                repr(sorted(self.registro.hashes().items())).encode()).hexdigest()[:12]
+            probas = memo_puntajes.puntuar(df_code, tiene_consprom, version,
+                                           lambda df: self.puntuar_codificado(df, tiene_consprom))
+            self.reporte_puntajes = memo_puntajes.ultimo_reporte
+        else:
+            probas = self.puntuar_codificado(df_code, tiene_consprom)
+            self.reporte_puntajes = {}
+        df_i.loc[df_code.index, cols_producto] = probas
+
         df_r = df_i[cols_producto].copy()
         df_i.drop(cols_producto, axis=1, inplace=True)
 
         # df_probabilidades_tmp = df_r.copy() ##################################----------------
 
-        lista = []
-        for i in range(len(df_r)):
-            df_concat = df_r.loc[i, :].sort_values(ascending=False).keys()
-            lista.append(df_concat)
-        rank = pd.DataFrame(lista, columns=[1, 2, 3, 4, 5, 6, 7, 8])
-
-        # df_rank_tmp = rank.copy()##################################----------------
+        # Ranking de productos por fila: un solo argsort (estable, NaN al final,
+        # igual que sort_values(ascending=False) por fila)
+        matriz = df_r[cols_producto].to_numpy(dtype=float)
+        orden = np.argsort(-matriz, axis=1, kind='stable')
 
         probas_rangos = self.etiquetar_rangos(df_r)
 
-        df_re = pd.DataFrame()
-        for j in range(rank.shape[1]):
-            df_re.loc[:, 'Producto_'+str(j+1)] = rank.iloc[:, j]
-
-            for i in range(len(rank)):
-                p = rank.iloc[i, j]
-                campo = 'R.' + p
-                # Agregar los rangos de probabilidad
-                df_re.loc[i, 'Probabilidad_' +
-                          str(j+1)] = probas_rangos.loc[i, campo]
-                # Agregar los rangos de probabilidad
-                df_re.loc[i, 'Valor_probabilidad' +
-                          str(j+1)] = probas_rangos.loc[i, p]
-
-            # ## ----- Agg probas
-            # for i in range(len(rank)):
-            #   p = rank.iloc[i,j]
-            #   campo = 'P.'+ p
-            #   df_re.loc[i,'Probabilidad '+str(j+1)]=probas_rangos.loc[i,campo]    # Agregar las probabilidades
+        productos = np.array(cols_producto, dtype=object)[orden]
+        valores = np.take_along_axis(matriz, orden, axis=1)
+        rangos = np.take_along_axis(probas_rangos[['R.' + c for c in cols_producto]].to_numpy(dtype=object),
+                                    orden, axis=1)
+
+        # Producto_j, Probabilidad_j, Valor_probabilidadj armados por columnas
+        columnas = {}
+        for j in range(len(cols_producto)):
+            columnas['Producto_'+str(j+1)] = productos[:, j]
+            columnas['Probabilidad_'+str(j+1)] = rangos[:, j]
+            columnas['Valor_probabilidad'+str(j+1)] = valores[:, j]
+        df_re = pd.DataFrame(columnas, index=df_r.index)
 
         return probas_rangos, pd.concat([df_i, df_re], axis=1)  # df_i
 
@@ -621,246 +951,69 @@ class Modelos_2():
 
     def ValidarCamposCartera(self):
         df_sin_nulls, df_f = self.transform_load()
-
-        dic = {'RANGOCONSUMO': 'O', 'RANGODECOMPRA($)': 'O', 'RANGORECURRENCIACOMPRA': 'O',
-               'CLUSTERCOMPRADOS': 'O', 'TIPOCLIENTE#OPORTUNIDADES': 'O', 'TIPOCLIENTE$OPORTUNIDADES': 'O',
-               'CATEGORIZACIONSECTORES': 'O', 'ESTATUSOPERACIONAL': 'O', 'TAMANOEMPRESA': 'O',
-               'CATEGORIADEPARTAMENTO': 'O', 'DEPARTAMENTO': 'O', 'OPORTUNIDADESVENDIDAS': 'int', 'OPORTUNIDADESCOTIZADAS($)': 'float'}
-        campos = []
-        existe = []
-        dtype_corr = []
-        tipo = []
-
-        for campo in dic.keys():
-            campos.append(campo)
-            if campo in df_f.columns.to_list():  # Si el campo está en la base
-                existe.append('SI')
-                dtype_corr.append(dic[campo])
-                if df_f[campo].dtype == dic[campo]:  # Si el tipo de campo es el indicado
-                    tipo.append('OK')
-                else:
-                    tipo.append('Validar')
-            else:                             # Si el campo no se encuentra en la base
-                existe.append('NO')
-                dtype_corr.append(dic[campo])
-                tipo.append('Validar')
-
-        return pd.DataFrame({'CAMPO': campos,
-                             'EXISTE': existe,
-                             'TIPO': tipo,
-                             'TIPO_CORRECTO': dtype_corr})
+        motor = motor_validacion.motor
+        return motor.informe_campos(df_f, motor.campos_cartera)
 
     def ValidarCamposModelo(self):
         df_sin_nulls, df_f = self.transform_load()
-
-        # dic = {'RANGOCONSUMO'     : 'O', 'RANGODECOMPRA($)': 'O', 'RANGORECURRENCIACOMPRA': 'O',
-        #         'CLUSTERCOMPRADOS': 'O','TIPOCLIENTE#OPORTUNIDADES': 'O', 'TIPOCLIENTE$OPORTUNIDADES': 'O',
-        #         'CATEGORIZACIONSECTORES': 'O', 'ESTATUSOPERACIONAL': 'O', 'TAMANOEMPRESA': 'O',
-        #         'CATEGORIADEPARTAMENTO': 'O'}
-
-        dic = {'NUMERODEEMPLEADOS': 'int',
-               'GANANCIASDESPUESDEIMPUESTOS': 'float',
-               'TOTALINGRESOOPERATIVO': 'float',
-               'ACTIVOSTOTALES': 'float',
-               'FECHACONSTITUCION': 'datetime64[ns]',
-               'CONSPROM': 'float',
-               'ACTIVIDADPRINCIPAL(EMIS)': 'O',
-               'TAMANOEMPRESA': 'O',
-               'FORMALEGAL': 'O',
-               'TOTALDEPATRIMONIO': 'float'
-               }
-
-        campos = []
-        existe = []
-        dtype_corr = []
-        tipo = []
-
-        for campo in dic.keys():
-            campos.append(campo)
-            if campo in df_f.columns.to_list():
-                existe.append('SI')
-                dtype_corr.append(dic[campo])
-                if df_f[campo].dtype == dic[campo]:
-                    if campo == 'NUMERODEEMPLEADOS' and (df_f['NUMERODEEMPLEADOS'] < 0).sum() > 0:
-                        tipo.append('Validar negativos no permitidos')
-                    else:
-                        tipo.append('OK')
-                else:
-                    if campo != 'NUMERODEEMPLEADOS':
-                        tipo.append('Validar')
-                    else:
-                        tipo.append('OK')
-            else:
-                existe.append('NO')
-                dtype_corr.append(dic[campo])
-                tipo.append('Validar')
-
-        return pd.DataFrame({'CAMPO': campos,
-                             'EXISTE': existe,
-                             'TIPO': tipo,
-                             'TIPO_CORRECTO': dtype_corr})
+        motor = motor_validacion.motor
+        return motor.informe_campos(df_f, motor.campos_modelo)
 
     def Validar_categorias_por_campo(self):
-
         df_sin_nulls, dft = self.transform_load()
-        m_DIC = {'RANGOCONSUMO': ['SINCATALOGAR', 'ENTRE10000Y55000', 'MENORA5000', 'ENTRE5000Y10000', 'MAYORA55000'],
-                 'RANGODECOMPRA($)': ['SINCATALOGAR', 'NOCOMPRADOR', 'PEQUENOCOMPRADOR', 'MEDIANOCOMPRADOR', 'GRANCOMPRADOR', 'COMPRADORMEGAPROYECTOS'],
-                 'RANGORECURRENCIACOMPRA': ['SINCATALOGAR', 'NOCOMPRADOR', 'UNICACOMPRA', 'BAJARECURRENCIA', 'RECURRENCIAMEDIA', 'GRANRECURRENCIA'],
-                 'CLUSTERCOMPRADOS': ['SINCATALOGAR', 'NOCOMPRADOR', 'COMPRADOR1CLUSTER', 'COMPRADOR2CLUSTER'],
-                 'TIPOCLIENTE#OPORTUNIDADES': ['SINCATALOGAR', 'NICOMPRA-NICOTIZA', 'SOLOCOTIZAN', 'COTIZANMASDELOQUECOMPRAN',
-                                               'COMPRANYCOTIZAN', 'COMPRANMASDELOQUECOTIZAN', 'SIEMPRECOMPRAN'],
-                 'TIPOCLIENTE$OPORTUNIDADES': ['SINCATALOGAR', 'NICOMPRA-NICOTIZA', 'SOLOCOTIZAN', 'COTIZANMASDELOQUECOMPRAN',
-                                               'COMPRANYCOTIZAN', 'COMPRANMASDELOQUECOTIZAN', 'SIEMPRECOMPRAN'],
-                 'CATEGORIZACIONSECTORES': ['SINCATALOGAR', 'OTROSSECTORES', 'SECTORALTOVALOR'],
-                 'ESTATUSOPERACIONAL': ['NOSECONOCEELESTATUS', 'BAJOINVESTIGACIONLEGAL', 'OPERACIONAL'],
-                 'TAMANOEMPRESA': ['SINCATALOGAR', 'PEQUENAEMPRESA', 'MEDIANAEMPRESA', 'GRANEMPRESA'],
-                 'CATEGORIADEPARTAMENTO': ['NOSECONOCEELDEPARTAMENTO', 'OTROSDEPARTAMENTOS', 'COSTA', 'CUNDINAMARCA', 'BOGOTADC'],
-
-                 'DEPARTAMENTO': ['AMAZONAS', 'ANTIOQUIA', 'ARAUCA', 'ATLANTICO', 'BOGOTADC', 'BOLIVAR', 'BOYACA', 'CALDAS', 'CAQUETA', 'CASANARE', 'CAUCA', 'CESAR',
-                                  'CHOCO', 'CORDOBA', 'CUNDINAMARCA', 'GUAINIA', 'GUAVIARE', 'HUILA', 'LAGUAJIRA', 'MAGDALENA', 'META', 'NARINO', 'NORTEDESANTANDER',
-                                  'PUTUMAYO', 'QUINDIO', 'RISARALDA', 'SANANDRESYPROVIDENCIA', 'SANTANDER', 'SUCRE', 'TOLIMA', 'VALLEDELCAUCA', 'VAUPES', 'VICHADA'],
-
-                 'FORMALEGAL': ['SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA', 'UNDEFINED', 'SCS', 'PERSONANATURAL']
-                 }
-
-        campos = []
-        valido = []
-        detalle = []
-        recomendacion = []
-
-        if 'FORMALEGAL' in dft.columns:
-            # Forma legal  ['SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA',  'UNDEFINED', 'SCS', 'PERSONANATURAL']
-            indf = dft[(dft['FORMALEGAL'] != 'SAS') & (dft['FORMALEGAL'] != 'LTDA') & (dft['FORMALEGAL'] != 'SA') &
-                       (dft['FORMALEGAL'] != 'ESAL') & (dft['FORMALEGAL'] != 'SUCURSALEXTRANJERA') & (dft['FORMALEGAL'] != 'SCA') &
-                       (dft['FORMALEGAL'] != 'UNDEFINED') & (dft['FORMALEGAL'] != 'SCS') & (dft['FORMALEGAL'] != 'PERSONANATURAL')].index
-
-            dft.loc[indf, 'FORMALEGAL'] = 'UNDEFINED'
-
-        for i in list(m_DIC.keys()):      # Encontrar categorias
-            nofound = []
-            campos.append(i)
-            if i in dft.columns:
-                for j in dft[i].unique():
-                    if j in list(m_DIC[i]):
-                        pass
-                    else:
-                        nofound.append(j)
-
-                if len(nofound) == 0:               # Si todas se encuentran
-                    valido.append('SI')
-                    detalle.append('OK')
-                    recomendacion.append('OK')
-
-                else:  # Si no se encuentra al menos una
-                    valido.append('NO')
-                    detalle.append(str(nofound))
-                    recomendacion.append('Validar')
+        return motor_validacion.motor.informe_categorias(dft)
 
-            else:
-                valido.append('NO')
-                detalle.append("Validar")  # nofound
-                recomendacion.append('Validar')
-
-        # print(len(campos),len(valido))
-        # print('\n', valido)
-        return pd.DataFrame({'CAMPO': campos,
-                             'CATEGORIAS_VALIDAS': valido,
-                             'DETALLE_CATEGORIAS': detalle,
-                             'RECOMENDACION_CATEGORIAS': recomendacion})
+    def validacion(self):
+        # Resultado del motor de validación, calculado una vez por df_in
+        if self._validacion is None:
+            self._validacion = motor_validacion.motor.validar(self)
+        return self._validacion
 
     def Validar_todo(self):
-        # df_report_types = self.validar_dtypes()
-        df_report_campos = pd.concat([self.ValidarCamposCartera(
-        ), self.ValidarCamposModelo()]).reset_index(drop=True)
-
-        e_existe = np.array(
-            df_report_campos[df_report_campos['CAMPO'] == 'ACTIVIDADPRINCIPAL(EMIS)']['EXISTE'])
-        e_tipo = np.array(
-            df_report_campos[df_report_campos['CAMPO'] == 'ACTIVIDADPRINCIPAL(EMIS)']['TIPO'])
-
-        # print('booleanos: ', e_existe,e_tipo)
-        if e_existe == 'SI' and e_tipo == 'OK':
-            tmp_A = self.Agrupar_actividades('ACTIVIDADPRINCIPAL(EMIS)')
-            num_no_agrupados = (tmp_A['ACTIVIDADES']
-                                == 'Actividad_Desconocida').sum()
-
-            df_validar_cat = self.Validar_categorias_por_campo()
-            df_validar_cat.index = df_validar_cat['CAMPO']
-            df_validar_cat.drop('CAMPO', axis=1, inplace=True)
-
-            if num_no_agrupados > 0:
-                df_validar_cat.loc['ACTIVIDADPRINCIPAL(EMIS)', 'CATEGORIAS_VALIDAS'] = str(
-                    num_no_agrupados)+' Actividades no fueron agrupadas y no se les dará recomendación '
-                if tmp_A.shape[0] <= num_no_agrupados:
-                    text = 'No hay registros aptos para recomendar.'
-                    flag_A = False
-                elif ((tmp_A.shape[0] - num_no_agrupados) > 1):
-                    text = 'Registros aptos para recomendar: ' + \
-                        str(tmp_A.shape[0]-num_no_agrupados)
-                    flag_A = True
-        else:
-            df_validar_cat = self.Validar_categorias_por_campo()
-            df_validar_cat.index = df_validar_cat['CAMPO']
-            df_validar_cat.drop('CAMPO', axis=1, inplace=True)
-
-        text = 'Registros aptos para recomendar: ' + \
-            str(tmp_A.shape[0]-num_no_agrupados)
-        flag_A = True
-
-        df_v = pd.merge(df_report_campos, df_validar_cat,
-                        how='outer', on='CAMPO').fillna('No aplica')
-        df_v.drop(8, axis=0, inplace=True)
-        df_v.reset_index(drop=True, inplace=True)
-        # Predecir o no?
-
-        bool_tipo = 'Validar' not in df_v['TIPO'].unique()
-        bool_existe = 'NO' not in df_v['EXISTE'].unique()
-        bool_cat = 'NO' not in df_v['CATEGORIAS_VALIDAS'].unique()
-
-        final_flag = flag_A and bool_tipo and bool_existe and bool_cat
-
-        return df_v, text, final_flag
+        # Informe de campos y categorías, texto y bandera (ver motor_validacion.py)
+        validacion = self.validacion()
+        return validacion['df_v'], validacion['text'], validacion['final_flag']
 
     # -- 06/06/2023 --
     ## -------------------------------------------------------------------- LOGS  -------------------------------------------------------------------------  ##
 
     def validar_categorias(self, dataframe, campo, categorias_posibles):
-        indices_categorias_distintas = []
-        indices_categorias_posibles = []
-        categorias_incorrectas = []
-
-        dataframe.replace({'NAN': np.nan,
-                           'nan': np.nan}, inplace=True)
-
-        lista_campos = []
-        for co_e in dataframe.columns:
-            if co_e in ['NIT9', 'NUMERODEEMPLEADOS', 'TOTALINGRESOOPERATIVO', 'TAMANOEMPRESA', 'GANANCIASDESPUESDEIMPUESTOS', 'ACTIVOSTOTALES', 'TOTALDEPATRIMONIO',
-                        'FORMALEGAL',    'FECHACONSTITUCION',     'ACTIVIDADES', 'DEPARTAMENTO', 'OPORTUNIDADESVENDIDAS', 'OPORTUNIDADESCOTIZADAS($)']:
-
-                lista_campos.append(co_e)
-
-        dataframe = self.eliminar_registros_vacios(dataframe, lista_campos)
-
-        # dataframe = dataframe.reset_index(drop=True)
-
-        for index, row in dataframe[lista_campos].iterrows():
-            # Verifica si algún campo contiene el string 'NAN'
-            if 'NAN' in row.values:
-                # print(row.values)
-                # Elimina el registro correspondiente
-                dataframe = dataframe.drop(index)
-
-        # dataframe = dataframe.dropna()
-        dataframe = self.eliminar_registros_vacios(dataframe, lista_campos)
-
-        for i, categoria in zip(dataframe.index, dataframe[campo]):
-            if (categoria not in categorias_posibles) & (categoria != np.nan) & (categoria != 'NAN') & (categoria != 'nan'):
-                indices_categorias_distintas.append(i)
-                categorias_incorrectas.append(categoria)
-            else:
-                indices_categorias_posibles.append(i)
-
-        return indices_categorias_distintas, indices_categorias_posibles, categorias_incorrectas
+        return self.validar_categorias_campos(dataframe, {campo: categorias_posibles})[campo]
+
+    def validar_categorias_campos(self, dataframe, categorias):
+        """ Para cada campo de categorias {campo: categorías posibles} retorna
+            (índices con categoría no esperada, índices con categoría posible,
+            valor no esperado de cada índice). No se consideran los registros
+            con vacíos o 'NAN'/'nan' en los campos requeridos; en el campo
+            validado 'NAN'/'nan' cuentan como vacío (NaN), que no es una
+            categoría posible. No modifica dataframe.
+        """
+        nulos = ['NAN', 'nan']
+        requeridos = motor_validacion.motor.campos_requeridos_categorias
+        lista_campos = [c for c in dataframe.columns if c in requeridos]
+
+        # Una sola máscara de registros con vacíos en los campos requeridos
+        vacios = np.zeros(len(dataframe), dtype=bool)
+        for c in lista_campos:
+            serie = dataframe[c]
+            vacios |= serie.isna().to_numpy()
+            if serie.dtype == object:
+                vacios |= serie.isin(nulos).to_numpy()
+        validos = dataframe.index[~vacios]
+
+        resultado = {}
+        for campo, categorias_posibles in categorias.items():
+            serie = dataframe[campo]
+            if vacios.any():
+                serie = serie[~vacios]
+            distinta = ~serie.isin(categorias_posibles).to_numpy()
+            incorrectas = serie[distinta]
+            if incorrectas.dtype == object:
+                incorrectas = incorrectas.where(~incorrectas.isin(nulos), np.nan)
+            resultado[campo] = (validos[distinta].tolist(),
+                                validos[~distinta].tolist(),
+                                incorrectas.tolist())
+        return resultado
 
     def obtener_hora_fecha(self):
         # Obtener la fecha y hora actual en la zona horaria UTC
@@ -878,59 +1031,61 @@ class Modelos_2():
         return formatted_datetime
 
     def contar_registros_por_tipo(self, df, columna, tipo_dato):
-        # Lista para almacenar los índices de los registros incorrectos
-        indices_incorrectos = []
-
-        # Lista para almacenar los índices de los registros correctos
-        indices_correctos = []
-        # print(columna,' ',str(df[columna].dtype))
-        # Iterar sobre los valores de la columna en el DataFrame y obtener su índice
-        for indice, valor in enumerate(df[columna]):
-            # Verificar si el valor es una instancia del tipo de dato correcto
-
-            if columna == 'NUMERODEEMPLEADOS':
-                if valor % 1 != 0:
-                    val_float = True
-                else:
-                    val_float = False
+        # Posiciones (iloc) de los registros incorrectos y correctos de la columna.
+        # Incorrectos: valores no enteros en los campos enteros (NUMERODEEMPLEADOS).
+        # Correctos: el resto, si el valor es instancia de np.dtype(tipo_dato).type
+        # tal como lo entrega la iteración de la serie (escalar de Python, Timestamp...).
+        serie = df[columna]
+
+        if columna in motor_validacion.motor.enteros:
+            if serie.dtype == object:
+                valores = pd.to_numeric(serie, errors='coerce').to_numpy(dtype=float)
             else:
-                val_float = False
+                valores = serie.to_numpy(dtype=float)
+            val_float = valores % 1 != 0            # NaN también cuenta como no entero
+        else:
+            val_float = np.zeros(len(serie), dtype=bool)
+
+        # isinstance por tipo distinto y no por valor
+        tipo = np.dtype(tipo_dato).type
+        tipos = serie.map(type)
+        es_tipo = tipos.isin([t for t in tipos.unique() if issubclass(t, tipo)]).to_numpy()
 
-            if (val_float == False) & (isinstance(valor, np.dtype(tipo_dato).type)):
-                # Si es correcto, agregar el índice a la lista de registros correctos
-                indices_correctos.append(indice)
-            elif val_float:
-                # Si no es correcto, agregar el índice a la lista de registros incorrectos
-                indices_incorrectos.append(indice)
+        indices_incorrectos = np.flatnonzero(val_float).tolist()
+        indices_correctos = np.flatnonzero(~val_float & es_tipo).tolist()
 
         # Devolver las listas de índices
         return indices_incorrectos, indices_correctos
 
+    def contar_registros_por_tipos(self, df, tipos):
+        # contar_registros_por_tipo para varios campos {columna: tipo_dato} de una vez
+        return {columna: self.contar_registros_por_tipo(df, columna, tipo_dato)
+                for columna, tipo_dato in tipos.items()}
+
     # ------------------------------------------------------------------------------------------------ 14/06/2023
 
-    def obtener_registros_vacios(self, df):
-        # Obtener la lista de nombres de columnas
-        columnas = df.columns.tolist()
+    def obtener_registros_vacios(self, df, max_rangos=None):
+        """ Conteo de vacíos por columna con una sola matriz de isna(). Los
+            índices se listan como rangos de filas consecutivas ('17-23') y
+            como máximo max_rangos rangos por columna (None usa
+            motor_validacion.MAX_RANGOS_VACIOS).
+        """
+        if max_rangos is None:
+            max_rangos = motor_validacion.MAX_RANGOS_VACIOS
+
+        # isna por columna: en bloques object es más rápido que df.isna() en 2D
+        vacios = np.column_stack([df.iloc[:, j].isna().to_numpy() for j in range(df.shape[1])]) \
+            if df.shape[1] > 0 else np.zeros((len(df), 0), dtype=bool)
+        conteos = vacios.sum(axis=0)
 
-        # Inicializar listas para almacenar la información de cada columna
         nombre_campo = []
         registros_vacios = []
         indices_vacios = []
-
-        # Iterar sobre cada columna del DataFrame
-        for columna in columnas:
-            # Obtener los índices de los registros vacíos en la columna actual
-            indices = df[df[columna].isnull()].index.tolist()
-
-            # Agregar información a las listas correspondientes si hay registros vacíos
-            if indices:
-                nombre_campo.append(columna)
-                registros_vacios.append(len(indices))
-                indices_vacios.append(indices)
-
-        # Convertir las listas en una cadena separada por comas
-        indices_vacios = [','.join(map(str, indices))
-                          for indices in indices_vacios]
+        for j in np.flatnonzero(conteos):
+            nombre_campo.append(df.columns[j])
+            registros_vacios.append(int(conteos[j]))
+            indices_vacios.append(motor_validacion.rangos_indices(
+                df.index[np.flatnonzero(vacios[:, j])], max_rangos))
 
         # Crear un nuevo DataFrame con la información recopilada
         df_resultado = pd.DataFrame({'Nombre campo': nombre_campo,
@@ -942,145 +1097,13 @@ class Modelos_2():
     # ------------------------------------------------------------------------------------------------
 
     def Logs(self):
+        # Logs de la validación; df_in queda solo con los registros correctos
+        lista_logs, logs_riesgo, indices_correctos = motor_validacion.motor.logs(
+            self, self.validacion())
 
-        lista_logs = []
-        logs_riesgo = []
-
-        df_v, text, final_flag = self.Validar_todo()
-
-        # Campos faltantes:
-        campos_faltantes = list(df_v[df_v['EXISTE'] == 'NO']['CAMPO'])
-
-        # print(len(campos_faltantes))
-        # Tipo de dato incorrecto en los campos: Entrar a validar ¿cuantos registros?
-        campos_tipo_incorrecto = df_v[(df_v['TIPO'] == 'Validar') & (
-            df_v['EXISTE'] != 'NO')]['CAMPO']
-        # Tipo correcto
-        tipo_correcto = df_v[(df_v['TIPO'] == 'Validar') & (
-            df_v['EXISTE'] != 'NO')]['TIPO_CORRECTO']
-
-        # Campos con categorias no esperadas
-        m_DIC = {'RANGOCONSUMO': ['SINCATALOGAR', 'ENTRE10000Y55000', 'MENORA5000', 'ENTRE5000Y10000', 'MAYORA55000'],
-                 'RANGODECOMPRA($)': ['SINCATALOGAR', 'NOCOMPRADOR', 'PEQUENOCOMPRADOR', 'MEDIANOCOMPRADOR', 'GRANCOMPRADOR', 'COMPRADORMEGAPROYECTOS'],
-                 'RANGORECURRENCIACOMPRA': ['SINCATALOGAR', 'NOCOMPRADOR', 'UNICACOMPRA', 'BAJARECURRENCIA', 'RECURRENCIAMEDIA', 'GRANRECURRENCIA'],
-                 'CLUSTERCOMPRADOS': ['SINCATALOGAR', 'NOCOMPRADOR', 'COMPRADOR1CLUSTER', 'COMPRADOR2CLUSTER'],
-                 'TIPOCLIENTE#OPORTUNIDADES': ['SINCATALOGAR', 'NICOMPRA-NICOTIZA', 'SOLOCOTIZAN', 'COTIZANMASDELOQUECOMPRAN',
-                                               'COMPRANYCOTIZAN', 'COMPRANMASDELOQUECOTIZAN', 'SIEMPRECOMPRAN'],
-                 'TIPOCLIENTE$OPORTUNIDADES': ['SINCATALOGAR', 'NICOMPRA-NICOTIZA', 'SOLOCOTIZAN', 'COTIZANMASDELOQUECOMPRAN',
-                                               'COMPRANYCOTIZAN', 'COMPRANMASDELOQUECOTIZAN', 'SIEMPRECOMPRAN'],
-                 'CATEGORIZACIONSECTORES': ['SINCATALOGAR', 'OTROSSECTORES', 'SECTORALTOVALOR'],
-                 'ESTATUSOPERACIONAL': ['NOSECONOCEELESTATUS', 'BAJOINVESTIGACIONLEGAL', 'OPERACIONAL'],
-                 'TAMANOEMPRESA': ['SINCATALOGAR', 'PEQUENAEMPRESA', 'MEDIANAEMPRESA', 'GRANEMPRESA'],
-                 'CATEGORIADEPARTAMENTO': ['NOSECONOCEELDEPARTAMENTO', 'OTROSDEPARTAMENTOS', 'COSTA', 'CUNDINAMARCA', 'BOGOTADC'],
-                 #  'ACTIVIDADES'               :['INDUSTRIAL', 'SERVICIOS', 'TRANSPORTE', 'COMERCIO', 'ENERGETICO',
-                 #                               'FINANCIERO', 'CONSTRUCCION', 'COMUNICACIONES', 'AGROPECUARIO'],
-                 'DEPARTAMENTO': ['AMAZONAS', 'ANTIOQUIA', 'ARAUCA', 'ATLANTICO', 'BOGOTADC', 'BOLIVAR', 'BOYACA', 'CALDAS', 'CAQUETA', 'CASANARE', 'CAUCA', 'CESAR',
-                                  'CHOCO', 'CORDOBA', 'CUNDINAMARCA', 'GUAINIA', 'GUAVIARE', 'HUILA', 'LAGUAJIRA', 'MAGDALENA', 'META', 'NARINO', 'NORTEDESANTANDER',
-                                  'PUTUMAYO', 'QUINDIO', 'RISARALDA', 'SANANDRESYPROVIDENCIA', 'SANTANDER', 'SUCRE', 'TOLIMA', 'VALLEDELCAUCA', 'VAUPES', 'VICHADA'],
-
-                 'FORMALEGAL': ['SAS', 'LTDA', 'SA', 'ESAL', 'SUCURSALEXTRANJERA', 'SCA', 'UNDEFINED', 'SCS', 'PERSONANATURAL']
-                 }
-
-        if len(campos_faltantes) > 0:
-            legend_campos_faltantes = str(self.obtener_hora_fecha(
-            ))+' - ' + 'En la tabla cargada no se encuentran algunas columnas necesarias: ' + ', '.join(map(str, campos_faltantes))  # str(campos_faltantes)
-            lista_logs.append(legend_campos_faltantes)
-            logs_riesgo.append('1')
-            # print('flag1')
-
-        # Conteo de registros con tipo de dato correcto e incorrecto
-
-        for campo, tipo in zip(campos_tipo_incorrecto, tipo_correcto):  # Valido dtypes
-            if tipo == 'O':
-                tipo = str
-            else:
-                pass
-
-            ind_tipo_incorrecto, ind_tipo_correcto = self.contar_registros_por_tipo(
-                self.transform_load()[0], campo, tipo)
-
-            # df_apto = df_v.loc[ind_tipo_correcto,:].copy()
-            dft, df_con_nulls = self.transform_load()
-            df_apto = dft.iloc[ind_tipo_correcto, :].copy()
-            # df_no_apto = df_v.loc[ind_tipo_incorrecto,:].copy()
-            df_no_apto = dft.iloc[ind_tipo_incorrecto, :].copy()
-
-            # LOG -------------------------------------------------------------------------------
-            #
-            # Legends conteos
-            # legend_registros_aptos = str(self.obtener_hora_fecha())+' - '+str(len(df_apto))+' registros aptos para recomendar.'
-            if len(df_no_apto) > 0:
-                legend_registros_malos = str(self.obtener_hora_fecha())+' - '+'En la columna '+str(
-                    campo) + ' se encontraron '+str(len(df_no_apto))+' valores que no son del tipo esperado ('+str(tipo)+').'
-            # legend_categorias_malas = str(self.obtener_hora_fecha())+' - '+'En el campo '+str(campo)+ ' se encontraron '+str(len(cat_no_esperadas))+' categorias no esperadas: '+str(cat_no_esperadas)
-                lista_logs.append(legend_registros_malos)
-                logs_riesgo.append(0)
-                # print('flag2')
-            # lista_logs.append(legend_categorias_malas)
-
-            # lista_logs.append(legend_registros_aptos)legend_categorias_malas
-
-        # ---------------------------------------------------------------------------------------- 14/06/2023
-
-        df_transformado, df_con_nulls = self.transform_load()
-        df_con_nulls.replace({'NAN': np.nan}, inplace=True)
+        self.df_in = self.df_in.loc[indices_correctos, :].reset_index(drop=True)
 
-        campos_existentes = list(df_v[df_v['EXISTE'] == 'SI']['CAMPO'])
-        campos_existentes = ['NIT9']+campos_existentes
-
-        df_campos_existentes = df_con_nulls[campos_existentes].copy()
-
-        num_reg_con_vacios = df_campos_existentes.isna().sum().sum()
-
-        # print(df_campos_existentes.isna().sum())
-
-        if num_reg_con_vacios > 0:
-            df_conteo_reg_vacios = self.obtener_registros_vacios(
-                df_campos_existentes)
-            cc = 0
-            for campo, conteo, indices in zip(df_conteo_reg_vacios['Nombre campo'], df_conteo_reg_vacios['Registros vacíos'], df_conteo_reg_vacios['Índices de los registros vacíos']):
-                print(len(df_conteo_reg_vacios['Nombre campo']))
-                mask_logs = ['CLIENTES_CON_PRODUCTO', 'FRECUENCIA_DE_CONTACTO', 'NIVEL_EDUCATIVO',
-                             'SITUACION_LABORAL', 'FECHA_NACIMIENTO', 'CIUDAD', 'DEPARTAMENTO']
-                print(len(mask_logs), cc)
-                legend_reg_campos_vacios = str(self.obtener_hora_fecha())+' - '+'En la columna '+str(
-                    mask_logs[cc]) + ' se encontraron '+str(conteo)+' registros con campos vacios en las filas: '+str(indices)+'.'
-                lista_logs.append(legend_reg_campos_vacios)
-                logs_riesgo.append(0)
-                cc += 1
-            # --------------------------------------------------------------------------------------
-
-        campos_categorias_no_esperadas = list(df_v[(df_v['CATEGORIAS_VALIDAS'] == 'NO') & (
-            df_v['EXISTE'] != 'NO')]['CAMPO'])  # [df_v['EXISTE']!='NO']['CAMPO'])
-        # print('flag3')
-
-        dff = self.transform_load()[0]
-        # print(dff.isna().sum())
-
-        indices_correctos = set()
-        for campo in campos_categorias_no_esperadas:
-            # print(campo)
-            indices_distintos, indices_posibles, categorias_incorrectas = self.validar_categorias(
-                dff, campo, m_DIC[campo])
-            indices_correctos.update(indices_posibles)
-            # Convertir la lista a un conjunto para eliminar elementos duplicados
-            conjunto = set(categorias_incorrectas)
-            # Convertir el conjunto nuevamente en una lista
-            categorias_incorrectas = list(conjunto)
-
-            if len(indices_distintos) > 0:
-                legend_categorias_malas = str(self.obtener_hora_fecha())+' - '+'En la columna FRECUENCIA_DE_CONTACTO se encontraron '+str(len(indices_distintos)) + \
-                    ' registros con categorias no esperadas: ' + \
-                    ', '.join(map(str, categorias_incorrectas)) + \
-                    ' en las filas '+', '.join(map(str, indices_distintos))
-                lista_logs.append(legend_categorias_malas)
-                logs_riesgo.append(0)
-        # print('flag4')
-
-        self.df_in = self.df_in.loc[list(
-            indices_correctos), :].reset_index(drop=True)
-
-        return lista_logs, logs_riesgo, list(indices_correctos)
+        return lista_logs, logs_riesgo, indices_correctos
 
     # ----------------------------------------------------------------------------------------------
 